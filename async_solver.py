@@ -0,0 +1,115 @@
+"""
+Description: asyncio wrapper of Solver.solve()
+The search runs in an executor (a thread pool by default) while the event loop stays responsive: a solve
+started by AsyncSolve can be awaited for its SolveResult, streamed for progress snapshots and cancelled, which
+interrupts the search (see Solver.interrupt()). With budgets (see Solver.set_budget()) many bounded solves can
+share one process, the answer of a solve out of budget is UNKNOWN.
+The search is pure Python, so the threads share one core through the GIL: concurrent solves interleave, and
+the event loop gets the GIL back every sys.getswitchinterval() seconds.
+"""
+
+import sys, time, asyncio, functools
+import solver
+
+class CONSTANTS:
+    # Seconds between two progress snapshots
+    PROGRESS_INTERVAL = 0.5
+
+class AsyncSolve:
+    """
+    A solve of cnf_solver running in executor (None: the default executor of the event loop), must be created
+    inside a running event loop. A Solver runs one solve at a time, do not share it between running AsyncSolves.
+        result = await AsyncSolve(cnf_solver, time_budget = 10)
+    or, with progress:
+        search = AsyncSolve(cnf_solver, conflict_budget = 100000)
+        async for snapshot in search.progress():
+            print(snapshot["Learned clauses"])
+        result = await search
+    """
+    def __init__(self, cnf_solver: solver.Solver, assumptions: list = (), executor = None,
+            progress_interval = CONSTANTS.PROGRESS_INTERVAL, **budgets):
+        self.solver = cnf_solver
+        self.progress_interval = progress_interval
+        self.start_time = time.perf_counter()
+        self.future = asyncio.get_running_loop().run_in_executor(executor,
+            functools.partial(cnf_solver.solve, assumptions, **budgets))
+
+    def __await__(self):
+        return self.result().__await__()
+
+    # The SolveResult. If the awaiting task is cancelled the search is interrupted as well
+    async def result(self) -> solver.SolveResult:
+        try:
+            return await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    # Stop the search, its result is UNKNOWN. The solver stays interrupted until clear_interrupt() is called
+    def cancel(self):
+        self.solver.interrupt()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    # Statistics of the solver (see Solver.get_statistics()) with the seconds elapsed, read while it runs
+    def snapshot(self) -> dict:
+        snapshot = self.solver.get_statistics()
+        snapshot["Elapsed (s)"] = time.perf_counter() - self.start_time
+        return snapshot
+
+    # Async generator of snapshots, one every progress_interval seconds until the search is done
+    async def progress(self):
+        while not self.future.done():
+            done, _ = await asyncio.wait([self.future], timeout = self.progress_interval)
+            if not done:
+                yield self.snapshot()
+
+"""
+Solve cnf_solver without blocking the event loop and return the SolveResult, progress(snapshot) (if given)
+is called every progress_interval seconds meanwhile. budgets are keyword arguments of Solver.solve().
+"""
+async def solve_async(cnf_solver: solver.Solver, assumptions: list = (), executor = None, progress = None,
+        progress_interval = CONSTANTS.PROGRESS_INTERVAL, **budgets) -> solver.SolveResult:
+    search = AsyncSolve(cnf_solver, assumptions, executor, progress_interval, **budgets)
+    if progress is not None:
+        async for snapshot in search.progress():
+            progress(snapshot)
+    return await search
+
+# Solve every cnf with the same budgets, at most concurrency at a time, and print one line per answer
+async def solve_all(cnfs: list, concurrency: int, progress_interval: float, budgets: dict):
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    limit = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(concurrency) as executor:
+        async def solve_one(cnf):
+            async with limit:
+                cnf_solver = solver.load_cnf(cnf)
+                progress = None
+                if progress_interval:
+                    progress = lambda snapshot: print(json.dumps(dict(snapshot, cnf = cnf)), file = sys.stderr)
+                start_time = time.perf_counter()
+                result = await solve_async(cnf_solver, (), executor, progress, progress_interval or 1.0, **budgets)
+                print("{}: {}{} after {:.3f} s".format(cnf, result.status_name(),
+                    " ({})".format(result.reason) if result.unknown else "", time.perf_counter() - start_time),
+                    flush = True)
+                return result
+        return await asyncio.gather(*(solve_one(cnf) for cnf in cnfs))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Solve cnfs concurrently in one process with asyncio")
+    parser.add_argument("cnfs", nargs = "+")
+    parser.add_argument("--concurrency", type = int, default = 4, help = "solves running at once (default: 4)")
+    parser.add_argument("--progress", type = float, default = 0, metavar = "SECONDS",
+        help = "write statistics as JSON lines to stderr every SECONDS")
+    parser.add_argument("--conflicts", type = int, default = None, help = "conflict budget per cnf")
+    parser.add_argument("--propagations", type = int, default = None, help = "propagation budget per cnf")
+    parser.add_argument("--time-limit", type = float, default = None, help = "wall clock budget per cnf (s)")
+    parser.add_argument("--memory-limit", type = float, default = None, help = "memory budget of the process (MB)")
+    args = parser.parse_args()
+    budgets = {name: value for name, value in (("conflict_budget", args.conflicts),
+        ("propagation_budget", args.propagations), ("time_budget", args.time_limit),
+        ("memory_budget", args.memory_limit)) if value is not None}
+    asyncio.run(solve_all(args.cnfs, args.concurrency, args.progress, budgets))
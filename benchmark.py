@@ -0,0 +1,250 @@
+"""
+Description: Benchmark runner for solver.py with regression tracking
+Every cnf is solved by `python3 solver.py` in a subprocess (repeat times, with a timeout). Wall / CPU time,
+peak RSS and every counter printed by print_statistics() are recorded to a JSON file. Results are checked
+against the expected answer (cnfs under a "sat" / "unsat" directory) and compared against a baseline JSON
+written by an earlier run, CPU time regressions beyond the threshold fail the run (exit status 1).
+Random k-SAT instances at the phase transition can be generated for scaling curves by variable count.
+"""
+
+import os, sys, time, json, random, re, statistics, subprocess, tempfile, platform
+
+class CONSTANTS:
+    # Clause / variable ratio at the satisfiability phase transition of random k-SAT
+    PHASE_TRANSITION_RATIO = {3: 4.26, 4: 9.93, 5: 21.12, 6: 43.37, 7: 87.79}
+    # Differences in CPU time smaller than this many seconds are noise, never a regression
+    NOISE_FLOOR = 0.5
+    # Seconds between checks whether the solver process finished
+    POLL_INTERVAL = 0.05
+    DEFAULT_PATHS = ("input/sat", "input/unsat")
+
+SOLVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solver.py")
+GENERATED_NAME = re.compile(r"ksat-(\d+)-n(\d+)-s(\d+)\.cnf$")
+
+# All the cnf files (compressed included) under the given files / directories, sorted by name
+def find_cnfs(paths: list) -> list:
+    cnfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                cnfs.extend(os.path.join(directory, name) for name in files if ".cnf" in name)
+        else:
+            cnfs.append(path)
+    return sorted(cnfs)
+
+# "SATISFIABLE" / "UNSATISFIABLE" for cnfs under a sat / unsat directory, None if unknown
+def expected_status(cnf: str):
+    directories = os.path.normpath(os.path.abspath(cnf)).split(os.sep)[:-1]
+    if "unsat" in directories:
+        return "UNSATISFIABLE"
+    if "sat" in directories:
+        return "SATISFIABLE"
+    return None
+
+def parse_number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+# (status, verified, statistics) from the output of solver.py
+def parse_output(output: str) -> (str, bool, dict):
+    status = None
+    verified = None
+    counters = {}
+    for line in output.splitlines():
+        if line in ("SATISFIABLE", "UNSATISFIABLE", "UNKNOWN"):
+            status = line
+        elif line.startswith("AC,"):
+            verified = True
+        elif line.startswith("WA,"):
+            verified = False
+        elif line.startswith("# ") and ":" in line:
+            name, _, value = line[2:].partition(":")
+            try:
+                counters[name] = parse_number(value.strip())
+            except ValueError:
+                pass # not a counter, eg. the preprocessing summary
+    return status, verified, counters
+
+"""
+Solve cnf once in a subprocess, returns a dict with status, verified, wall_time, cpu_time, peak_rss_kb,
+timed_out and statistics. The solver runs in a temporary directory so that assignment.txt is not clobbered.
+"""
+def run_solver(cnf: str, timeout: float, solver_args: list) -> dict:
+    with tempfile.TemporaryDirectory() as work_dir, tempfile.TemporaryFile("w+") as output_file:
+        start_time = time.perf_counter()
+        process = subprocess.Popen([sys.executable, SOLVER_PATH, os.path.abspath(cnf)] + solver_args,
+            cwd = work_dir, stdout = output_file, stderr = subprocess.STDOUT, text = True)
+        timed_out = False
+        while True:
+            # wait4() gives the resource usage of this very child
+            pid, exit_status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.perf_counter() - start_time > timeout:
+                timed_out = True
+                process.kill()
+                pid, exit_status, usage = os.wait4(process.pid, 0)
+                break
+            time.sleep(CONSTANTS.POLL_INTERVAL)
+        wall_time = time.perf_counter() - start_time
+        process.returncode = os.waitstatus_to_exitcode(exit_status)
+        output_file.seek(0)
+        output = output_file.read()
+    status, verified, counters = parse_output(output)
+    if timed_out:
+        status = "TIMEOUT"
+    elif status is None:
+        status = "ERROR"
+    return {
+        "status": status,
+        "verified": verified,
+        "exit_code": process.returncode,
+        "wall_time": wall_time,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": usage.ru_maxrss,
+        "timed_out": timed_out,
+        "statistics": counters,
+    }
+
+# Run every cnf repeat times, returns the results by cnf (as given) with the medians over the runs
+def run_benchmarks(cnfs: list, timeout: float, repeat: int, solver_args: list) -> dict:
+    results = {}
+    for cnf in cnfs:
+        runs = [run_solver(cnf, timeout, solver_args) for _ in range(repeat)]
+        expected = expected_status(cnf)
+        statuses = set(run["status"] for run in runs)
+        # Any wrong answer or failed verification makes the instance wrong, timeouts do not
+        wrong = (any(run["verified"] is False for run in runs) or
+            (expected is not None and bool(statuses & {"SATISFIABLE", "UNSATISFIABLE"} - {expected})))
+        results[cnf] = {
+            "expected": expected,
+            "status": runs[0]["status"] if len(statuses) == 1 else "/".join(sorted(statuses)),
+            "wrong": wrong,
+            "timed_out": any(run["timed_out"] for run in runs),
+            "median_wall_time": statistics.median(run["wall_time"] for run in runs),
+            "median_cpu_time": statistics.median(run["cpu_time"] for run in runs),
+            "peak_rss_kb": max(run["peak_rss_kb"] for run in runs),
+            "runs": runs,
+        }
+        print_result(cnf, results[cnf])
+    return results
+
+def print_result(cnf: str, result: dict):
+    print("{}: {}{} wall {:.3f} s, cpu {:.3f} s, rss {:.1f} MB".format(cnf, result["status"],
+        " (WRONG, expected {})".format(result["expected"]) if result["wrong"] else "",
+        result["median_wall_time"], result["median_cpu_time"], result["peak_rss_kb"] / 1024), flush = True)
+
+"""
+Compare the results against a baseline (the "instances" of an earlier output). Returns the list of
+regressions as strings: CPU time above baseline * (1 + threshold) (and by more than NOISE_FLOOR seconds),
+timeouts on instances solved by the baseline and wrong answers.
+"""
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for cnf, result in results.items():
+        if result["wrong"]:
+            regressions.append("{}: wrong answer {}".format(cnf, result["status"]))
+            continue
+        if cnf not in baseline:
+            continue
+        old = baseline[cnf]
+        if result["timed_out"]:
+            if not old["timed_out"]:
+                regressions.append("{}: timed out, baseline took {:.3f} s".format(cnf, old["median_cpu_time"]))
+            continue
+        if old["timed_out"]:
+            continue
+        new_time, old_time = result["median_cpu_time"], old["median_cpu_time"]
+        print("{}: cpu {:.3f} s -> {:.3f} s ({:+.1f}%)".format(cnf, old_time, new_time,
+            100 * (new_time - old_time) / max(old_time, 1e-9)))
+        if new_time > old_time * (1 + threshold) and new_time - old_time > CONSTANTS.NOISE_FLOOR:
+            regressions.append("{}: cpu time {:.3f} s, baseline {:.3f} s (threshold {:.0f}%)".format(
+                cnf, new_time, old_time, 100 * threshold))
+    return regressions
+
+# Write a random k-SAT cnf with var_count variables at the phase transition to directory, returns its path
+def generate_ksat(directory: str, var_count: int, k: int = 3, seed: int = 0) -> str:
+    rng = random.Random("{}-{}-{}".format(k, var_count, seed))
+    clause_count = round(CONSTANTS.PHASE_TRANSITION_RATIO[k] * var_count)
+    path = os.path.join(directory, "ksat-{}-n{}-s{}.cnf".format(k, var_count, seed))
+    with open(path, "w") as cnf_file:
+        cnf_file.write("c random {}-SAT at the phase transition, seed {}\n".format(k, seed))
+        cnf_file.write("p cnf {} {}\n".format(var_count, clause_count))
+        for _ in range(clause_count):
+            variables = rng.sample(range(1, var_count + 1), k)
+            cnf_file.write(" ".join(str(var if rng.random() < 0.5 else -var) for var in variables) + " 0\n")
+    return path
+
+# Median CPU time by (k, variable count) over the generated instances, the scaling curve
+def print_scaling(results: dict):
+    times = {}
+    for cnf, result in results.items():
+        match = GENERATED_NAME.search(cnf)
+        if match:
+            key = (int(match.group(1)), int(match.group(2)))
+            times.setdefault(key, []).append(result["median_cpu_time"])
+    if not times:
+        return
+    print("## Scaling: ")
+    for (k, var_count), cpu_times in sorted(times.items()):
+        print("# {}-SAT, {} variables: median cpu {:.3f} s over {} instances".format(
+            k, var_count, statistics.median(cpu_times), len(cpu_times)))
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd = os.path.dirname(SOLVER_PATH),
+            capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Benchmark solver.py over directories of cnfs")
+    parser.add_argument("paths", nargs = "*", help = "cnf files / directories (default: {})".format(
+        " ".join(CONSTANTS.DEFAULT_PATHS)))
+    parser.add_argument("--timeout", type = float, default = 300.0, help = "seconds per run (default: 300)")
+    parser.add_argument("--repeat", type = int, default = 1, help = "runs per instance (default: 1)")
+    parser.add_argument("--solver-args", default = "", help = "extra arguments for solver.py, eg. \"--restart luby\"")
+    parser.add_argument("--output", default = "benchmark.json", help = "results file (default: benchmark.json)")
+    parser.add_argument("--baseline", help = "results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type = float, default = 0.2,
+        help = "relative CPU time increase counted as a regression (default: 0.2)")
+    parser.add_argument("--generate", help = "comma separated variable counts of random k-SAT instances to add")
+    parser.add_argument("--k", type = int, default = 3, choices = sorted(CONSTANTS.PHASE_TRANSITION_RATIO),
+        help = "clause length of the generated instances (default: 3)")
+    parser.add_argument("--per-size", type = int, default = 3, help = "generated instances per variable count")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the first generated instance")
+    parser.add_argument("--generate-dir", default = "input/generated",
+        help = "directory for the generated instances (default: input/generated)")
+    args = parser.parse_args()
+
+    paths = list(args.paths)
+    if args.generate:
+        os.makedirs(args.generate_dir, exist_ok = True)
+        for var_count in map(int, args.generate.split(",")):
+            for seed in range(args.seed, args.seed + args.per_size):
+                paths.append(generate_ksat(args.generate_dir, var_count, args.k, seed))
+    if not paths:
+        paths = list(CONSTANTS.DEFAULT_PATHS)
+    results = run_benchmarks(find_cnfs(paths), args.timeout, args.repeat, args.solver_args.split())
+    print_scaling(results)
+    with open(args.output, "w") as output_file:
+        json.dump({
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "timeout": args.timeout,
+            "repeat": args.repeat,
+            "solver_args": args.solver_args,
+            "instances": results,
+        }, output_file, indent = 1)
+    regressions = [cnf + ": wrong answer" for cnf, result in results.items() if result["wrong"]]
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file)["instances"], args.threshold)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,302 @@
+"""
+Description: Checkpoints of a Solver, to resume a long run or warm start a related instance
+A checkpoint file starts with a header (magic, variable count, Solver.input_fingerprint) followed by records,
+each one a kind byte, the payload length, its CRC32 and the payload:
+    C: a learned clause, LBD then DIMACS literals (int32)
+    S: a snapshot, JSON (counters and heuristic state) then activity (float64) and saved phases (int8) by variable
+Checkpoint.save() only appends the clauses learned since the last save and one snapshot, so saving costs
+little. A crash in the middle of a write leaves a torn last record, which fails its CRC and is ignored (and
+cut off) when the file is read back. Once the file is mostly deleted clauses and old snapshots, it is rewritten
+with the live clauses to a temporary file which atomically replaces it (os.replace()).
+Resuming (same formula, same fingerprint) trusts the clauses. warm_start() loads a checkpoint of another
+formula over the same variables (eg. the next bound of a BMC problem): activities and phases are taken as they
+are, but a clause is only kept if unit propagation shows it is implied by the new formula (RUP check).
+"""
+
+import os, time, json, struct, zlib
+from array import array
+import solver
+from solver import SolverState, LiteralState, get_literal, get_dimacs_literal
+
+class CONSTANTS:
+    MAGIC = b"SATCKPT1"
+    # Conflicts between two saves
+    INTERVAL = 2000
+    # The file is compacted once it is COMPACT_RATIO times larger than its live content
+    COMPACT_RATIO = 4
+    # Solver attributes saved in a snapshot and restored on resume
+    COUNTERS = ("restart_count", "reused_levels_count", "chrono_backtracks_count", "unassigned_count",
+        "learnt_clauses_count", "decision_count", "assignments_count", "binary_implications_count",
+        "deleted_clauses_count", "minimized_literals_count", "reduce_count", "global_max_score",
+        "increment_value", "clause_increment_value", "reduce_interval")
+
+HEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<cII")
+
+def encode_record(kind: bytes, payload: bytes) -> bytes:
+    return RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+def encode_clause(dimacs_clause, lbd: int) -> bytes:
+    return encode_record(b"C", array('i', [lbd] + list(dimacs_clause)).tobytes())
+
+def encode_snapshot(cnf_solver: solver.Solver) -> bytes:
+    state = {name: getattr(cnf_solver, name) for name in CONSTANTS.COUNTERS}
+    # Relative, so that it stays meaningful whatever the counters are restored to
+    state["conflicts_to_reduce"] = cnf_solver.next_reduce - cnf_solver.learnt_clauses_count
+    text = json.dumps(state).encode()
+    payload = (struct.pack("<I", len(text)) + text + array('d', cnf_solver.activity).tobytes() +
+        array('b', cnf_solver.prev_assignment).tobytes())
+    return encode_record(b"S", payload)
+
+def decode_snapshot(payload: bytes, var_count: int) -> dict:
+    text_size, = struct.unpack_from("<I", payload)
+    snapshot = json.loads(payload[4:4 + text_size])
+    start = 4 + text_size
+    activity = array('d')
+    activity.frombytes(payload[start:start + 8 * (var_count + 1)])
+    phases = array('b')
+    phases.frombytes(payload[start + 8 * (var_count + 1):])
+    snapshot["activity"] = activity
+    snapshot["phases"] = phases
+    return snapshot
+
+"""
+Read a checkpoint file, returns a dict with var_count, fingerprint, clauses (list of (lbd, DIMACS literals)),
+snapshot (the last one, None if there is none) and valid_size, the bytes up to the first torn record.
+"""
+def read_checkpoint(file_name: str) -> dict:
+    with open(file_name, "rb") as checkpoint_file:
+        data = checkpoint_file.read()
+    if len(data) < HEADER.size:
+        raise ValueError("{} is not a checkpoint".format(file_name))
+    magic, var_count, fingerprint = HEADER.unpack_from(data)
+    if magic != CONSTANTS.MAGIC:
+        raise ValueError("{} is not a checkpoint".format(file_name))
+    checkpoint = {"var_count": var_count, "fingerprint": fingerprint, "clauses": [], "snapshot": None}
+    position = HEADER.size
+    while position + RECORD.size <= len(data):
+        kind, size, crc = RECORD.unpack_from(data, position)
+        payload = data[position + RECORD.size:position + RECORD.size + size]
+        if len(payload) != size or zlib.crc32(payload) != crc:
+            break
+        if kind == b"C":
+            clause = array('i')
+            clause.frombytes(payload)
+            checkpoint["clauses"].append((clause[0], clause[1:]))
+        elif kind == b"S":
+            checkpoint["snapshot"] = payload
+        position += RECORD.size + size
+    if checkpoint["snapshot"] is not None:
+        checkpoint["snapshot"] = decode_snapshot(checkpoint["snapshot"], var_count)
+    checkpoint["valid_size"] = position
+    return checkpoint
+
+# Activities and phases of the variables known to both, var_order is rebuilt for the new activities
+def restore_heuristics(cnf_solver: solver.Solver, snapshot: dict):
+    count = min(cnf_solver.var_count + 1, len(snapshot["activity"]))
+    cnf_solver.activity[1:count] = snapshot["activity"][1:count].tolist()
+    cnf_solver.prev_assignment[1:count] = snapshot["phases"][1:count]
+    var_order = cnf_solver.var_order
+    var_order.build([var for var in range(1, cnf_solver.var_count + 1) if var in var_order or
+        (cnf_solver.activity[var] > 0 and cnf_solver.curr_assignment[var] == LiteralState.L_UNASSIGNED)])
+
+"""
+RUP check: assign the negation of every literal of the clause, each on a new decision level, and propagate.
+The clause is implied if this leads to a conflict, or if one of its literals is TRUE at ground level.
+The solver is left at ground level.
+"""
+def implied_by_propagation(cnf_solver: solver.Solver, dimacs_clause) -> bool:
+    try:
+        for literal in dimacs_clause:
+            lit = get_literal(-literal)
+            lit_state = cnf_solver.curr_literal_assignment[lit]
+            if lit_state == LiteralState.L_TRUE:
+                continue
+            if lit_state == LiteralState.L_FALSE:
+                return True
+            cnf_solver.push_decision(lit)
+            result, _ = cnf_solver.bcp()
+            if result != SolverState.S_UNRESOLVED:
+                return True
+        return False
+    finally:
+        cnf_solver.unassign_till_level(0)
+
+"""
+Start cnf_solver from a checkpoint of a related formula with the same variable numbering: activities and
+phases are copied, clauses are imported (as learned clauses) only if implied_by_propagation() by the formula
+and the clauses imported before them, in the order they were learned. Returns (imported, rejected).
+"""
+def warm_start(cnf_solver: solver.Solver, file_name: str) -> (int, int):
+    checkpoint = read_checkpoint(file_name)
+    if checkpoint["snapshot"] is not None:
+        restore_heuristics(cnf_solver, checkpoint["snapshot"])
+    cnf_solver.unassign_till_level(0)
+    result, _ = cnf_solver.bcp()
+    if result != SolverState.S_UNRESOLVED:
+        cnf_solver.empty_clause_found = True
+        return 0, len(checkpoint["clauses"])
+    imported = rejected = 0
+    for lbd, clause in checkpoint["clauses"]:
+        if any(abs(literal) > cnf_solver.var_count for literal in clause) or (
+                not implied_by_propagation(cnf_solver, clause)):
+            rejected += 1
+            continue
+        cnf_solver.add_learned_clause(clause, lbd)
+        if cnf_solver.checkpoint is not None:
+            cnf_solver.checkpoint.record([get_literal(literal) for literal in clause], lbd)
+        imported += 1
+        # Propagate a new unit at once, the next RUP checks build on it
+        if cnf_solver.bcp()[0] != SolverState.S_UNRESOLVED:
+            cnf_solver.empty_clause_found = True
+            break
+    return imported, rejected
+
+class Checkpoint:
+    """
+    Periodic checkpoints of a Solver to file_name, every interval conflicts and at the end of every solve().
+    With sync, every save is flushed to disk (os.fsync()) before the search goes on.
+    """
+    def __init__(self, file_name: str, interval = CONSTANTS.INTERVAL, sync = False):
+        self.file_name = file_name
+        self.interval = interval
+        self.sync = sync
+        self.file = None
+        self.var_count = 0
+        self.fingerprint = 0
+        # (Solver literals, lbd) learned since the last save
+        self.pending = []
+        # Learned unary and binary clauses as (lbd, DIMACS literals), reduce_db() never deletes them
+        self.small_clauses = []
+        self.next_save = 0
+        self.saves_count = 0
+        self.compactions_count = 0
+        self.save_time = 0.0
+
+    """
+    Attach to cnf_solver (before its first solve()). If file_name holds a checkpoint of the same formula, the
+    solver resumes from it (clauses, activities, phases and counters) and later saves are appended to it.
+    Otherwise a new checkpoint is started. Returns True if the solver was resumed.
+    """
+    def attach(self, cnf_solver: solver.Solver) -> bool:
+        self.var_count = cnf_solver.var_count
+        self.fingerprint = cnf_solver.input_fingerprint
+        resumed = False
+        checkpoint = None
+        if os.path.exists(self.file_name):
+            try:
+                checkpoint = read_checkpoint(self.file_name)
+            except ValueError:
+                checkpoint = None
+        if (checkpoint is not None and checkpoint["var_count"] == self.var_count and
+                checkpoint["fingerprint"] == self.fingerprint):
+            self.resume(cnf_solver, checkpoint)
+            with open(self.file_name, "r+b") as checkpoint_file:
+                checkpoint_file.truncate(checkpoint["valid_size"])
+            self.file = open(self.file_name, "ab")
+            resumed = True
+        else:
+            self.rewrite(b"")
+        cnf_solver.checkpoint = self
+        self.next_save = cnf_solver.learnt_clauses_count + self.interval
+        return resumed
+
+    def resume(self, cnf_solver: solver.Solver, checkpoint: dict):
+        for lbd, clause in checkpoint["clauses"]:
+            cnf_solver.add_learned_clause(clause, lbd)
+            if len(clause) <= 2:
+                self.small_clauses.append((lbd, clause))
+        snapshot = checkpoint["snapshot"]
+        if snapshot is not None:
+            restore_heuristics(cnf_solver, snapshot)
+            for name in CONSTANTS.COUNTERS:
+                setattr(cnf_solver, name, snapshot[name])
+            cnf_solver.next_reduce = cnf_solver.learnt_clauses_count + snapshot["conflicts_to_reduce"]
+
+    # A learned clause (Solver literals), called by Solver.analyze_conflict()
+    def record(self, literals, lbd: int):
+        self.pending.append((literals, lbd))
+
+    # Append the pending clauses and a snapshot, compact the file if it grew too large
+    def save(self, cnf_solver: solver.Solver):
+        start_time = time.perf_counter()
+        records = bytearray()
+        for literals, lbd in self.pending:
+            dimacs_clause = [get_dimacs_literal(lit) for lit in literals]
+            if len(dimacs_clause) <= 2:
+                self.small_clauses.append((lbd, dimacs_clause))
+            records += encode_clause(dimacs_clause, lbd)
+        self.pending.clear()
+        snapshot = encode_snapshot(cnf_solver)
+        records += snapshot
+        self.file.write(records)
+        self.flush()
+        clauses = cnf_solver.clauses
+        live_size = HEADER.size + len(snapshot) + sum(RECORD.size + 4 * (size + 1)
+            for size, learnt in zip(clauses.size, clauses.learnt) if learnt) + sum(
+            RECORD.size + 4 * (len(clause) + 1) for _, clause in self.small_clauses)
+        if self.file.tell() > CONSTANTS.COMPACT_RATIO * live_size:
+            self.compact(cnf_solver, snapshot)
+        self.saves_count += 1
+        self.save_time += time.perf_counter() - start_time
+        self.next_save = cnf_solver.learnt_clauses_count + self.interval
+
+    # Rewrite the file with the learned clauses still in the solver and the last snapshot only
+    def compact(self, cnf_solver: solver.Solver, snapshot: bytes):
+        records = bytearray()
+        for lbd, clause in self.small_clauses:
+            records += encode_clause(clause, lbd)
+        clauses = cnf_solver.clauses
+        for clause_id in range(len(clauses)):
+            if clauses.learnt[clause_id]:
+                records += encode_clause([get_dimacs_literal(lit) for lit in clauses.get_literals(clause_id)],
+                    clauses.lbd[clause_id])
+        records += snapshot
+        self.rewrite(records)
+        self.compactions_count += 1
+
+    # Replace the file by header + records atomically, then reopen it for appending
+    def rewrite(self, records: bytes):
+        if self.file is not None:
+            self.file.close()
+        temporary_name = self.file_name + ".tmp"
+        with open(temporary_name, "wb") as temporary_file:
+            temporary_file.write(HEADER.pack(CONSTANTS.MAGIC, self.var_count, self.fingerprint))
+            temporary_file.write(records)
+            temporary_file.flush()
+            if self.sync:
+                os.fsync(temporary_file.fileno())
+        os.replace(temporary_name, self.file_name)
+        self.file = open(self.file_name, "ab")
+
+    def flush(self):
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def print_statistics(self):
+        print("## Checkpoint: ")
+        print("# Saves: ", self.saves_count)
+        print("# Compactions: ", self.compactions_count)
+        print("# Save time (s): ", self.save_time)
+        print("# File size (bytes): ", os.path.getsize(self.file_name))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Describe a checkpoint file")
+    parser.add_argument("checkpoint_file")
+    args = parser.parse_args()
+    checkpoint = read_checkpoint(args.checkpoint_file)
+    print("# Variables: ", checkpoint["var_count"])
+    print("# Fingerprint: ", checkpoint["fingerprint"])
+    print("# Clauses: ", len(checkpoint["clauses"]))
+    print("# Valid bytes: {} of {}".format(checkpoint["valid_size"], os.path.getsize(args.checkpoint_file)))
+    snapshot = checkpoint["snapshot"]
+    if snapshot is not None:
+        for name in CONSTANTS.COUNTERS:
+            print("# {}: ".format(name), snapshot[name])
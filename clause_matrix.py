@@ -0,0 +1,175 @@
+"""
+Description: Optional NumPy view of a cnf in CSR form (offsets + literals), for whole formula operations
+The literals of clause i are literals[offsets[i]:offsets[i + 1]] (DIMACS literals, int32). The view is built
+straight from the array('i') of dimacs.read_dimacs() without copying, or from the clauses of a Solver.
+It gives vectorized model checking (one gather and np.logical_or.reduceat), variable occurrence counts (used to
+seed the activities in Solver.insert_input_clauses()) and formula statistics.
+NumPy is optional: numpy is None when it is not installed and the callers keep their plain Python loops.
+"""
+
+import time
+from array import array
+import dimacs
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class CONSTANTS:
+    # Below this many literals the plain Python loops are as fast as building the view
+    MIN_LITERALS = 1 << 16
+
+# True if numpy is installed and literal_count literals are worth a ClauseMatrix
+def worth_vectorizing(literal_count: int) -> bool:
+    return numpy is not None and literal_count >= CONSTANTS.MIN_LITERALS
+
+class ClauseMatrix:
+    def __init__(self, var_count: int, literals, offsets):
+        if numpy is None:
+            raise ImportError("ClauseMatrix requires numpy")
+        self.var_count = var_count
+        self.literals = literals
+        self.offsets = offsets
+
+    # From DIMACS literals with every clause terminated by 0 (see dimacs.read_dimacs()), an array('i') is not copied
+    @classmethod
+    def from_dimacs_literals(cls, var_count: int, dimacs_literals):
+        if isinstance(dimacs_literals, array) and dimacs_literals.itemsize == 4:
+            terminated = numpy.frombuffer(dimacs_literals, dtype = numpy.int32)
+        else:
+            terminated = numpy.asarray(dimacs_literals, dtype = numpy.int32)
+        zeros = numpy.flatnonzero(terminated == 0)
+        # Clause i spans zeros[i - 1] + 1 .. zeros[i] in terminated, i fewer positions once the zeros are removed
+        offsets = numpy.empty(len(zeros) + 1, dtype = numpy.int64)
+        offsets[0] = 0
+        offsets[1:] = zeros - numpy.arange(len(zeros))
+        return cls(var_count, terminated[terminated != 0], offsets)
+
+    @classmethod
+    def from_file(cls, input_file: str):
+        var_count, _, dimacs_literals = dimacs.read_dimacs(input_file)
+        return cls.from_dimacs_literals(var_count, dimacs_literals)
+
+    """
+    From the clauses currently held by solver: arena clauses (learned ones included), binary and unary clauses.
+    Arena literals are converted from the solver encoding (2v / 2v + 1) in one vectorized pass.
+    """
+    @classmethod
+    def from_solver(cls, solver):
+        clauses = solver.clauses
+        arena = numpy.frombuffer(clauses.literals, dtype = numpy.int32)
+        sizes = numpy.frombuffer(clauses.size, dtype = numpy.int32)
+        # The arena is dense (clauses are appended and compact() rebuilds it), so sizes give the offsets
+        binary = numpy.frombuffer(solver.binary_clauses, dtype = numpy.int32)
+        unary = numpy.asarray(solver.unary_clauses, dtype = numpy.int32)
+        internal = numpy.concatenate((arena, binary, unary))
+        literals = numpy.where(internal & 1, -(internal >> 1), internal >> 1).astype(numpy.int32)
+        lengths = numpy.concatenate((sizes, numpy.full(len(binary) // 2, 2, dtype = numpy.int32),
+            numpy.ones(len(unary), dtype = numpy.int32)))
+        if solver.empty_clause_found:
+            lengths = numpy.concatenate((lengths, numpy.zeros(1, dtype = numpy.int32)))
+        offsets = numpy.zeros(len(lengths) + 1, dtype = numpy.int64)
+        numpy.cumsum(lengths, out = offsets[1:])
+        return cls(solver.var_count, literals, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def clause_lengths(self):
+        return numpy.diff(self.offsets)
+
+    """
+    Number of clauses not satisfied by model, model[var] is the value (True / False) of var (index 0 unused),
+    a list or a numpy array. For a partial assignment, assigned[var] tells whether var has a value at all.
+    Literal values are gathered at once and reduced per clause by logical_or.reduceat, which needs the empty
+    clauses (always unsatisfied) to be left out of the indices.
+    """
+    def count_unsatisfied(self, model, assigned = None) -> int:
+        values = numpy.asarray(model, dtype = bool)
+        variables = numpy.abs(self.literals)
+        literal_values = values[variables] == (self.literals > 0)
+        if assigned is not None:
+            literal_values &= numpy.asarray(assigned, dtype = bool)[variables]
+        lengths = self.clause_lengths()
+        non_empty = lengths > 0
+        empty_count = len(lengths) - int(numpy.count_nonzero(non_empty))
+        if not len(literal_values):
+            return empty_count
+        satisfied = numpy.logical_or.reduceat(literal_values, self.offsets[:-1][non_empty])
+        return empty_count + len(satisfied) - int(numpy.count_nonzero(satisfied))
+
+    # occurrences[var]: number of clauses containing var (either sign), a literal repeated in a clause counts once
+    def occurrence_counts(self):
+        counts = numpy.bincount(numpy.abs(self.literals), minlength = self.var_count + 1)
+        # (clause, literal) keys, literals shifted to be non negative, repeated literals are adjacent once sorted
+        clause_index = numpy.repeat(numpy.arange(len(self), dtype = numpy.int64), self.clause_lengths())
+        keys = clause_index * (2 * self.var_count + 1) + (self.literals + self.var_count)
+        keys.sort()
+        repeated = keys[1:][keys[1:] == keys[:-1]] % (2 * self.var_count + 1) - self.var_count
+        return counts - numpy.bincount(numpy.abs(repeated), minlength = self.var_count + 1)
+
+    """
+    Formula statistics: clause length histogram (length -> clauses), occurrences per variable (min / median /
+    mean / max over the variables in some clause, and a histogram by powers of two as in profiler.histogram())
+    and the share of positive literals.
+    """
+    def statistics(self) -> dict:
+        lengths = self.clause_lengths()
+        length_counts = numpy.bincount(lengths) if len(lengths) else numpy.zeros(0, dtype = numpy.int64)
+        occurrences = self.occurrence_counts()[1:]
+        used = occurrences[occurrences > 0]
+        buckets = numpy.bincount(numpy.ceil(numpy.log2(used + 1)).astype(numpy.int64)) if len(used) else []
+        return {
+            "variables": self.var_count,
+            "used_variables": int(len(used)),
+            "clauses": len(self),
+            "literals": int(len(self.literals)),
+            "clause_lengths": {int(length): int(count) for length, count in enumerate(length_counts) if count},
+            "occurrences_min": int(used.min()) if len(used) else 0,
+            "occurrences_median": float(numpy.median(used)) if len(used) else 0.0,
+            "occurrences_mean": float(used.mean()) if len(used) else 0.0,
+            "occurrences_max": int(used.max()) if len(used) else 0,
+            "occurrences": {"<{}".format(1 << bucket): int(count) for bucket, count in enumerate(buckets) if count},
+            "positive_literals": float(numpy.count_nonzero(self.literals > 0) / max(len(self.literals), 1)),
+        }
+
+# dimacs.count_unsatisfied() through a ClauseMatrix for large formulas when numpy is installed
+def count_unsatisfied(dimacs_literals, model: list) -> int:
+    if not worth_vectorizing(len(dimacs_literals)):
+        return dimacs.count_unsatisfied(dimacs_literals, model)
+    return ClauseMatrix.from_dimacs_literals(len(model) - 1, dimacs_literals).count_unsatisfied(model)
+
+def print_statistics(statistics: dict):
+    print("## Formula: ")
+    for name, value in statistics.items():
+        print("# {}: ".format(name.replace("_", " ").capitalize()), value)
+
+# Model (list of booleans indexed by variable) from an assignment file written by Solver.write_assignment()
+def read_assignment(file_name: str, var_count: int) -> list:
+    model = [False] * (var_count + 1)
+    with open(file_name) as assignment_file:
+        for token in assignment_file.read().split():
+            if token.lstrip("-").isdigit() and abs(int(token)) <= var_count:
+                model[abs(int(token))] = int(token) > 0
+    return model
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Formula statistics and model checking with numpy")
+    parser.add_argument("input_file")
+    parser.add_argument("--verify", metavar = "ASSIGNMENT", help = "count the clauses unsatisfied by an assignment file")
+    args = parser.parse_args()
+    start_time = time.perf_counter()
+    matrix = ClauseMatrix.from_file(args.input_file)
+    print("# Load time (s): ", time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    print_statistics(matrix.statistics())
+    print("# Statistics time (s): ", time.perf_counter() - start_time)
+    if args.verify:
+        model = read_assignment(args.verify, matrix.var_count)
+        start_time = time.perf_counter()
+        unsatisfied = matrix.count_unsatisfied(model)
+        print("AC, All clauses evaluate to true under given assignment" if not unsatisfied else
+            "WA, {} unsatisfied clauses found".format(unsatisfied))
+        print("# Verification time (s): ", time.perf_counter() - start_time)
@@ -0,0 +1,214 @@
+"""
+Description: Connected component decomposition, used by solver.read_and_solve_cnf() with --components
+Two variables are connected if they occur in a common clause. Clauses over different components share no
+variable, so every component is satisfiable on its own iff the whole cnf is satisfiable. Each component is
+renumbered to variables 1..k and solved by its own Solver in a process pool, the first UNSATISFIABLE component
+stops the rest. The partial models are stitched back into the Solver of the whole cnf.
+"""
+
+import os, time, random
+import multiprocessing
+from array import array
+import solver
+
+class CONSTANTS:
+    # Consecutive components are put in one job until it has JOB_SIZE variables, small components are not
+    # worth a process round trip of their own
+    JOB_SIZE = 100
+    # Number of components listed by print_report()
+    REPORT_LARGEST = 10
+
+class Component:
+    def __init__(self, index: int):
+        self.index = index
+        # variables[i - 1] is the variable of the whole cnf numbered i in this component
+        self.variables = array('i')
+        # Clauses over the renumbered variables, in the format of dimacs.read_dimacs()
+        self.literals = array('i')
+        self.clause_count = 0
+
+def find_root(parent: array, var: int) -> int:
+    while parent[var] != var:
+        parent[var] = parent[parent[var]] # path halving
+        var = parent[var]
+    return var
+
+"""
+Split the cnf (DIMACS literals as in dimacs.read_dimacs()) into its connected components, largest (by number
+of variables) first. Variables which occur in no clause belong to no component. An empty clause is a
+component of its own, without variables.
+Union-find over the variables: all the variables of a clause are joined with the first one.
+"""
+def decompose(var_count: int, dimacs_literals) -> list:
+    parent = array('i', range(var_count + 1))
+    rank = bytearray(var_count + 1)
+    first = 0
+    for literal in dimacs_literals:
+        if literal == 0:
+            first = 0
+            continue
+        var = abs(literal)
+        if not first:
+            first = find_root(parent, var)
+            continue
+        root = find_root(parent, var)
+        if root == first:
+            continue
+        if rank[root] > rank[first]:
+            root, first = first, root
+        parent[root] = first
+        rank[first] += rank[first] == rank[root]
+
+    components = []
+    # component_of[root]: index in components, local[var]: number of var in its component
+    component_of = {}
+    local = array('i', [0]) * (var_count + 1)
+    component = None
+    clause_start = 0
+    for position, literal in enumerate(dimacs_literals):
+        if literal == 0:
+            if component is None:
+                # The empty clause
+                component = Component(len(components))
+                components.append(component)
+            component.literals.extend(local[abs(lit)] if lit > 0 else -local[abs(lit)]
+                for lit in dimacs_literals[clause_start:position])
+            component.literals.append(0)
+            component.clause_count += 1
+            component = None
+            clause_start = position + 1
+            continue
+        var = abs(literal)
+        root = find_root(parent, var)
+        if root not in component_of:
+            component_of[root] = len(components)
+            components.append(Component(len(components)))
+        component = components[component_of[root]]
+        if not local[var]:
+            component.variables.append(var)
+            local[var] = len(component.variables)
+
+    components.sort(key = lambda component: len(component.variables), reverse = True)
+    for index, component in enumerate(components):
+        component.index = index
+    return components
+
+"""
+Entry point of a pool worker: solve the components of one job, given as (index, var_count, literals), one after
+the other.
+Returns a list of (index, status, model, statistics, solve_time), model is a list of DIMACS literals over the
+renumbered variables. Stops at the first UNSATISFIABLE component.
+"""
+def solve_job(job: tuple) -> list:
+    restart_policy, seed, components = job
+    results = []
+    for index, var_count, literals in components:
+        start_time = time.process_time()
+        random.seed(seed)
+        component_solver = solver.Solver(var_count, literals.count(0), solver.make_restart_policy(restart_policy))
+        component_solver.insert_input_clauses(literals)
+        result = component_solver.solve()
+        results.append((index, result.status, result.model, component_solver.get_statistics(),
+            time.process_time() - start_time))
+        if not result.satisfiable:
+            break
+    return results
+
+"""
+Solve cnf_solver (as returned by solver.load_cnf(), not yet solved) component by component with worker_count
+processes. On SATISFIABLE the stitched model is assigned in cnf_solver (and extended to the variables removed
+by preprocessing), so that verify_assignment() and write_assignment() work as after cnf_solver.solve().
+Returns (SolveResult, report), report holds the components in "components", (index, status, solve_time) per
+solved component in "solved", the merged statistics of the component solvers in "statistics" and the wall
+clock time spent in "solve_time" (process time of the parent would miss the workers).
+"""
+def solve_components(cnf_solver: solver.Solver, worker_count = None, restart_policy = "geometric",
+        seed = 0) -> (solver.SolveResult, dict):
+    if worker_count is None:
+        worker_count = os.cpu_count() or 1
+    wall_start_time = time.perf_counter()
+    start_time = time.process_time()
+    components = decompose(cnf_solver.var_count, cnf_solver.get_dimacs_literals())
+    report = {
+        "components": components,
+        "isolated_variables": cnf_solver.var_count - sum(len(component.variables) for component in components),
+        "decompose_time": time.process_time() - start_time,
+        "solved": [],
+        "statistics": {},
+    }
+
+    jobs = []
+    batch = []
+    batch_size = 0
+    for component in components:
+        batch.append((component.index, len(component.variables), component.literals))
+        batch_size += len(component.variables)
+        if batch_size >= CONSTANTS.JOB_SIZE:
+            jobs.append((restart_policy, seed, batch))
+            batch = []
+            batch_size = 0
+    if batch:
+        jobs.append((restart_policy, seed, batch))
+
+    status = solver.SolverState.S_SATISFIED
+    models = [None] * len(components)
+    statistics_list = []
+    if len(jobs) == 1 or worker_count == 1:
+        job_results = map(solve_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(min(worker_count, len(jobs)))
+        job_results = pool.imap_unordered(solve_job, jobs)
+    try:
+        for results in job_results:
+            for index, component_status, model, statistics, solve_time in results:
+                report["solved"].append((index, component_status, solve_time))
+                statistics_list.append(statistics)
+                models[index] = model
+                if component_status != solver.SolverState.S_SATISFIED:
+                    status = component_status
+            if status != solver.SolverState.S_SATISFIED:
+                break # one unsatisfiable component is enough
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    report["statistics"] = solver.merge_statistics(statistics_list)
+    report["statistics"]["Parse time (s)"] = cnf_solver.parse_time
+    report["solve_time"] = time.perf_counter() - wall_start_time
+    if status != solver.SolverState.S_SATISFIED:
+        return solver.SolveResult(status), report
+
+    # Stitch the partial models, variables in no clause are set FALSE
+    values = [False] * (cnf_solver.var_count + 1)
+    for component, model in zip(components, models):
+        for literal in model:
+            values[component.variables[abs(literal) - 1]] = literal > 0
+    for var in range(1, cnf_solver.var_count + 1):
+        cnf_solver.assign_variable(var, solver.LiteralState.L_TRUE if values[var] else solver.LiteralState.L_FALSE)
+    if cnf_solver.preprocessor is not None:
+        cnf_solver.extend_model()
+    model = [var if cnf_solver.curr_assignment[var] == solver.LiteralState.L_TRUE else -var
+        for var in range(1, cnf_solver.var_count + 1)]
+    return solver.SolveResult(status, model = model), report
+
+def print_report(report: dict):
+    components = report["components"]
+    sizes = sorted((len(component.variables) for component in components), reverse = True)
+    print("## Components: ")
+    print("# Components: ", len(components))
+    print("# Isolated variables: ", report["isolated_variables"])
+    if sizes:
+        print("# Variables per component (max / median / min): {} / {} / {}".format(
+            sizes[0], sizes[len(sizes) // 2], sizes[-1]))
+    solved = {index: (status, solve_time) for index, status, solve_time in report["solved"]}
+    for component in components[:CONSTANTS.REPORT_LARGEST]:
+        status = "not solved"
+        if component.index in solved:
+            status, solve_time = solved[component.index]
+            status = "{} after {:.3f} s".format(solver.SolveResult(status).status_name(), solve_time)
+        print("# Component {}: {} variables, {} clauses, {}".format(component.index, len(component.variables),
+            component.clause_count, status))
+    if len(components) > CONSTANTS.REPORT_LARGEST:
+        print("# ... {} more components".format(len(components) - CONSTANTS.REPORT_LARGEST))
+    print("# Decomposition time (s): ", report["decompose_time"])
@@ -0,0 +1,340 @@
+"""
+Description: Cube and conquer, for hard cnfs on which a single CDCL search does not parallelize
+1. Lookahead: the cnf is split into cubes (conjunctions of literals) by a search tree of the given depth.
+   Every node branches on the variable whose two literals together imply the most assignments, measured
+   by propagating them with Solver.bcp(). Branches which lead to a conflict are refuted on the spot.
+2. Conquer: each cube is solved as the assumptions of Solver.solve() by workers in a process pool. A worker
+   keeps its Solver (and learned clauses) from one cube to the next. A cube which is not solved within its
+   time limit is split again by the worker, the new cubes go back to the shared queue where idle workers
+   pick them up. The cnf is satisfiable iff some cube is.
+"""
+
+import os, time, random, threading, queue, heapq
+import multiprocessing
+import solver
+from solver import SolverState, LiteralState, get_literal, get_dimacs_literal
+from portfolio import share_literals, read_shared_literals, interrupt_on_event
+
+class CONSTANTS:
+    # Depth of the initial lookahead tree, at most 2 ** LOOKAHEAD_DEPTH cubes
+    LOOKAHEAD_DEPTH = 6
+    # Only this many unassigned variables (by decreasing activity) are probed at each node
+    LOOKAHEAD_CANDIDATES = 16
+    # A cube gets CUBE_TIME_LIMIT * 2 ** generation seconds, generation counts how often it was split again
+    CUBE_TIME_LIMIT = 2.0
+    # Depth of the lookahead tree used to split a cube which ran out of time
+    SPLIT_DEPTH = 1
+    # Seconds between checks for crashed workers while waiting for results
+    POLL_INTERVAL = 0.1
+    # Seconds the workers get to report their statistics once the search is over
+    STOP_TIMEOUT = 5.0
+    # Number of cubes listed by print_report()
+    REPORT_SLOWEST = 5
+
+"""
+Assign lit on a new decision level and propagate. Returns the number of assignments this implied (lit
+included) or -1 if it led to a conflict (lit is a failed literal). The solver is left on its previous level.
+"""
+def probe(cnf_solver: solver.Solver, lit) -> int:
+    level = cnf_solver.curr_level
+    trail_size = len(cnf_solver.assigned_till_now)
+    cnf_solver.push_decision(lit)
+    result, _ = cnf_solver.bcp()
+    implied = len(cnf_solver.assigned_till_now) - trail_size
+    cnf_solver.unassign_till_level(level)
+    return -1 if result == SolverState.S_CONFLICT else implied
+
+"""
+Returns (var, positive, negative) for the variable to branch on, positive / negative being the probe()
+results of its two literals. The score of a variable is the product of the two, so that both branches
+have to be good. A variable with a failed literal is taken at once. var is 0 if everything is assigned.
+"""
+def select_branch_variable(cnf_solver: solver.Solver) -> (int, int, int):
+    curr_assignment = cnf_solver.curr_assignment
+    activity = cnf_solver.activity
+    candidates = heapq.nlargest(CONSTANTS.LOOKAHEAD_CANDIDATES,
+        (var for var in range(1, cnf_solver.var_count + 1) if curr_assignment[var] == LiteralState.L_UNASSIGNED),
+        key = lambda var: activity[var])
+    best = (0, 0, 0)
+    best_score = -1
+    for var in candidates:
+        positive = probe(cnf_solver, get_literal(var))
+        negative = probe(cnf_solver, get_literal(-var))
+        if positive < 0 or negative < 0:
+            return var, positive, negative
+        score = positive * negative
+        if score > best_score:
+            best = (var, positive, negative)
+            best_score = score
+    return best
+
+# Depth first lookahead tree below the current assignment, cube lists the DIMACS literals decided so far
+def split(cnf_solver: solver.Solver, cube: list, depth: int, cubes: list) -> int:
+    if depth == 0:
+        cubes.append(cube)
+        return 0
+    var, positive, negative = select_branch_variable(cnf_solver)
+    if var == 0:
+        cubes.append(cube)
+        return 0
+    refuted = 0
+    for lit, implied in ((get_literal(var), positive), (get_literal(-var), negative)):
+        if implied < 0:
+            refuted += 1
+            continue
+        level = cnf_solver.curr_level
+        cnf_solver.push_decision(lit)
+        result, _ = cnf_solver.bcp()
+        if result == SolverState.S_CONFLICT:
+            refuted += 1
+        else:
+            refuted += split(cnf_solver, cube + [get_dimacs_literal(lit)], depth - 1, cubes)
+        cnf_solver.unassign_till_level(level)
+    return refuted
+
+"""
+Split the cube (DIMACS literals, [] for the whole cnf) into cubes of depth more literals, returns
+(cubes, refuted) where refuted is the number of branches closed by a conflict during the lookahead.
+No cubes means the cube is unsatisfiable. The solver is left at ground level.
+"""
+def make_cubes(cnf_solver: solver.Solver, cube: list, depth: int) -> (list, int):
+    cnf_solver.unassign_till_level(0)
+    result, _ = cnf_solver.bcp()
+    if result == SolverState.S_UNSATISFIED:
+        cnf_solver.empty_clause_found = True
+        return [], 1
+    for literal in cube:
+        lit = get_literal(literal)
+        lit_state = cnf_solver.curr_literal_assignment[lit]
+        if lit_state == LiteralState.L_TRUE:
+            continue
+        if lit_state == LiteralState.L_FALSE:
+            cnf_solver.unassign_till_level(0)
+            return [], 1
+        cnf_solver.push_decision(lit)
+        result, _ = cnf_solver.bcp()
+        if result == SolverState.S_CONFLICT:
+            cnf_solver.unassign_till_level(0)
+            return [], 1
+    cubes = []
+    refuted = split(cnf_solver, list(cube), depth, cubes)
+    cnf_solver.unassign_till_level(0)
+    return cubes, refuted
+
+"""
+Entry point of a worker process. Takes (cube, generation) from tasks until it gets None and puts on results
+    ("solved", cube, status, model, refutes_cnf, seconds) or ("split", cube, generation, cubes, refuted, seconds)
+followed by ("statistics", index, statistics) when it stops. refutes_cnf is set when the cnf is unsatisfiable
+whatever the cube. stop_event interrupts the cube being solved.
+"""
+def run_worker(index: int, memory_name: str, literal_count: int, var_count: int, clause_count: int,
+        restart_policy: str, cube_time_limit: float, split_depth: int, tasks, results, stop_event):
+    random.seed(index)
+    worker_solver = solver.Solver(var_count, clause_count, solver.make_restart_policy(restart_policy))
+    worker_solver.insert_input_clauses(read_shared_literals(memory_name, literal_count))
+    threading.Thread(target = interrupt_on_event, args = (stop_event, worker_solver), daemon = True).start()
+    while not stop_event.is_set():
+        task = tasks.get()
+        if task is None:
+            break
+        cube, generation = task
+        # Process time, so that the speedup reported is meaningful when workers share cores
+        start_time = time.process_time()
+        result = worker_solver.solve(cube, time_budget = cube_time_limit * 2 ** generation)
+        if stop_event.is_set():
+            break
+        if result.unknown:
+            cubes, refuted = make_cubes(worker_solver, cube, split_depth)
+            results.put(("split", cube, generation, cubes, refuted, time.process_time() - start_time))
+        else:
+            results.put(("solved", cube, result.status, result.model,
+                not result.satisfiable and not result.failed_assumptions, time.process_time() - start_time))
+    results.put(("statistics", index, worker_solver.get_statistics()))
+
+"""
+Solve input_file by cube and conquer with worker_count processes. Returns (cnf_solver, SolveResult, report).
+On SATISFIABLE the model is assigned in cnf_solver (the Solver used for the lookahead, extended to the
+variables removed by preprocessing) for verify_assignment() and write_assignment().
+"""
+def solve_cubes(input_file, worker_count = None, depth = CONSTANTS.LOOKAHEAD_DEPTH,
+        cube_time_limit = CONSTANTS.CUBE_TIME_LIMIT, split_depth = CONSTANTS.SPLIT_DEPTH, restart_policy = "geometric",
+        preprocess = False) -> (solver.Solver, solver.SolveResult, dict):
+    if worker_count is None:
+        worker_count = os.cpu_count() or 1
+    cnf_solver = solver.load_cnf(input_file, restart_policy, preprocess)
+    if cnf_solver.preprocessor is not None:
+        cnf_solver.preprocessor.print_statistics()
+    wall_start_time = time.perf_counter()
+    cubes, refuted = make_cubes(cnf_solver, [], depth)
+    report = {
+        "depth": depth,
+        "lookahead_time": time.perf_counter() - wall_start_time,
+        "initial_cubes": len(cubes),
+        "refuted": refuted,
+        "resplit": 0,
+        "split_cubes": 0,
+        # (seconds, cube, status) of every cube solved
+        "cube_times": [],
+        "split_time": 0.0,
+        "statistics": {},
+    }
+    status = SolverState.S_UNSATISFIED
+    model = None
+    if cubes:
+        status, model = conquer(cnf_solver, cubes, worker_count, restart_policy, cube_time_limit, split_depth,
+            report)
+    report["wall_time"] = time.perf_counter() - wall_start_time
+    report["statistics"]["Parse time (s)"] = cnf_solver.parse_time
+    if model is None:
+        return cnf_solver, solver.SolveResult(status), report
+    cnf_solver.unassign_till_level(0)
+    for literal in model:
+        cnf_solver.assign_variable(abs(literal), LiteralState.L_TRUE if literal > 0 else LiteralState.L_FALSE)
+    if cnf_solver.preprocessor is not None:
+        cnf_solver.extend_model()
+    model = [var if cnf_solver.curr_assignment[var] == LiteralState.L_TRUE else -var
+        for var in range(1, cnf_solver.var_count + 1)]
+    return cnf_solver, solver.SolveResult(status, model = model), report
+
+# Solve the cubes in the pool, returns (status, model) and fills in report
+def conquer(cnf_solver: solver.Solver, cubes: list, worker_count: int, restart_policy: str, cube_time_limit: float,
+        split_depth: int, report: dict) -> (SolverState, list):
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    results = context.Queue()
+    stop_event = context.Event()
+    dimacs_literals = cnf_solver.get_dimacs_literals()
+    memory = share_literals(dimacs_literals)
+    workers = []
+    # Unsolved cubes, either queued or being solved
+    pending = len(cubes)
+    status = SolverState.S_UNRESOLVED
+    model = None
+    refutes_cnf = False
+    statistics_list = []
+    try:
+        for cube in cubes:
+            tasks.put((cube, 0))
+        for index in range(min(worker_count, len(cubes))):
+            worker = context.Process(target = run_worker, args = (index, memory.name, len(dimacs_literals),
+                cnf_solver.var_count, cnf_solver.clause_count, restart_policy, cube_time_limit, split_depth,
+                tasks, results, stop_event), daemon = True)
+            worker.start()
+            workers.append(worker)
+        while pending:
+            try:
+                message = results.get(timeout = CONSTANTS.POLL_INTERVAL)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break # the workers died without finishing the cubes
+                continue
+            if message[0] == "statistics":
+                statistics_list.append(message[2])
+                continue
+            pending -= 1
+            if message[0] == "split":
+                _, cube, generation, new_cubes, refuted, seconds = message
+                report["resplit"] += 1
+                report["split_cubes"] += len(new_cubes)
+                report["refuted"] += refuted
+                report["split_time"] += seconds
+                for new_cube in new_cubes:
+                    tasks.put((new_cube, generation + 1))
+                pending += len(new_cubes)
+                continue
+            _, cube, cube_status, cube_model, refutes_cnf, seconds = message
+            report["cube_times"].append((seconds, cube, cube_status))
+            if cube_status == SolverState.S_SATISFIED:
+                status = cube_status
+                model = cube_model
+                break
+            if refutes_cnf:
+                break
+        if model is None and (not pending or refutes_cnf):
+            status = SolverState.S_UNSATISFIED
+    finally:
+        stop_event.set()
+        for worker in workers:
+            tasks.put(None)
+        deadline = time.monotonic() + CONSTANTS.STOP_TIMEOUT
+        while len(statistics_list) < len(workers) and time.monotonic() < deadline:
+            try:
+                message = results.get(timeout = CONSTANTS.POLL_INTERVAL)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+                continue
+            if message[0] == "statistics":
+                statistics_list.append(message[2])
+        for worker in workers:
+            worker.join(CONSTANTS.STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        memory.close()
+        memory.unlink()
+    report["statistics"] = solver.merge_statistics(statistics_list)
+    return status, model
+
+def print_report(report: dict):
+    cube_times = sorted(report["cube_times"], key = lambda entry: entry[0], reverse = True)
+    worker_time = sum(seconds for seconds, _, _ in cube_times) + report["split_time"]
+    print("## Cube and conquer: ")
+    print("# Lookahead depth: {}, time (s): {:.3f}".format(report["depth"], report["lookahead_time"]))
+    print("# Initial cubes: ", report["initial_cubes"])
+    print("# Branches refuted by lookahead: ", report["refuted"])
+    print("# Cubes split again: {} (into {} cubes)".format(report["resplit"], report["split_cubes"]))
+    print("# Cubes solved: ", len(cube_times))
+    if cube_times:
+        print("# Time per cube (s) (max / median / min): {:.3f} / {:.3f} / {:.3f}".format(
+            cube_times[0][0], cube_times[len(cube_times) // 2][0], cube_times[-1][0]))
+    for seconds, cube, status in cube_times[:CONSTANTS.REPORT_SLOWEST]:
+        print("# Cube {}: {} after {:.3f} s".format(cube, solver.SolveResult(status).status_name(), seconds))
+    print("# Worker time (s): ", worker_time)
+    print("# Wall time (s): ", report["wall_time"])
+    print("# Speedup (worker time / wall time): {:.2f}".format(worker_time / max(report["wall_time"], 1e-9)))
+
+# A model is written to assignment_file, if given
+def read_and_solve_cnf(input_file, worker_count = None, depth = CONSTANTS.LOOKAHEAD_DEPTH,
+        cube_time_limit = CONSTANTS.CUBE_TIME_LIMIT, restart_policy = "geometric", preprocess = False,
+        compare = False, assignment_file = None):
+    cnf_solver, result, report = solve_cubes(input_file, worker_count, depth, cube_time_limit,
+        CONSTANTS.SPLIT_DEPTH, restart_policy, preprocess)
+    print(result.status_name())
+    if result.satisfiable:
+        cnf_solver.verify_assignment()
+        if assignment_file is not None:
+            cnf_solver.write_assignment(assignment_file)
+    print_report(report)
+    if compare:
+        # Same cnf with a single sequential search, for the actual speedup
+        random.seed(0)
+        sequential_solver = solver.load_cnf(input_file, restart_policy, preprocess)
+        start_time = time.perf_counter()
+        sequential_solver.solve()
+        sequential_time = time.perf_counter() - start_time
+        print("# Sequential wall time (s): ", sequential_time)
+        print("# Speedup (sequential / cube and conquer): {:.2f}".format(
+            sequential_time / max(report["wall_time"], 1e-9)))
+    solver.print_statistics(report["statistics"], report["wall_time"])
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Cube and conquer with a pool of CDCL solvers")
+    parser.add_argument("input_file", nargs = "?", default = "input/sat/bmc-1.cnf")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes (default: cpu count)")
+    parser.add_argument("--depth", type = int, default = CONSTANTS.LOOKAHEAD_DEPTH,
+        help = "depth of the lookahead tree (default: {})".format(CONSTANTS.LOOKAHEAD_DEPTH))
+    parser.add_argument("--cube-time-limit", type = float, default = CONSTANTS.CUBE_TIME_LIMIT,
+        help = "seconds before a cube is split again (default: {})".format(CONSTANTS.CUBE_TIME_LIMIT))
+    parser.add_argument("--restart", choices = sorted(solver.RESTART_POLICIES), default = "geometric",
+        help = "restart policy of the workers (default: geometric)")
+    parser.add_argument("--preprocess", action = "store_true", help = "preprocess the cnf before the lookahead")
+    parser.add_argument("--compare", action = "store_true",
+        help = "solve the cnf sequentially afterwards and report the speedup")
+    parser.add_argument("--assignment", default = None, metavar = "FILE",
+        help = "write the model to FILE (default: not written)")
+    args = parser.parse_args()
+    random.seed(0)
+    read_and_solve_cnf(args.input_file, args.workers, args.depth, args.cube_time_limit, args.restart,
+        args.preprocess, args.compare, args.assignment)
@@ -0,0 +1,103 @@
+"""
+Description: Streaming reader for DIMACS CNF files, used by solver.load_cnf()
+"""
+
+import io, bz2, gzip, lzma
+from array import array
+
+# Bytes read from the (possibly compressed) file at a time
+CHUNK_SIZE = 1 << 22
+
+OPENERS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    ".lzma": lzma.open,
+}
+
+# Open a cnf file for binary reading, compressed files are recognised by their suffix
+def open_cnf(input_file: str):
+    for suffix, opener in OPENERS.items():
+        if input_file.endswith(suffix):
+            return opener(input_file, "rb")
+    return open(input_file, "rb")
+
+"""
+Reads a DIMACS CNF file and returns (var_count, clause_count, literals) where literals is an array('i')
+of all the DIMACS literals in the file, each clause terminated by a 0 (exactly like in the file).
+The file is read in chunks of chunk_size bytes and each chunk is tokenized in one go, so clauses may
+span several lines and comment lines ("c ...") may appear anywhere. A "%" line ends the formula
+(as used by the SATLIB benchmarks). var_count and clause_count are taken from the "p cnf" header,
+var_count is raised if a larger variable is used and clause_count is the number of clauses actually read.
+"""
+def read_dimacs(input_file: str, chunk_size: int = CHUNK_SIZE) -> (int, int, array):
+    with open_cnf(input_file) as cnf_file:
+        return read_dimacs_stream(cnf_file, input_file, chunk_size)
+
+# read_dimacs() of a cnf given as text (str or bytes) instead of a file name
+def parse_dimacs(text) -> (int, int, array):
+    if isinstance(text, str):
+        text = text.encode()
+    return read_dimacs_stream(io.BytesIO(text), "<text>")
+
+# read_dimacs() of a binary file object, name is only used in error messages
+def read_dimacs_stream(cnf_file, input_file: str, chunk_size: int = CHUNK_SIZE) -> (int, int, array):
+    var_count = -1
+    literals = array('i')
+    carry = b""
+    finished = False
+    while not finished:
+        chunk = cnf_file.read(chunk_size)
+        if chunk:
+            data = carry + chunk
+            # Only complete lines are tokenized, the rest is carried over to the next chunk
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                carry = data
+                continue
+            carry = data[cut + 1:]
+            data = data[:cut]
+        else:
+            data = carry
+            finished = True
+        if b"c" in data or b"p" in data or b"%" in data:
+            # Slow path: this chunk has non clause lines
+            clause_lines = []
+            for line in data.split(b"\n"):
+                stripped = line.lstrip()
+                if not stripped or stripped[:1] == b"c":
+                    continue
+                if stripped[:1] == b"p":
+                    tokens = stripped.split()
+                    if len(tokens) != 4 or tokens[1] != b"cnf":
+                        raise ValueError("Invalid problem line in {}: {}".format(input_file, line))
+                    var_count = int(tokens[2])
+                    continue
+                if stripped[:1] == b"%":
+                    finished = True
+                    break
+                clause_lines.append(line)
+            data = b" ".join(clause_lines)
+        literals.extend(map(int, data.split()))
+    if var_count < 0:
+        raise ValueError("Missing problem line (p cnf) in {}".format(input_file))
+    if literals and literals[-1] != 0:
+        # Last clause was not terminated
+        literals.append(0)
+    clause_count = literals.count(0)
+    if literals:
+        var_count = max(var_count, max(literals), -min(literals))
+    return var_count, clause_count, literals
+
+# Number of clauses in literals (as returned by read_dimacs()) not satisfied by model,
+# model[var] is the value (True / False) of var
+def count_unsatisfied(literals, model: list) -> int:
+    unsatisfied = 0
+    satisfied = False
+    for lit in literals:
+        if lit == 0:
+            unsatisfied += not satisfied
+            satisfied = False
+        elif not satisfied and model[abs(lit)] == (lit > 0):
+            satisfied = True
+    return unsatisfied
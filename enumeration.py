@@ -0,0 +1,182 @@
+"""
+Description: Enumeration of the models of a cnf, optionally projected onto some of its variables
+ModelEnumeration yields the models one at a time from a single Solver. After each model a blocking clause
+excluding it is added with Solver.add_blocking_clause() and the search resumes from the current trail
+(solve(resume = True)), keeping the learned clauses, activities and saved phases.
+The blocking clause is the negation of the decisions the (projected) model follows from, rather than of the
+whole model: every other assignment is implied by them. With a projection, it is only used when those
+decisions are all on projected variables, otherwise the negation of the projected model is used.
+"""
+
+import time
+import solver
+from solver import LiteralState
+
+class CONSTANTS:
+    # Models printed by the command line before the rest are only counted (see --print)
+    PRINT_LIMIT = 10
+
+# The TRUE literal of an assigned variable
+def true_literal(cnf_solver: solver.Solver, var: int) -> int:
+    return (var << 1) | (cnf_solver.curr_assignment[var] == LiteralState.L_FALSE)
+
+"""
+Decisions (TRUE literals) which the TRUE literals of variables imply by unit propagation, found by walking
+back the antecedents as in Solver.analyze_final(). Ground level assignments are left out.
+"""
+def implying_decisions(cnf_solver: solver.Solver, variables) -> list:
+    assignment_level = cnf_solver.assignment_level
+    antecedent = cnf_solver.antecedent
+    clauses = cnf_solver.clauses
+    seen = set()
+    stack = [var for var in variables if assignment_level[var] > 0]
+    decisions = []
+    while stack:
+        var = stack.pop()
+        if var in seen:
+            continue
+        seen.add(var)
+        antecedent_id = antecedent[var]
+        if antecedent_id == -1:
+            decisions.append(true_literal(cnf_solver, var))
+            continue
+        if solver.is_binary_antecedent(antecedent_id):
+            reason_literals = (solver.get_binary_antecedent_literal(antecedent_id),)
+        else:
+            reason_literals = clauses.get_literals(antecedent_id)
+        for reason_lit in reason_literals:
+            reason_var = reason_lit >> 1
+            if reason_var != var and assignment_level[reason_var] > 0 and reason_var not in seen:
+                stack.append(reason_var)
+    return decisions
+
+class ModelEnumeration:
+    """
+    Iterating yields the models of cnf_solver (lists of DIMACS literals, only the projection variables if
+    projection is given) under assumptions, at most limit of them. budgets (keyword arguments of
+    Solver.solve()) apply to the search of each model. With decision_blocking False, blocking clauses are
+    the negation of the whole (projected) model.
+    After the iteration:
+        exhausted: True if every model was found (the cnf with the blocking clauses is UNSATISFIABLE)
+        reason: the budget which ran out, if any
+        times: seconds spent on each model (search and blocking clause), then on the final answer
+        blocking_sizes: number of literals in each blocking clause
+    The blocking clauses stay in cnf_solver, it only has the models not yet enumerated afterwards.
+    """
+    def __init__(self, cnf_solver: solver.Solver, projection: list = None, limit = None, assumptions: list = (),
+            decision_blocking = True, **budgets):
+        if cnf_solver.preprocessor is not None:
+            raise ValueError("Models cannot be enumerated after preprocessing, variables may have been eliminated")
+        if cnf_solver.proof is not None or cnf_solver.checkpoint is not None:
+            raise ValueError("Blocking clauses are not implied by the cnf, they cannot go to a proof or checkpoint")
+        self.solver = cnf_solver
+        self.projection = sorted(set(projection)) if projection is not None else None
+        self.projection_set = set(self.projection) if projection is not None else None
+        self.limit = limit
+        self.assumptions = assumptions
+        self.decision_blocking = decision_blocking
+        self.budgets = budgets
+        self.exhausted = False
+        self.reason = None
+        self.times = []
+        self.blocking_sizes = []
+
+    def __iter__(self):
+        cnf_solver = self.solver
+        resume = False
+        count = 0
+        while self.limit is None or count < self.limit:
+            start_time = time.perf_counter()
+            result = cnf_solver.solve(self.assumptions, resume = resume, **self.budgets)
+            if not result.satisfiable:
+                self.times.append(time.perf_counter() - start_time)
+                self.exhausted = not result.unknown
+                self.reason = result.reason
+                return
+            if self.projection is None:
+                model = result.model
+            else:
+                model = [result.model[var - 1] for var in self.projection]
+            count += 1
+            self.decide_free_variables()
+            if not cnf_solver.add_blocking_clause(self.blocking_clause()):
+                self.exhausted = True
+            self.times.append(time.perf_counter() - start_time)
+            yield model
+            if self.exhausted:
+                return
+            resume = True
+
+    # Variables in no clause are never decided (and reported FALSE), decide them FALSE so that the blocking
+    # clause leaves their other values to the next models
+    def decide_free_variables(self):
+        cnf_solver = self.solver
+        variables = self.projection if self.projection is not None else range(1, cnf_solver.var_count + 1)
+        for var in variables:
+            if cnf_solver.curr_assignment[var] == LiteralState.L_UNASSIGNED:
+                cnf_solver.push_decision((var << 1) | 1)
+
+    # Negation of the decisions the model follows from, or of the (projected) model itself
+    def blocking_clause(self) -> list:
+        cnf_solver = self.solver
+        variables = self.projection if self.projection is not None else range(1, cnf_solver.var_count + 1)
+        if self.decision_blocking:
+            if self.projection is None:
+                # Every assignment follows from all the decisions on the trail
+                decisions = [lit for lit in cnf_solver.assigned_till_now if cnf_solver.antecedent[lit >> 1] == -1
+                    and cnf_solver.assignment_level[lit >> 1] > 0]
+            else:
+                decisions = implying_decisions(cnf_solver, variables)
+            projected = self.projection is None or all(lit >> 1 in self.projection_set for lit in decisions)
+            if projected:
+                clause = [lit ^ 1 for lit in decisions]
+                self.blocking_sizes.append(len(clause))
+                return clause
+        clause = [true_literal(cnf_solver, var) ^ 1 for var in variables]
+        self.blocking_sizes.append(len(clause))
+        return clause
+
+# Variables from a list like "1-10,15,20-22"
+def parse_variables(text: str) -> list:
+    variables = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        variables.extend(range(int(first), int(last or first) + 1))
+    return variables
+
+if __name__ == "__main__":
+    import argparse, random
+    parser = argparse.ArgumentParser(description = "Enumerate the models of a cnf")
+    parser.add_argument("input_file")
+    parser.add_argument("--limit", type = int, default = None, help = "stop after this many models")
+    parser.add_argument("--project", default = None, metavar = "VARS",
+        help = "enumerate the distinct assignments of these variables only, eg. 1-10,15")
+    parser.add_argument("--full-blocking", action = "store_true",
+        help = "block the whole (projected) model instead of its decisions")
+    parser.add_argument("--print", type = int, default = CONSTANTS.PRINT_LIMIT, metavar = "N",
+        help = "print the first N models (default: {})".format(CONSTANTS.PRINT_LIMIT))
+    parser.add_argument("--time-limit", type = float, default = None, help = "wall clock budget per model (s)")
+    args = parser.parse_args()
+    random.seed(0)
+    cnf_solver = solver.load_cnf(args.input_file)
+    projection = parse_variables(args.project) if args.project else None
+    budgets = {"time_budget": args.time_limit} if args.time_limit is not None else {}
+    enumeration = ModelEnumeration(cnf_solver, projection, args.limit, (), not args.full_blocking, **budgets)
+    start_time = time.perf_counter()
+    count = 0
+    for model in enumeration:
+        count += 1
+        if count <= args.print:
+            print("v", " ".join(str(literal) for literal in model), "0")
+            print("# Model {} in {:.4f} s".format(count, enumeration.times[-1]))
+    total_time = time.perf_counter() - start_time
+    print("# Models: ", count)
+    print("# All models found: ", enumeration.exhausted)
+    if enumeration.reason is not None:
+        print("# Out of budget: ", enumeration.reason)
+    if count:
+        model_times = enumeration.times[:count]
+        print("# Mean time per model (s): ", sum(model_times) / count)
+        print("# Max time per model (s): ", max(model_times))
+        print("# Mean blocking clause size: ", sum(enumeration.blocking_sizes) / count)
+    print("# Time (s): ", total_time)
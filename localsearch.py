@@ -0,0 +1,310 @@
+"""
+Description: Stochastic local search (ProbSAT / WalkSAT) over the clauses of a Solver, used to pick its phases
+LocalSearch starts from the saved phases of the solver (Solver.prev_assignment, FALSE if never assigned) and
+flips one variable of a random unsatisfied clause at a time:
+    probsat: a variable with probability proportional to (EPSILON + break) ** -CB
+    walksat: a variable breaking no clause if any, else with probability NOISE a random one, else one of
+    least break (ties go to the largest make)
+break(v) is the number of clauses v is the only TRUE literal of, make(v) the number of unsatisfied clauses
+with v. Both, and the list of unsatisfied clauses, are kept up to date on every flip from the number of TRUE
+literals of each clause and the XOR of them (the TRUE literal when there is only one).
+The best assignment seen is written back as the saved phases (rephasing), so the CDCL search goes there first.
+When it satisfies every clause, deciding the saved phases can not conflict (learned clauses are implied by
+the input), so the next descent from ground level finds that model.
+It runs at the start of solve() and then every interval conflicts (growing each time) on a restart, see
+Solver.reset_state(). Only the input clauses (arena, binary and unary) are walked on, simplified by the ground
+level assignment whose variables are never flipped.
+"""
+
+import time, random
+from array import array
+import solver
+from solver import LiteralState
+
+class CONSTANTS:
+    METHODS = ("probsat", "walksat")
+    # ProbSAT polynomial break function (Balint and Schoening), weight of a variable is (EPSILON + break) ** -CB
+    CB = 2.3
+    EPSILON = 1.0
+    # Weights are precomputed for break values below BREAK_TABLE_SIZE
+    BREAK_TABLE_SIZE = 64
+    # WalkSAT probability of a random variable of the clause when each one breaks some clause
+    NOISE = 0.567
+    # Flips of the first run (before the search) per clause
+    FIRST_FLIPS_PER_CLAUSE = 1
+    # Flips of a later run per propagation of the search since the previous one, a flip costs about as much
+    EFFORT = 0.1
+    # Conflicts before the first rephasing run, then the interval grows by as much after every run
+    INTERVAL = 2000
+    # Flips between two checks of the deadline and interrupt flag of the solver
+    CHECK_INTERVAL = 1024
+
+class LocalSearch:
+    """
+    Local search for a Solver, method is "probsat" or "walksat". effort and interval override
+    CONSTANTS.EFFORT and CONSTANTS.INTERVAL.
+    """
+    def __init__(self, method = "probsat", effort = None, interval = None):
+        if method not in CONSTANTS.METHODS:
+            raise ValueError("Unknown local search method {}, expected one of {}".format(method,
+                ", ".join(CONSTANTS.METHODS)))
+        self.method = method
+        self.effort = effort if effort is not None else CONSTANTS.EFFORT
+        self.interval = interval if interval is not None else CONSTANTS.INTERVAL
+        self.next_run = 0
+        # Propagations of the solver at the end of the previous run
+        self.last_propagations = 0
+        # (clause_count, var_count, ground level assignments) the clauses below were built for
+        self.built_for = None
+        # Clauses flat as literals, clause c being clause_literals[clause_start[c]:clause_start[c + 1]]
+        self.clause_literals = array('i')
+        self.clause_start = array('i', [0])
+        # occurrences[lit]: clauses containing lit
+        self.occurrences = []
+        # Variables fixed at ground level, never flipped
+        self.fixed = bytearray()
+        self.break_weights = [(CONSTANTS.EPSILON + value) ** -CONSTANTS.CB
+            for value in range(CONSTANTS.BREAK_TABLE_SIZE)]
+
+        # Statistics
+        self.runs_count = 0
+        self.flips_count = 0
+        self.models_count = 0
+        self.best_unsatisfied = None
+        self.search_time = 0.0
+
+    # Attach to cnf_solver, which then calls run() from solve() and reset_state()
+    def attach(self, cnf_solver: solver.Solver):
+        cnf_solver.local_search = self
+        self.next_run = cnf_solver.learnt_clauses_count
+
+    # The input clauses of cnf_solver without their ground level literals, rebuilt when they changed
+    def build(self, cnf_solver: solver.Solver):
+        curr_assignment = cnf_solver.curr_assignment
+        assignment_level = cnf_solver.assignment_level
+        var_count = cnf_solver.var_count
+        fixed = bytearray(var_count + 1)
+        for var in range(1, var_count + 1):
+            if curr_assignment[var] != LiteralState.L_UNASSIGNED and assignment_level[var] == 0:
+                fixed[var] = 1
+        built_for = (cnf_solver.clause_count, var_count, sum(fixed))
+        if built_for == self.built_for:
+            return
+        self.built_for = built_for
+        self.fixed = fixed
+        literal_assignment = cnf_solver.curr_literal_assignment
+        clause_literals = array('i')
+        clause_start = array('i', [0])
+        occurrences = [[] for _ in range(2 * var_count + 2)]
+
+        def add(literals):
+            kept = []
+            for lit in literals:
+                if fixed[lit >> 1]:
+                    if literal_assignment[lit] == LiteralState.L_TRUE:
+                        return
+                else:
+                    kept.append(lit)
+            if not kept:
+                # FALSE at ground level, the search finds the conflict, the walk can not satisfy it
+                return
+            clause_id = len(clause_start) - 1
+            for lit in kept:
+                occurrences[lit].append(clause_id)
+            clause_literals.extend(kept)
+            clause_start.append(len(clause_literals))
+
+        clauses = cnf_solver.clauses
+        for clause_id in range(len(clauses)):
+            if not clauses.learnt[clause_id]:
+                add(clauses.get_literals(clause_id))
+        binary_clauses = cnf_solver.binary_clauses
+        for index in range(0, len(binary_clauses), 2):
+            add(binary_clauses[index:index + 2])
+        for lit in cnf_solver.unary_clauses:
+            add((lit,))
+        self.clause_literals = clause_literals
+        self.clause_start = clause_start
+        self.occurrences = occurrences
+
+    """
+    One run from the saved phases of cnf_solver, at most flips flips (default: FIRST_FLIPS_PER_CLAUSE per clause
+    for the first run, then effort per propagation since the previous run). The best assignment found becomes
+    the saved phases. Returns True if it satisfies every clause. Nothing is done under assumptions, the walk
+    does not know about them.
+    """
+    def run(self, cnf_solver: solver.Solver, flips = None) -> bool:
+        self.next_run = cnf_solver.learnt_clauses_count + self.interval * (self.runs_count + 1)
+        if cnf_solver.assumptions or cnf_solver.empty_clause_found:
+            return False
+        start_time = time.perf_counter()
+        self.build(cnf_solver)
+        clause_literals = self.clause_literals
+        clause_start = self.clause_start
+        occurrences = self.occurrences
+        fixed = self.fixed
+        clause_count = len(clause_start) - 1
+        var_count = cnf_solver.var_count
+        propagations = cnf_solver.assignments_count - cnf_solver.decision_count
+        if flips is None:
+            if self.runs_count == 0:
+                flips = clause_count * CONSTANTS.FIRST_FLIPS_PER_CLAUSE
+            else:
+                flips = int(self.effort * (propagations - self.last_propagations))
+        self.last_propagations = propagations
+        self.runs_count += 1
+
+        # Initial assignment from the saved phases, as decide() would pick them
+        prev_assignment = cnf_solver.prev_assignment
+        value = bytearray(var_count + 1)
+        for var in range(1, var_count + 1):
+            value[var] = prev_assignment[var] == LiteralState.L_TRUE
+        # literal_value[lit]: 1 if lit is TRUE
+        literal_value = bytearray(2 * var_count + 2)
+        for var in range(1, var_count + 1):
+            literal_value[(var << 1) | value[var] ^ 1] = 1
+        true_count = array('i', [0]) * clause_count
+        true_xor = array('i', [0]) * clause_count
+        break_count = array('i', [0]) * (var_count + 1)
+        make_count = array('i', [0]) * (var_count + 1)
+        unsatisfied = []
+        unsatisfied_position = array('i', [-1]) * clause_count
+        for clause_id in range(clause_count):
+            count = 0
+            xor = 0
+            for index in range(clause_start[clause_id], clause_start[clause_id + 1]):
+                lit = clause_literals[index]
+                if literal_value[lit]:
+                    count += 1
+                    xor ^= lit
+            true_count[clause_id] = count
+            true_xor[clause_id] = xor
+            if count == 0:
+                unsatisfied_position[clause_id] = len(unsatisfied)
+                unsatisfied.append(clause_id)
+                for index in range(clause_start[clause_id], clause_start[clause_id + 1]):
+                    make_count[clause_literals[index] >> 1] += 1
+            elif count == 1:
+                break_count[xor >> 1] += 1
+
+        best_unsatisfied = len(unsatisfied)
+        best_value = bytearray(value)
+        # Variables flipped since best_value was last brought up to date
+        flipped_since_best = []
+        rand = random.random
+        break_weights = self.break_weights
+        table_size = CONSTANTS.BREAK_TABLE_SIZE
+        walksat = self.method == "walksat"
+        noise = CONSTANTS.NOISE
+        flip_index = 0
+        while unsatisfied and flip_index < flips:
+            flip_index += 1
+            if not flip_index % CONSTANTS.CHECK_INTERVAL and (cnf_solver.interrupted or
+                    (cnf_solver.deadline is not None and time.perf_counter() >= cnf_solver.deadline)):
+                break
+            clause_id = unsatisfied[int(rand() * len(unsatisfied))]
+            start, end = clause_start[clause_id], clause_start[clause_id + 1]
+            if walksat:
+                selected_var = 0
+                least_break = -1
+                most_make = -1
+                for index in range(start, end):
+                    var = clause_literals[index] >> 1
+                    breaks = break_count[var]
+                    if least_break < 0 or breaks < least_break or (breaks == least_break and
+                            make_count[var] > most_make):
+                        selected_var, least_break, most_make = var, breaks, make_count[var]
+                if least_break > 0 and rand() < noise:
+                    selected_var = clause_literals[start + int(rand() * (end - start))] >> 1
+            else:
+                weights = []
+                for index in range(start, end):
+                    breaks = break_count[clause_literals[index] >> 1]
+                    weights.append(break_weights[breaks] if breaks < table_size else
+                        (CONSTANTS.EPSILON + breaks) ** -CONSTANTS.CB)
+                threshold = rand() * sum(weights)
+                selected_var = clause_literals[end - 1] >> 1
+                for index in range(start, end):
+                    threshold -= weights[index - start]
+                    if threshold <= 0:
+                        selected_var = clause_literals[index] >> 1
+                        break
+
+            # Flip selected_var: true_lit becomes TRUE, false_lit FALSE
+            value[selected_var] ^= 1
+            true_lit = (selected_var << 1) | value[selected_var] ^ 1
+            false_lit = true_lit ^ 1
+            literal_value[true_lit] = 1
+            literal_value[false_lit] = 0
+            for clause_id in occurrences[true_lit]:
+                count = true_count[clause_id]
+                if count == 0:
+                    # Satisfied now, selected_var is its only TRUE literal
+                    position = unsatisfied_position[clause_id]
+                    last_id = unsatisfied.pop()
+                    if last_id != clause_id:
+                        unsatisfied[position] = last_id
+                        unsatisfied_position[last_id] = position
+                    unsatisfied_position[clause_id] = -1
+                    for index in range(clause_start[clause_id], clause_start[clause_id + 1]):
+                        make_count[clause_literals[index] >> 1] -= 1
+                    break_count[selected_var] += 1
+                elif count == 1:
+                    break_count[true_xor[clause_id] >> 1] -= 1
+                true_count[clause_id] = count + 1
+                true_xor[clause_id] ^= true_lit
+            for clause_id in occurrences[false_lit]:
+                count = true_count[clause_id] - 1
+                true_count[clause_id] = count
+                xor = true_xor[clause_id] ^ false_lit
+                true_xor[clause_id] = xor
+                if count == 0:
+                    unsatisfied_position[clause_id] = len(unsatisfied)
+                    unsatisfied.append(clause_id)
+                    for index in range(clause_start[clause_id], clause_start[clause_id + 1]):
+                        make_count[clause_literals[index] >> 1] += 1
+                    break_count[selected_var] -= 1
+                elif count == 1:
+                    break_count[xor >> 1] += 1
+            flipped_since_best.append(selected_var)
+            if len(unsatisfied) < best_unsatisfied:
+                best_unsatisfied = len(unsatisfied)
+                for var in flipped_since_best:
+                    best_value[var] = value[var]
+                flipped_since_best.clear()
+
+        # Rephase: the best assignment becomes the saved phases (ground level ones are left alone)
+        for var in range(1, var_count + 1):
+            if not fixed[var]:
+                prev_assignment[var] = LiteralState.L_TRUE if best_value[var] else LiteralState.L_FALSE
+        self.flips_count += flip_index
+        if self.best_unsatisfied is None or best_unsatisfied < self.best_unsatisfied:
+            self.best_unsatisfied = best_unsatisfied
+        self.search_time += time.perf_counter() - start_time
+        if best_unsatisfied == 0:
+            self.models_count += 1
+            return True
+        return False
+
+    def print_statistics(self):
+        print("## Local search: ")
+        print("# Method: ", self.method)
+        print("# Runs: ", self.runs_count)
+        print("# Flips: ", self.flips_count)
+        print("# Models found: ", self.models_count)
+        print("# Fewest unsatisfied clauses: ", self.best_unsatisfied)
+        print("# Local search time (s): ", self.search_time)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Local search alone on a cnf, from all FALSE phases")
+    parser.add_argument("input_file")
+    parser.add_argument("--method", choices = CONSTANTS.METHODS, default = "probsat")
+    parser.add_argument("--flips", type = int, default = None, metavar = "N",
+        help = "flips of the walk (default: {} per clause)".format(CONSTANTS.FIRST_FLIPS_PER_CLAUSE))
+    args = parser.parse_args()
+    random.seed(0)
+    cnf_solver = solver.load_cnf(args.input_file)
+    local_search = LocalSearch(args.method)
+    print("SATISFIABLE" if local_search.run(cnf_solver, args.flips) else "UNKNOWN")
+    local_search.print_statistics()
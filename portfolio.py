@@ -0,0 +1,219 @@
+"""
+Description: Portfolio mode, differently configured Solvers race on the same cnf in worker processes
+The cnf is parsed (and optionally preprocessed) once, its DIMACS literals are put in shared memory and every
+worker builds its own Solver from there. Workers differ in the seed of the random watcher choice, the
+variable activity decay, the restart policy and the initial phase. The first worker to answer SAT / UNSAT
+wins, the others are interrupted (see Solver.interrupt()) and report their statistics, which are merged.
+"""
+
+import os, time, random, threading, queue
+import multiprocessing
+from multiprocessing import shared_memory
+from array import array
+import dimacs
+import clause_matrix
+import solver
+from preprocess import Preprocessor
+
+class CONSTANTS:
+    # Worker i takes entry i % len of each of these, worker 0 is configured like the sequential solver
+    VAR_DECAY_RATES = (0.95, 0.85, 0.99, 0.9, 0.8)
+    RESTART_CONFIGS = (
+        ("geometric", {}),
+        ("luby", {"unit": 100}),
+        ("glucose", {"margin": 1.25}),
+        ("luby", {"unit": 512}),
+        ("geometric", {"lower_bound": 50, "multiplier": 1.5}),
+        ("glucose", {"margin": 1.1}),
+        ("none", {}),
+    )
+    # Decision value of a variable before it was ever assigned (see Solver.get_lit_memoised())
+    PHASES = ("false", "true", "random")
+    # Seconds the interrupted workers get to report their statistics before being terminated
+    CANCEL_TIMEOUT = 5.0
+    # Seconds between checks for crashed workers while waiting for results
+    POLL_INTERVAL = 0.1
+
+def make_worker_config(index: int, seed: int) -> dict:
+    restart, restart_parameters = CONSTANTS.RESTART_CONFIGS[index % len(CONSTANTS.RESTART_CONFIGS)]
+    return {
+        "seed": seed + index,
+        "var_decay_rate": CONSTANTS.VAR_DECAY_RATES[index % len(CONSTANTS.VAR_DECAY_RATES)],
+        "restart": restart,
+        "restart_parameters": restart_parameters,
+        "phase": CONSTANTS.PHASES[index % len(CONSTANTS.PHASES)],
+    }
+
+def describe_config(config: dict) -> str:
+    return "seed {}, var decay {}, restart {} {}, phase {}".format(config["seed"], config["var_decay_rate"],
+        config["restart"], config["restart_parameters"], config["phase"])
+
+def set_initial_phase(worker_solver: solver.Solver, phase: str):
+    prev_assignment = worker_solver.prev_assignment
+    for var in range(1, worker_solver.var_count + 1):
+        if prev_assignment[var] != -1:
+            continue # already fixed by a unary clause
+        if phase == "true" or (phase == "random" and random.random() < 0.5):
+            prev_assignment[var] = solver.LiteralState.L_TRUE
+        else:
+            prev_assignment[var] = solver.LiteralState.L_FALSE
+
+# Copy dimacs_literals to a new block of shared memory, which the caller must close() and unlink()
+def share_literals(dimacs_literals) -> shared_memory.SharedMemory:
+    size = len(dimacs_literals) * dimacs_literals.itemsize
+    memory = shared_memory.SharedMemory(create = True, size = max(1, size))
+    memory.buf[:size] = dimacs_literals.tobytes()
+    return memory
+
+# Private copy (the Solver keeps and modifies its clauses) of the literals put in shared memory by share_literals()
+def read_shared_literals(memory_name: str, literal_count: int) -> array:
+    dimacs_literals = array('i')
+    memory = shared_memory.SharedMemory(name = memory_name)
+    try:
+        dimacs_literals.frombytes(memory.buf[:literal_count * dimacs_literals.itemsize])
+    finally:
+        memory.close()
+    return dimacs_literals
+
+# Runs in a watcher thread of the worker, the solver itself only checks a plain flag
+def interrupt_on_event(stop_event, worker_solver: solver.Solver):
+    stop_event.wait()
+    worker_solver.interrupt()
+
+"""
+Entry point of a worker process. Copies the cnf out of shared memory, solves it and puts
+(index, status, won, model, statistics, solve_time) on results. The first worker to finish sets stop_event,
+which interrupts the others, only that one sends its model.
+"""
+def run_worker(index: int, config: dict, memory_name: str, literal_count: int, var_count: int, clause_count: int,
+        stop_event, results):
+    start_time = time.process_time()
+    dimacs_literals = read_shared_literals(memory_name, literal_count)
+    random.seed(config["seed"])
+    worker_solver = solver.Solver(var_count, clause_count,
+        solver.make_restart_policy(config["restart"], **config["restart_parameters"]))
+    worker_solver.var_decay_rate = config["var_decay_rate"]
+    worker_solver.insert_input_clauses(dimacs_literals)
+    set_initial_phase(worker_solver, config["phase"])
+    worker_solver.parse_time = time.process_time() - start_time
+
+    threading.Thread(target = interrupt_on_event, args = (stop_event, worker_solver), daemon = True).start()
+    start_time = time.process_time()
+    result = worker_solver.solve()
+    solve_time = time.process_time() - start_time
+    won = not result.unknown and not stop_event.is_set()
+    if won:
+        stop_event.set()
+    results.put((index, result.status, won, result.model if won else None, worker_solver.get_statistics(),
+        solve_time))
+
+"""
+Solve input_file with worker_count worker processes, returns (SolveResult, report) where report holds
+the per worker results as (index, config, status, statistics, solve_time) in "workers", the index of the
+winning worker in "winner" (None if no worker finished) and the merged statistics in "statistics".
+The model of a SATISFIABLE result is extended to the variables removed by preprocessing.
+"""
+def solve_portfolio(input_file, worker_count = None, seed = 0, preprocess = False) -> (solver.SolveResult, dict):
+    if worker_count is None:
+        worker_count = os.cpu_count() or 1
+    var_count, clause_count, dimacs_literals = dimacs.read_dimacs(input_file)
+    original_literals = dimacs_literals
+    preprocessor = None
+    if preprocess:
+        preprocessor = Preprocessor(var_count, dimacs_literals)
+        preprocessor.run()
+        preprocessor.print_statistics()
+        dimacs_literals = preprocessor.get_dimacs_literals()
+
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    results = context.Queue()
+    memory = share_literals(dimacs_literals)
+    workers = []
+    reports = {}
+    winner = None
+    status = solver.SolverState.S_UNRESOLVED
+    model = None
+    try:
+        configs = [make_worker_config(index, seed) for index in range(worker_count)]
+        for index, config in enumerate(configs):
+            worker = context.Process(target = run_worker, args = (index, config, memory.name, len(dimacs_literals),
+                var_count, clause_count, stop_event, results), daemon = True)
+            worker.start()
+            workers.append(worker)
+        deadline = None
+        while len(reports) < worker_count:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            try:
+                index, worker_status, won, worker_model, statistics, solve_time = results.get(
+                    timeout = CONSTANTS.POLL_INTERVAL)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break # some worker died without reporting
+                continue
+            reports[index] = (index, configs[index], worker_status, statistics, solve_time)
+            if won and winner is None:
+                winner = index
+                status = worker_status
+                model = worker_model
+            if stop_event.is_set() and deadline is None:
+                deadline = time.monotonic() + CONSTANTS.CANCEL_TIMEOUT
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join(CONSTANTS.CANCEL_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        memory.close()
+        memory.unlink()
+
+    if model is not None and preprocessor is not None:
+        values = [False] + [literal > 0 for literal in model]
+        preprocessor.extend_model(values)
+        model = [var if values[var] else -var for var in range(1, var_count + 1)]
+    report = {
+        "workers": [reports[index] for index in sorted(reports)],
+        "winner": winner,
+        "statistics": solver.merge_statistics([statistics for _, _, _, statistics, _ in reports.values()]),
+        "original_literals": original_literals,
+    }
+    return solver.SolveResult(status, model = model), report
+
+def print_report(report: dict, wall_time):
+    print("## Portfolio: ")
+    for index, config, status, statistics, solve_time in report["workers"]:
+        print("# Worker {} ({}): {} after {:.3f} s{}".format(index, describe_config(config),
+            solver.SolveResult(status).status_name(), solve_time, " [winner]" if index == report["winner"] else ""))
+    solver.print_statistics(report["statistics"], wall_time)
+
+# A model is written to assignment_file, if given
+def read_and_solve_cnf(input_file, worker_count = None, seed = 0, preprocess = False, assignment_file = None):
+    start_time = time.perf_counter()
+    result, report = solve_portfolio(input_file, worker_count, seed, preprocess)
+    wall_time = time.perf_counter() - start_time
+    print(result.status_name())
+    if result.satisfiable:
+        values = [False] + [literal > 0 for literal in result.model]
+        unsatisfied = clause_matrix.count_unsatisfied(report["original_literals"], values)
+        if not unsatisfied:
+            print("AC, All clauses evaluate to true under given assignment")
+        else:
+            print("WA, {} unsatisfied clauses found".format(unsatisfied))
+        if assignment_file is not None:
+            solver.write_model(result.model, assignment_file)
+    print_report(report, wall_time)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Portfolio of CDCL SAT solvers racing in worker processes")
+    parser.add_argument("input_file", nargs = "?", default = "input/sat/bmc-1.cnf")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes (default: cpu count)")
+    parser.add_argument("--seed", type = int, default = 0, help = "worker i uses seed + i (default: 0)")
+    parser.add_argument("--preprocess", action = "store_true",
+        help = "preprocess once before starting the workers (see solver.py)")
+    parser.add_argument("--assignment", default = None, metavar = "FILE",
+        help = "write the model to FILE (default: not written)")
+    args = parser.parse_args()
+    read_and_solve_cnf(args.input_file, args.workers, args.seed, args.preprocess, args.assignment)
@@ -0,0 +1,289 @@
+"""
+Description: CNF preprocessing run between parsing and run_cdcl() (see solver.load_cnf())
+    1. Unit propagation
+    2. Backward subsumption and self-subsuming resolution (strengthening)
+    3. Bounded variable elimination
+Clauses are kept as sets of DIMACS literals, the reduced formula is handed to the Solver in the same
+format as dimacs.read_dimacs() returns. Eliminated variables are given a value afterwards by replaying
+the model reconstruction stack in extend_model().
+"""
+
+import time
+from array import array
+import clause_matrix
+
+class CONSTANTS:
+    # Each technique stops once it has spent TIME_LIMIT seconds
+    TIME_LIMIT = 10.0
+    # Subsumption stops after this many clause pair checks
+    SUBSUMPTION_STEP_LIMIT = 2000000
+    # Clauses longer than this are not used to subsume others
+    SUBSUMPTION_CLAUSE_LIMIT = 100
+    # Variables with more occurrences (both polarities) than this are not eliminated
+    ELIMINATION_OCCURRENCE_LIMIT = 16
+    # A variable is not eliminated if that would produce a resolvent longer than this
+    ELIMINATION_RESOLVENT_LIMIT = 20
+
+class Preprocessor:
+    def __init__(self, var_count: int, dimacs_literals):
+        self.var_count = var_count
+        # The input formula is kept to verify the final model against it
+        self.original_literals = dimacs_literals
+        # clause_id -> set of literals, None once the clause is removed
+        self.clauses = []
+        # occurs[lit + var_count]: ids of the clauses containing lit
+        self.occurs = [set() for _ in range(2 * var_count + 1)]
+        # value[var]: 1 / -1 if var has been fixed TRUE / FALSE by a unit, 0 otherwise
+        self.value = [0] * (var_count + 1)
+        self.unit_queue = []
+        self.eliminated = bytearray(var_count + 1)
+        # Entries (witness, clause): while extending the model, the witness literal is set TRUE if clause is not
+        self.reconstruction_stack = []
+        self.unsatisfiable = False
+
+        # Statistics
+        self.vars_before = self.count_variables(dimacs_literals)
+        self.clauses_before = dimacs_literals.count(0)
+        self.vars_after = 0
+        self.clauses_after = 0
+        self.units_count = 0
+        self.subsumed_count = 0
+        self.strengthened_count = 0
+        self.eliminated_count = 0
+        self.resolvents_count = 0
+        self.times = {"propagation": 0.0, "subsumption": 0.0, "elimination": 0.0}
+
+        start = 0
+        while start < len(dimacs_literals):
+            stop = dimacs_literals.index(0, start)
+            self.add_clause(set(dimacs_literals[start:stop]))
+            start = stop + 1
+
+    @staticmethod
+    def count_variables(dimacs_literals) -> int:
+        return len(set(abs(literal) for literal in dimacs_literals)) - (0 in dimacs_literals)
+
+    # Add a clause simplified under the current units, tautologies are dropped
+    def add_clause(self, clause: set):
+        if self.unsatisfiable:
+            return
+        for lit in list(clause):
+            if -lit in clause:
+                return
+            value = self.value[abs(lit)]
+            if value:
+                if (value > 0) == (lit > 0):
+                    return
+                clause.discard(lit)
+        if not clause:
+            self.unsatisfiable = True
+        elif len(clause) == 1:
+            self.assign(next(iter(clause)))
+        else:
+            clause_id = len(self.clauses)
+            self.clauses.append(clause)
+            for lit in clause:
+                self.occurs[lit + self.var_count].add(clause_id)
+
+    def remove_clause(self, clause_id: int):
+        for lit in self.clauses[clause_id]:
+            self.occurs[lit + self.var_count].discard(clause_id)
+        self.clauses[clause_id] = None
+
+    # Remove lit from the clause, the clause may become a unit
+    def strengthen(self, clause_id: int, lit: int):
+        clause = self.clauses[clause_id]
+        clause.discard(lit)
+        self.occurs[lit + self.var_count].discard(clause_id)
+        if len(clause) == 1:
+            self.remove_clause(clause_id)
+            self.assign(next(iter(clause)))
+
+    def assign(self, lit: int):
+        value = self.value[abs(lit)]
+        if value:
+            if (value > 0) != (lit > 0):
+                self.unsatisfiable = True
+            return
+        self.value[abs(lit)] = 1 if lit > 0 else -1
+        self.unit_queue.append(lit)
+        self.units_count += 1
+
+    # 1. Unit propagation: remove the clauses satisfied by a unit and the FALSE literals from the rest
+    def propagate(self):
+        start_time = time.process_time()
+        offset = self.var_count
+        while self.unit_queue and not self.unsatisfiable:
+            lit = self.unit_queue.pop()
+            for clause_id in list(self.occurs[lit + offset]):
+                self.remove_clause(clause_id)
+            for clause_id in list(self.occurs[-lit + offset]):
+                if self.clauses[clause_id] is not None:
+                    self.strengthen(clause_id, -lit)
+        self.times["propagation"] += time.process_time() - start_time
+
+    """
+    Returns True if clause subsumes other (clause is a subset of other), lit if clause would subsume
+    other with lit negated (so -lit can be removed from other: self-subsuming resolution), None otherwise.
+    """
+    @staticmethod
+    def subsumes(clause: set, other: set):
+        flipped = None
+        for lit in clause:
+            if lit in other:
+                continue
+            if flipped is None and -lit in other:
+                flipped = lit
+                continue
+            return None
+        return True if flipped is None else flipped
+
+    """
+    2. Backward subsumption: every clause (shortest first) is checked against the clauses containing its least
+    occurring variable. Subsumed clauses are removed, clauses which can be strengthened by self-subsuming
+    resolution lose a literal and are queued again.
+    """
+    def subsume(self):
+        start_time = time.process_time()
+        offset = self.var_count
+        steps = 0
+        queue = sorted((clause_id for clause_id, clause in enumerate(self.clauses) if clause is not None),
+            key = lambda clause_id: len(self.clauses[clause_id]))
+        index = 0
+        while index < len(queue) and not self.unsatisfiable:
+            if steps > CONSTANTS.SUBSUMPTION_STEP_LIMIT or time.process_time() - start_time > CONSTANTS.TIME_LIMIT:
+                break
+            clause_id = queue[index]
+            index += 1
+            clause = self.clauses[clause_id]
+            if clause is None or len(clause) > CONSTANTS.SUBSUMPTION_CLAUSE_LIMIT:
+                continue
+            best = min(clause, key = lambda lit: len(self.occurs[lit + offset]) + len(self.occurs[-lit + offset]))
+            candidates = list(self.occurs[best + offset]) + list(self.occurs[-best + offset])
+            for other_id in candidates:
+                other = self.clauses[other_id]
+                if other_id == clause_id or other is None or len(other) < len(clause):
+                    continue
+                steps += 1
+                result = self.subsumes(clause, other)
+                if result is True:
+                    self.remove_clause(other_id)
+                    self.subsumed_count += 1
+                elif result is not None:
+                    self.strengthen(other_id, -result)
+                    self.strengthened_count += 1
+                    if self.clauses[other_id] is not None:
+                        queue.append(other_id)
+                if self.clauses[clause_id] is None:
+                    # clause itself became a unit through strengthening
+                    break
+            if self.unit_queue:
+                self.propagate()
+        self.times["subsumption"] += time.process_time() - start_time
+
+    # Resolvent of two clauses on var, None if it is a tautology
+    @staticmethod
+    def resolve(clause: set, other: set, var: int):
+        resolvent = set(lit for lit in clause if lit != var)
+        for lit in other:
+            if lit == -var:
+                continue
+            if -lit in resolvent:
+                return None
+            resolvent.add(lit)
+        return resolvent
+
+    """
+    3. Bounded variable elimination: a variable is replaced by all the non tautological resolvents of its
+    positive and negative occurrences, if that does not increase the number of clauses.
+    The removed clauses go to the reconstruction stack.
+    """
+    def eliminate(self):
+        start_time = time.process_time()
+        offset = self.var_count
+        candidates = [var for var in range(1, self.var_count + 1)
+            if not self.value[var] and (self.occurs[var + offset] or self.occurs[-var + offset])]
+        candidates.sort(key = lambda var: len(self.occurs[var + offset]) * len(self.occurs[-var + offset]))
+        for var in candidates:
+            if self.unsatisfiable or time.process_time() - start_time > CONSTANTS.TIME_LIMIT:
+                break
+            if self.value[var]:
+                continue
+            positive = list(self.occurs[var + offset])
+            negative = list(self.occurs[-var + offset])
+            occurrence_count = len(positive) + len(negative)
+            if occurrence_count > CONSTANTS.ELIMINATION_OCCURRENCE_LIMIT:
+                continue
+            resolvents = []
+            bounded = True
+            for positive_id in positive:
+                for negative_id in negative:
+                    resolvent = self.resolve(self.clauses[positive_id], self.clauses[negative_id], var)
+                    if resolvent is None:
+                        continue
+                    if len(resolvent) > CONSTANTS.ELIMINATION_RESOLVENT_LIMIT or len(resolvents) >= occurrence_count:
+                        bounded = False
+                        break
+                    resolvents.append(resolvent)
+                if not bounded:
+                    break
+            if not bounded:
+                continue
+            for witness, clause_ids in ((var, positive), (-var, negative)):
+                for clause_id in clause_ids:
+                    self.reconstruction_stack.append((witness, tuple(self.clauses[clause_id])))
+                    self.remove_clause(clause_id)
+            self.eliminated[var] = 1
+            self.eliminated_count += 1
+            self.resolvents_count += len(resolvents)
+            for resolvent in resolvents:
+                self.add_clause(resolvent)
+            self.propagate()
+        self.times["elimination"] += time.process_time() - start_time
+
+    def run(self):
+        self.propagate()
+        if not self.unsatisfiable:
+            self.subsume()
+        if not self.unsatisfiable:
+            self.eliminate()
+        clauses = [clause for clause in self.clauses if clause is not None]
+        self.clauses_after = len(clauses) + sum(1 for value in self.value if value)
+        self.vars_after = len(set(abs(lit) for clause in clauses for lit in clause)) + sum(
+            1 for value in self.value if value)
+
+    # The reduced formula in the format of dimacs.read_dimacs(): units first, then the remaining clauses
+    def get_dimacs_literals(self) -> array:
+        literals = array('i')
+        if self.unsatisfiable:
+            literals.append(0) # the empty clause
+            return literals
+        for var in range(1, self.var_count + 1):
+            if self.value[var]:
+                literals.append(var * self.value[var])
+                literals.append(0)
+        for clause in self.clauses:
+            if clause is not None:
+                literals.extend(clause)
+                literals.append(0)
+        return literals
+
+    # model[var] is the value (True / False) of var in a model of the reduced formula, extended in place
+    def extend_model(self, model: list):
+        for witness, clause in reversed(self.reconstruction_stack):
+            if not any(model[abs(lit)] == (lit > 0) for lit in clause):
+                model[abs(witness)] = witness > 0
+
+    # Number of clauses of the input formula not satisfied by model
+    def count_unsatisfied_original(self, model: list) -> int:
+        return clause_matrix.count_unsatisfied(self.original_literals, model)
+
+    def print_statistics(self):
+        print("## Preprocessing: ")
+        print("# Variables: ", self.vars_before, "->", self.vars_after)
+        print("# Clauses: ", self.clauses_before, "->", self.clauses_after)
+        print("# Unit propagation: {} units, {:.3f} s".format(self.units_count, self.times["propagation"]))
+        print("# Subsumption: {} subsumed, {} strengthened, {:.3f} s".format(
+            self.subsumed_count, self.strengthened_count, self.times["subsumption"]))
+        print("# Variable elimination: {} eliminated, {} resolvents, {:.3f} s".format(
+            self.eliminated_count, self.resolvents_count, self.times["elimination"]))
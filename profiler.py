@@ -0,0 +1,214 @@
+"""
+Description: Per phase profiling and live statistics for a Solver
+Nothing in solver.py knows about the profiler, so it costs nothing unless attached. Two modes:
+1. "timing": the phase methods (bcp, analyze_conflict, decide, backtrack, reset_state, reduce_db) are wrapped
+   on the solver instance (shadowing the class methods) to add up their exact times and calls.
+2. "sampling": a profiling timer signal (setitimer, Unix only) fires every sample_interval seconds of CPU
+   time and the phase on top of the call stack gets the sample. Cheap enough to be left on in production.
+Every progress_interval conflicts a snapshot (rates, phase times, watch list length and learned clause size
+histograms) is passed to the progress callback, see json_lines() for a JSON lines emitter.
+The signal handler may run in the middle of any solver update (eg. ClauseArena.add()), so it only counts the
+sample and sets progress_due. The snapshot is taken after analyze_conflict() returns, which is wrapped (in
+both modes) when there is a progress callback.
+"""
+
+import sys, time, json, signal
+
+class CONSTANTS:
+    PHASES = ("bcp", "analyze_conflict", "decide", "backtrack", "reset_state", "reduce_db")
+    # Seconds of CPU time between two samples in sampling mode
+    SAMPLE_INTERVAL = 0.01
+
+# Counts by power of two buckets: bucket b holds the values in [2^(b-1), 2^b), bucket 0 the zeros
+def histogram(values) -> dict:
+    counts = {}
+    for value in values:
+        bucket = int(value).bit_length()
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return {"<{}".format(1 << bucket): counts[bucket] for bucket in sorted(counts)}
+
+# A progress callback which writes every snapshot as one line of JSON to stream
+def json_lines(stream = sys.stderr):
+    def emit(snapshot: dict):
+        stream.write(json.dumps(snapshot) + "\n")
+        stream.flush()
+    return emit
+
+class Profiler:
+    def __init__(self, solver, mode = "timing", progress_interval = 0, progress = None,
+            sample_interval = CONSTANTS.SAMPLE_INTERVAL):
+        if mode not in ("timing", "sampling"):
+            raise ValueError("Unknown profiling mode {}, expected timing or sampling".format(mode))
+        self.solver = solver
+        self.mode = mode
+        # progress(snapshot) is called every progress_interval conflicts, never if 0
+        self.progress_interval = progress_interval
+        self.progress = progress
+        self.next_progress = progress_interval
+        self.sample_interval = sample_interval
+        # phase -> [seconds, calls] in timing mode, phase -> [unused, samples] in sampling mode
+        self.phases = {phase: [0.0, 0] for phase in CONSTANTS.PHASES}
+        self.samples_count = 0
+        # Set by the SIGPROF handler, the progress check is left to the next analyze_conflict() return
+        self.progress_due = False
+        self.start_time = 0.0
+        self.stop_time = None
+        self.previous_handler = None
+
+    def attach(self):
+        self.start_time = time.perf_counter()
+        self.stop_time = None
+        if self.mode == "timing":
+            for phase in CONSTANTS.PHASES:
+                setattr(self.solver, phase, self.timed(phase, getattr(self.solver, phase)))
+        else:
+            if self.progress_interval:
+                self.solver.analyze_conflict = self.progress_checked(self.solver.analyze_conflict)
+            self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.sample_interval, self.sample_interval)
+        return self
+
+    def detach(self):
+        self.stop_time = time.perf_counter()
+        if self.mode == "timing":
+            for phase in CONSTANTS.PHASES:
+                # The class method is visible again
+                self.solver.__dict__.pop(phase, None)
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler)
+            self.solver.__dict__.pop("analyze_conflict", None)
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, *exception):
+        self.detach()
+
+    def timed(self, phase: str, method):
+        entry = self.phases[phase]
+        clock = time.perf_counter
+        check_progress = self.check_progress if phase == "analyze_conflict" and self.progress_interval else None
+        def wrapper(*args):
+            start_time = clock()
+            result = method(*args)
+            entry[0] += clock() - start_time
+            entry[1] += 1
+            if check_progress is not None:
+                check_progress()
+            return result
+        return wrapper
+
+    # Sampling mode: check the progress once analyze_conflict() is done, if a sample asked for it
+    def progress_checked(self, method):
+        def wrapper(*args):
+            result = method(*args)
+            if self.progress_due:
+                self.progress_due = False
+                self.check_progress()
+            return result
+        return wrapper
+
+    # SIGPROF handler: charge the sample to the innermost phase on the stack, "other" if none
+    # Nothing else is done here, the solver may be halfway through changing its clauses
+    def sample(self, signum, frame):
+        self.samples_count += 1
+        phases = self.phases
+        while frame is not None:
+            entry = phases.get(frame.f_code.co_name)
+            if entry is not None:
+                entry[1] += 1
+                break
+            frame = frame.f_back
+        if self.progress_interval:
+            self.progress_due = True
+
+    def check_progress(self):
+        if self.solver.learnt_clauses_count >= self.next_progress:
+            self.next_progress = self.solver.learnt_clauses_count + self.progress_interval
+            if self.progress is not None:
+                self.progress(self.snapshot())
+
+    # Seconds spent per phase, estimated from the samples in sampling mode
+    def phase_times(self) -> dict:
+        if self.mode == "timing":
+            return {phase: entry[0] for phase, entry in self.phases.items()}
+        return {phase: entry[1] * self.sample_interval for phase, entry in self.phases.items()}
+
+    def snapshot(self) -> dict:
+        solver = self.solver
+        elapsed = (self.stop_time if self.stop_time is not None else time.perf_counter()) - self.start_time
+        rate = 1 / elapsed if elapsed > 0 else 0.0
+        conflicts = solver.learnt_clauses_count
+        propagations = solver.assignments_count - solver.decision_count
+        clauses = solver.clauses
+        return {
+            "mode": self.mode,
+            "elapsed": elapsed,
+            "conflicts": conflicts,
+            "decisions": solver.decision_count,
+            "propagations": propagations,
+            "restarts": solver.restart_count,
+            "conflicts_per_second": conflicts * rate,
+            "decisions_per_second": solver.decision_count * rate,
+            "propagations_per_second": propagations * rate,
+            "phase_times": self.phase_times(),
+            "phase_calls": {phase: entry[1] for phase, entry in self.phases.items()} if self.mode == "timing" else {},
+            "samples": self.samples_count,
+            # Entries per literal, a watch list is flat [clause_id, blocker, ...]
+            "watch_lengths": histogram(len(watches) // 2 for watches in solver.watch_map[2:]),
+            # Learned clauses currently in the arena (binary ones are not stored there)
+            "learned_sizes": histogram(size for size, learnt in zip(clauses.size, clauses.learnt) if learnt),
+        }
+
+    def print_report(self):
+        snapshot = self.snapshot()
+        times = snapshot["phase_times"]
+        print("## Profile ({}): ".format(self.mode))
+        accounted = sum(times.values())
+        total = max(snapshot["elapsed"], accounted, 1e-9)
+        for phase in CONSTANTS.PHASES:
+            calls = ", {} calls".format(snapshot["phase_calls"][phase]) if self.mode == "timing" else ""
+            print("# {}: {:.3f} s ({:.1f}%{})".format(phase, times[phase], 100 * times[phase] / total, calls))
+        print("# other: {:.3f} s ({:.1f}%)".format(total - accounted, 100 * (total - accounted) / total))
+        if self.mode == "sampling":
+            print("# Samples: ", snapshot["samples"])
+        print("# Conflicts / s: {:.1f}".format(snapshot["conflicts_per_second"]))
+        print("# Decisions / s: {:.1f}".format(snapshot["decisions_per_second"]))
+        print("# Propagations / s: {:.1f}".format(snapshot["propagations_per_second"]))
+        print("# Watch list lengths: ", snapshot["watch_lengths"])
+        print("# Learned clause sizes: ", snapshot["learned_sizes"])
+
+"""
+Overhead of the profiler: solve every cnf repeat times without profiler, in sampling and in timing mode
+(fresh solver, same seed each time) and print the best time of each with the overhead relative to no profiler.
+"""
+def measure_overhead(cnfs: list, repeat: int = 3):
+    import random
+    import solver as solver_module
+    for cnf in cnfs:
+        best = {}
+        for mode in (None, "sampling", "timing"):
+            for _ in range(repeat):
+                random.seed(0)
+                cnf_solver = solver_module.load_cnf(cnf)
+                profiler = Profiler(cnf_solver, mode) if mode is not None else None
+                start_time = time.process_time()
+                if profiler is not None:
+                    profiler.attach()
+                cnf_solver.solve()
+                if profiler is not None:
+                    profiler.detach()
+                solve_time = time.process_time() - start_time
+                best[mode] = min(best.get(mode, solve_time), solve_time)
+        print("{}: off {:.3f} s, sampling {:.3f} s ({:+.1f}%), timing {:.3f} s ({:+.1f}%)".format(cnf, best[None],
+            best["sampling"], 100 * (best["sampling"] / best[None] - 1),
+            best["timing"], 100 * (best["timing"] / best[None] - 1)), flush = True)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Measure the overhead of the profiler")
+    parser.add_argument("cnfs", nargs = "*", default = ["input/sat/bmc-2.cnf", "input/sat/bmc-7.cnf"])
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per mode, the best is kept (default: 3)")
+    args = parser.parse_args()
+    measure_overhead(args.cnfs, args.repeat)
@@ -0,0 +1,316 @@
+"""
+Description: DRAT proofs of unsatisfiability, written by the Solver and checked offline
+ProofWriter logs the clauses learned in analyze_conflict() (additions) and the ones deleted in reduce_db()
+(deletions), in the binary or textual DRAT format, through a large buffer optionally drained by a background
+thread. check_proof() is a simple DRAT checker for small cnfs, in forward (every lemma) or backward (only the
+lemmas needed for the empty clause) mode.
+"""
+
+import os, time, queue, threading
+import dimacs
+from solver import get_dimacs_literal
+
+class CONSTANTS:
+    # Bytes collected before the buffer is handed to the file (or the background writer)
+    BUFFER_SIZE = 1 << 20
+    # Buffers waiting for the background writer, the solver blocks beyond that
+    QUEUE_BUFFERS = 16
+
+class ProofWriter:
+    """
+    Appends additions / deletions of clauses (given as Solver literals) to a DRAT proof file.
+    Binary format: b"a" or b"d", the literals as variable length integers (7 bits per byte, low bits
+    first), then a 0 byte. Textual format: "l1 l2 ... 0" and "d l1 l2 ... 0" lines of DIMACS literals.
+    """
+    def __init__(self, file_name: str, binary = True, buffer_size = CONSTANTS.BUFFER_SIZE, background = True):
+        self.file = open(file_name, "wb")
+        self.binary = binary
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.additions_count = 0
+        self.deletions_count = 0
+        self.queue = None
+        self.writer = None
+        if background:
+            self.queue = queue.Queue(CONSTANTS.QUEUE_BUFFERS)
+            self.writer = threading.Thread(target = self.write_buffers, daemon = True)
+            self.writer.start()
+
+    def write_buffers(self):
+        while True:
+            buffer = self.queue.get()
+            if buffer is None:
+                return
+            self.file.write(buffer)
+
+    def append(self, prefix: bytes, literals):
+        buffer = self.buffer
+        if self.binary:
+            buffer += prefix
+            # Solver literals (2v for v, 2v + 1 for -v) are already the binary DRAT encoding
+            for lit in literals:
+                code = lit
+                while code > 127:
+                    buffer.append((code & 127) | 128)
+                    code >>= 7
+                buffer.append(code)
+            buffer.append(0)
+        else:
+            if prefix == b"d":
+                buffer += b"d "
+            for lit in literals:
+                buffer += b"%d " % get_dimacs_literal(lit)
+            buffer += b"0\n"
+        if len(buffer) >= self.buffer_size:
+            self.flush_buffer()
+
+    def add(self, literals):
+        self.additions_count += 1
+        self.append(b"a", literals)
+
+    def delete(self, literals):
+        self.deletions_count += 1
+        self.append(b"d", literals)
+
+    def flush_buffer(self):
+        if self.queue is not None:
+            self.queue.put(self.buffer)
+        else:
+            self.file.write(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        self.flush_buffer()
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+        self.file.close()
+
+# Varints are not printable, a textual proof is
+def is_binary_proof(data: bytes) -> bool:
+    return any(byte not in b"0123456789- d\n\r\tc" for byte in data[:64])
+
+# Returns the proof steps as (is_deletion, tuple of DIMACS literals)
+def read_proof(file_name: str) -> list:
+    with open(file_name, "rb") as proof_file:
+        data = proof_file.read()
+    steps = []
+    if is_binary_proof(data):
+        index = 0
+        while index < len(data):
+            is_deletion = data[index] == ord("d")
+            index += 1
+            clause = []
+            while True:
+                code = shift = 0
+                while True:
+                    byte = data[index]
+                    index += 1
+                    code |= (byte & 127) << shift
+                    shift += 7
+                    if byte < 128:
+                        break
+                if code == 0:
+                    break
+                clause.append(-(code >> 1) if code & 1 else code >> 1)
+            steps.append((is_deletion, tuple(clause)))
+        return steps
+    for line in data.decode().splitlines():
+        tokens = line.split()
+        if not tokens or tokens[0] == "c":
+            continue
+        is_deletion = tokens[0] == "d"
+        steps.append((is_deletion, tuple(int(token) for token in tokens[is_deletion:-1])))
+    return steps
+
+"""
+Unit propagation over clauses (clause_id -> tuple of DIMACS literals, only the active ones) starting from
+assignment (literal -> reason clause_id or -1, modified in place). Naive fixpoint loop, small cnfs only.
+Returns the id of a falsified clause, None if there is no conflict.
+"""
+def propagate(clauses: dict, assignment: dict):
+    changed = True
+    while changed:
+        changed = False
+        for clause_id, clause in clauses.items():
+            unassigned = None
+            satisfied = False
+            open_count = 0
+            for lit in clause:
+                if lit in assignment:
+                    satisfied = True
+                    break
+                if -lit not in assignment:
+                    open_count += 1
+                    unassigned = lit
+            if satisfied:
+                continue
+            if open_count == 0:
+                return clause_id
+            if open_count == 1:
+                assignment[unassigned] = clause_id
+                changed = True
+    return None
+
+# Mark (in used) the clauses the conflict on conflict_id was derived from
+def mark_used(clauses: dict, assignment: dict, conflict_id: int, used: set):
+    stack = [conflict_id]
+    while stack:
+        clause_id = stack.pop()
+        if clause_id in used:
+            continue
+        used.add(clause_id)
+        for lit in clauses[clause_id]:
+            reason = assignment.get(-lit, -1)
+            if reason >= 0:
+                stack.append(reason)
+
+# RUP check of lemma: falsifying it must lead to a conflict by unit propagation. Marks the clauses used
+def has_rup(clauses: dict, lemma: tuple, used: set) -> bool:
+    assignment = {-lit: -1 for lit in lemma}
+    conflict_id = propagate(clauses, assignment)
+    if conflict_id is None:
+        return False
+    mark_used(clauses, assignment, conflict_id, used)
+    return True
+
+# RAT check on the first literal of lemma: every resolvent with a clause containing its negation is RUP
+def has_rat(clauses: dict, lemma: tuple, used: set) -> bool:
+    if not lemma:
+        return False
+    pivot = lemma[0]
+    for clause_id, clause in list(clauses.items()):
+        if -pivot not in clause:
+            continue
+        resolvent = set(lemma) | set(lit for lit in clause if lit != -pivot)
+        if any(-lit in resolvent for lit in resolvent):
+            continue # tautology
+        if not has_rup(clauses, tuple(resolvent), used):
+            return False
+        used.add(clause_id)
+    return True
+
+"""
+Check a DRAT proof of unsatisfiability of cnf_file. Returns (valid, message).
+Forward mode checks every lemma when it is added. Backward mode replays the proof to its end, then walks it
+back from the empty clause and only checks the lemmas which take part in deriving it (marked by conflict
+analysis of the RUP checks), which is how DRAT checkers are usually run.
+"""
+def check_proof(cnf_file: str, proof_file: str, backward = True) -> (bool, str):
+    _, _, literals = dimacs.read_dimacs(cnf_file)
+    clauses = {}
+    # tuple of sorted literals -> ids of the active copies, to find the clause a deletion refers to
+    by_literals = {}
+    def add_clause(clause):
+        clause_id = len(all_clauses)
+        all_clauses.append(clause)
+        clauses[clause_id] = clause
+        by_literals.setdefault(tuple(sorted(clause)), []).append(clause_id)
+        return clause_id
+    all_clauses = []
+    start = 0
+    while start < len(literals):
+        stop = literals.index(0, start)
+        add_clause(tuple(dict.fromkeys(literals[start:stop])))
+        start = stop + 1
+    original_count = len(all_clauses)
+
+    # steps: (is_deletion, clause_id)
+    steps = []
+    empty_clause_step = None
+    for step, (is_deletion, clause) in enumerate(read_proof(proof_file)):
+        if is_deletion:
+            copies = by_literals.get(tuple(sorted(clause)))
+            if not copies:
+                return False, "step {}: deleted clause {} is not in the formula".format(step, list(clause))
+            clause_id = copies.pop()
+            del clauses[clause_id]
+            steps.append((True, clause_id))
+            continue
+        if backward:
+            clause_id = add_clause(clause)
+        else:
+            if not has_rup(clauses, clause, set()) and not has_rat(clauses, clause, set()):
+                return False, "step {}: lemma {} is neither RUP nor RAT".format(step, list(clause))
+            clause_id = add_clause(clause)
+        steps.append((False, clause_id))
+        if not clause:
+            empty_clause_step = len(steps) - 1
+            break
+    if empty_clause_step is None:
+        # Accept a proof whose lemmas make the formula fail by unit propagation
+        assignment = {}
+        conflict_id = propagate(clauses, assignment)
+        if conflict_id is None:
+            return False, "the proof does not derive the empty clause"
+        if not backward:
+            return True, "verified (forward), {} lemmas".format(len(all_clauses) - original_count)
+        used = set()
+        mark_used(clauses, assignment, conflict_id, used)
+    else:
+        if not backward:
+            return True, "verified (forward), {} lemmas".format(len(all_clauses) - original_count)
+        used = {steps[empty_clause_step][1]}
+
+    checked = 0
+    for is_deletion, clause_id in reversed(steps):
+        if is_deletion:
+            clauses[clause_id] = all_clauses[clause_id]
+            continue
+        del clauses[clause_id]
+        if clause_id not in used:
+            continue
+        lemma = all_clauses[clause_id]
+        checked += 1
+        if not has_rup(clauses, lemma, used) and not has_rat(clauses, lemma, used):
+            return False, "lemma {} is neither RUP nor RAT".format(list(lemma))
+    lemma_count = len(all_clauses) - original_count
+    return True, "verified (backward), {} of {} lemmas checked".format(checked, lemma_count)
+
+"""
+Overhead of proof logging: solve every cnf repeat times without proof, with a binary proof through the
+background writer and with a textual proof written directly, print the best time of each.
+"""
+def measure_overhead(cnfs: list, repeat: int = 3, proof_file: str = "proof.drat"):
+    import random
+    import solver as solver_module
+    configs = (("no proof", None), ("binary", (True, True)), ("text", (False, False)))
+    for cnf in cnfs:
+        best = {}
+        for name, config in configs:
+            for _ in range(repeat):
+                random.seed(0)
+                cnf_solver = solver_module.load_cnf(cnf)
+                start_time = time.process_time()
+                if config is not None:
+                    cnf_solver.proof = ProofWriter(proof_file, binary = config[0], background = config[1])
+                cnf_solver.solve()
+                if config is not None:
+                    cnf_solver.proof.close()
+                solve_time = time.process_time() - start_time
+                best[name] = min(best.get(name, solve_time), solve_time)
+        # Relative overheads of runs shorter than the clock resolution are meaningless
+        overhead = lambda name: "{:+.1f}%".format(100 * (best[name] / best["no proof"] - 1)) if (
+            best["no proof"] >= 0.01) else "too short"
+        print("{}: no proof {:.4f} s, binary {:.4f} s ({}), text {:.4f} s ({})".format(cnf, best["no proof"],
+            best["binary"], overhead("binary"), best["text"], overhead("text")), flush = True)
+    if os.path.exists(proof_file):
+        os.remove(proof_file)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Check a DRAT proof, or measure the overhead of proof logging")
+    parser.add_argument("cnf_file", nargs = "?")
+    parser.add_argument("proof_file", nargs = "?")
+    parser.add_argument("--forward", action = "store_true", help = "check every lemma instead of backward checking")
+    parser.add_argument("--overhead", nargs = "+", metavar = "CNF", help = "measure the overhead on these cnfs")
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per configuration with --overhead")
+    args = parser.parse_args()
+    if args.overhead:
+        measure_overhead(args.overhead, args.repeat)
+    elif args.cnf_file and args.proof_file:
+        valid, message = check_proof(args.cnf_file, args.proof_file, not args.forward)
+        print("s VERIFIED" if valid else "s NOT VERIFIED", "-", message)
+        raise SystemExit(0 if valid else 1)
+    else:
+        parser.error("give a cnf and a proof to check, or --overhead")
@@ -0,0 +1,347 @@
+"""
+Description: Batch solving service, a long running process answering many cnfs
+Jobs are JSON lines read from stdin (answers on stdout) or from the clients of a Unix socket (answers on the
+same connection). They are solved by a pool of worker processes started once, which keep the interpreter and
+the solver modules loaded from one job to the next, and answered as JSON lines in the order they finish:
+    job: {"id": 7, "path": "input/sat/bmc-2.cnf"} or {"id": 7, "dimacs": "p cnf 2 1\n1 -2 0\n"}
+        optional: "budgets" (keyword arguments of Solver.solve(), eg. {"time_budget": 10}, they replace the
+        defaults of the service), "restart" (restart policy), "preprocess" (bool), "seed" (default 0),
+        "model" (false to leave the model out of the answer)
+    answer: {"id": 7, "status": "SATISFIABLE", "model": [1, -2], "verified": true, "statistics": {...},
+        "solve_time": 0.01, "latency": 0.02, "worker": 0}
+        status is SATISFIABLE, UNSATISFIABLE, UNKNOWN (with the "reason" the budget ran out) or ERROR (with the
+        "error"). solve_time is the process time of the worker, latency the wall time from job to answer.
+A line which is not a JSON object is taken as the path (and id) of a cnf, so `ls *.cnf | python3 service.py`
+works.
+Nothing is written to assignment.txt, so concurrent jobs never clobber each other's models.
+"""
+
+import os, sys, time, json, random, signal, socket, threading, queue
+import multiprocessing
+import dimacs
+import solver
+
+class CONSTANTS:
+    # Seconds between checks for crashed workers while waiting for answers
+    POLL_INTERVAL = 0.1
+    # Seconds the workers get to finish once the service stops
+    STOP_TIMEOUT = 5.0
+
+"""
+Solve one job (a dict, see above) and return its answer without id, latency and worker. Errors in the job
+(missing file, bad DIMACS, unknown budget) are answered with the status ERROR.
+"""
+def solve_job(job: dict, default_budgets: dict) -> dict:
+    start_time = time.process_time()
+    try:
+        if "dimacs" in job:
+            var_count, clause_count, dimacs_literals = dimacs.parse_dimacs(job["dimacs"])
+        elif "path" in job:
+            var_count, clause_count, dimacs_literals = dimacs.read_dimacs(job["path"])
+        else:
+            raise ValueError("a job needs a path or dimacs")
+        budgets = dict(default_budgets)
+        budgets.update(job.get("budgets", {}))
+        random.seed(job.get("seed", 0))
+        cnf_solver = solver.build_solver(var_count, clause_count, dimacs_literals, job.get("restart", "geometric"),
+            job.get("preprocess", False))
+        result = cnf_solver.solve(**budgets)
+    except (ValueError, TypeError, KeyError, OSError, EOFError) as error:
+        return {"status": "ERROR", "error": "{}: {}".format(type(error).__name__, error)}
+    answer = {"status": result.status_name()}
+    if result.unknown:
+        answer["reason"] = result.reason
+    if result.satisfiable:
+        unsatisfied = cnf_solver.count_unsatisfied()
+        if cnf_solver.preprocessor is not None:
+            unsatisfied += cnf_solver.preprocessor.count_unsatisfied_original([literal > 0
+                for literal in [0] + result.model])
+        answer["verified"] = not unsatisfied
+        if job.get("model", True):
+            answer["model"] = result.model
+    answer["statistics"] = result.statistics
+    answer["solve_time"] = time.process_time() - start_time
+    return answer
+
+"""
+Entry point of a worker process. Takes (key, job) from tasks until it gets None, and puts ("start", index,
+key) on results before solving the job, then ("answer", index, key, answer). The service knows from the
+former which job was lost if the worker dies.
+A worker which ran out of its memory budget exits after answering: the memory it grew to may never be given
+back to the OS, and the next jobs would start over the budget. The service starts a fresh one in its place.
+"""
+def run_worker(index: int, default_budgets: dict, tasks, results):
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        key, job = task
+        results.put(("start", index, key))
+        answer = solve_job(job, default_budgets)
+        results.put(("answer", index, key, answer))
+        if answer.get("reason") == "memory":
+            break
+
+class Client:
+    """
+    Where the answers of some jobs go: write(line) is called for every answer (under lock, from the thread of
+    the service collecting answers). wait() returns once every job submitted for this client is answered.
+    """
+    def __init__(self, write):
+        self.write = write
+        self.lock = threading.Lock()
+        self.answered = threading.Condition(self.lock)
+        self.pending = 0
+
+    def send(self, answer: dict):
+        with self.lock:
+            try:
+                self.write(json.dumps(answer) + "\n")
+            except (OSError, ValueError):
+                pass # the client went away, its remaining answers are dropped
+            self.pending -= 1
+            self.answered.notify_all()
+
+    def wait(self):
+        with self.lock:
+            while self.pending:
+                self.answered.wait()
+
+class Service:
+    """
+    Pool of worker_count processes solving jobs with default_budgets (keyword arguments of Solver.solve()).
+    submit() queues a job for a Client, a thread collects the answers and sends them to their client. A worker
+    which dies (eg. killed by the OS for its memory) is replaced, its job is answered with an ERROR. So is one
+    which exits after running out of its memory budget (recycled), its job was answered UNKNOWN already.
+    """
+    def __init__(self, worker_count = None, default_budgets: dict = None):
+        self.worker_count = worker_count or os.cpu_count() or 1
+        self.default_budgets = default_budgets or {}
+        self.context = multiprocessing.get_context("spawn")
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.workers = []
+        # key -> (client, job id, submit time) of the jobs not answered yet
+        self.jobs = {}
+        # index of a worker -> key of the job it is solving
+        self.running = {}
+        self.lock = threading.Lock()
+        self.next_key = 0
+        self.stopping = False
+        self.collector = None
+
+        # Statistics
+        self.answered_count = 0
+        self.crashed_count = 0
+        self.recycled_count = 0
+
+    def start_worker(self, index: int):
+        worker = self.context.Process(target = run_worker, args = (index, self.default_budgets, self.tasks,
+            self.results), daemon = True)
+        worker.start()
+        return worker
+
+    def start(self):
+        self.workers = [self.start_worker(index) for index in range(self.worker_count)]
+        self.collector = threading.Thread(target = self.collect, daemon = True)
+        self.collector.start()
+
+    # Queue a job (dict) whose answer goes to client
+    def submit(self, job: dict, client: Client):
+        with client.lock:
+            client.pending += 1
+        with self.lock:
+            key = self.next_key
+            self.next_key += 1
+            self.jobs[key] = (client, job.get("id"), time.perf_counter())
+        self.tasks.put((key, job))
+
+    # Answer a job which never reached a worker (eg. a line which is not JSON)
+    def reject(self, job_id, error: str, client: Client):
+        with client.lock:
+            client.pending += 1
+        client.send({"id": job_id, "status": "ERROR", "error": error})
+
+    def answer(self, key: int, answer: dict, worker: int):
+        with self.lock:
+            client, job_id, submit_time = self.jobs.pop(key)
+        answer = dict({"id": job_id}, **answer)
+        answer["latency"] = time.perf_counter() - submit_time
+        answer["worker"] = worker
+        self.answered_count += 1
+        client.send(answer)
+
+    def collect(self):
+        while not self.stopping:
+            try:
+                message = self.results.get(timeout = CONSTANTS.POLL_INTERVAL)
+            except queue.Empty:
+                self.replace_dead_workers()
+                continue
+            if message[0] == "start":
+                self.running[message[1]] = message[2]
+            else:
+                _, index, key, answer = message
+                self.running.pop(index, None)
+                self.answer(key, answer, index)
+
+    def replace_dead_workers(self):
+        for index, worker in enumerate(self.workers):
+            if worker.is_alive():
+                continue
+            if worker.exitcode == 0:
+                self.recycled_count += 1
+            else:
+                self.crashed_count += 1
+            key = self.running.pop(index, None)
+            if key is not None:
+                self.answer(key, {"status": "ERROR", "error": "worker died (exit code {})".format(worker.exitcode)},
+                    index)
+            self.workers[index] = self.start_worker(index)
+
+    # Stop the collector first, so that the workers leaving are not taken for crashed ones
+    def stop(self):
+        self.stopping = True
+        if self.collector is not None:
+            self.collector.join()
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(CONSTANTS.STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+# A job from a line of input, a line which is not a JSON object is the path of a cnf
+def parse_job(line: str) -> dict:
+    if not line.lstrip().startswith("{"):
+        return {"id": line.strip(), "path": line.strip()}
+    job = json.loads(line)
+    if not isinstance(job, dict):
+        raise ValueError("a job must be a JSON object")
+    return job
+
+# Submit every job in lines (an iterable of str) for client, then wait for their answers
+def serve_lines(service: Service, lines, client: Client):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            job = parse_job(line)
+        except ValueError as error:
+            service.reject(None, "ValueError: {}".format(error), client)
+            continue
+        service.submit(job, client)
+    client.wait()
+
+def serve_stdin(service: Service):
+    def write(line):
+        sys.stdout.write(line)
+        sys.stdout.flush()
+    serve_lines(service, sys.stdin, Client(write))
+
+# Serve the clients of a Unix socket at socket_path, each in its own thread, until interrupted (SIGINT or SIGTERM)
+def serve_socket(service: Service, socket_path: str):
+    def interrupt(signal_number, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, interrupt)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    def serve_connection(connection):
+        with connection, connection.makefile("r") as reader, connection.makefile("w") as writer:
+            def write(line):
+                writer.write(line)
+                writer.flush()
+            serve_lines(service, reader, Client(write))
+    try:
+        while True:
+            connection, _ = server.accept()
+            threading.Thread(target = serve_connection, args = (connection,), daemon = True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+"""
+Throughput and latency of the service against one `python3 solver.py` process per job, on cnfs:
+    latency: every cnf solved alone, one after the other (repeat times, best run)
+    throughput: all the cnfs (repeated repeat times) submitted at once, jobs per second
+Both use worker_count processes at a time. The startup of the service is reported on its own.
+"""
+def measure(cnfs: list, worker_count: int, repeat: int = 3):
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+    solver_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solver.py")
+    def run_process(cnf):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, solver_script, cnf, "--assignment", os.devnull],
+            stdout = subprocess.DEVNULL, check = True)
+        return time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    service = Service(worker_count)
+    service.start()
+    # The first answer tells when the workers are up
+    collected = []
+    client = Client(lambda line: collected.append(json.loads(line)))
+    serve_lines(service, [json.dumps({"dimacs": "p cnf 1 1\n1 0\n"})], client)
+    print("# Service startup (s): {:.3f}".format(time.perf_counter() - start_time))
+
+    def run_service(cnf):
+        start_time = time.perf_counter()
+        serve_lines(service, [cnf], Client(lambda line: None))
+        return time.perf_counter() - start_time
+
+    print("{:<32} {:>14} {:>14}".format("latency (s)", "process/job", "service"))
+    for cnf in cnfs:
+        process_time = min(run_process(cnf) for _ in range(repeat))
+        service_time = min(run_service(cnf) for _ in range(repeat))
+        print("{:<32} {:>14.3f} {:>14.3f}".format(cnf, process_time, service_time), flush = True)
+
+    jobs = list(cnfs) * repeat
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(worker_count) as executor:
+        list(executor.map(run_process, jobs))
+    process_rate = len(jobs) / (time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    serve_lines(service, jobs, Client(lambda line: None))
+    service_rate = len(jobs) / (time.perf_counter() - start_time)
+    print("# Throughput ({} jobs, {} workers): process/job {:.2f} jobs/s, service {:.2f} jobs/s ({:.1f}x)".format(
+        len(jobs), worker_count, process_rate, service_rate, service_rate / process_rate))
+    service.stop()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Solve cnfs sent as JSON lines with a pool of warm workers")
+    parser.add_argument("--socket", default = None, metavar = "PATH",
+        help = "serve the clients of a Unix socket at PATH instead of stdin / stdout")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes (default: cpu count)")
+    parser.add_argument("--conflicts", type = int, default = None, help = "default conflict budget per job")
+    parser.add_argument("--propagations", type = int, default = None, help = "default propagation budget per job")
+    parser.add_argument("--time-limit", type = float, default = None, help = "default wall clock budget per job (s)")
+    parser.add_argument("--memory-limit", type = float, default = None, help = "default memory budget of a worker (MB)")
+    parser.add_argument("--measure", nargs = "+", metavar = "CNF",
+        help = "compare throughput and latency with one solver process per job on these cnfs")
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per cnf with --measure")
+    args = parser.parse_args()
+    budgets = {name: value for name, value in (("conflict_budget", args.conflicts),
+        ("propagation_budget", args.propagations), ("time_budget", args.time_limit),
+        ("memory_budget", args.memory_limit)) if value is not None}
+    if args.measure:
+        measure(args.measure, args.workers or os.cpu_count() or 1, args.repeat)
+        raise SystemExit(0)
+    service = Service(args.workers, budgets)
+    service.start()
+    try:
+        if args.socket is not None:
+            serve_socket(service, args.socket)
+        else:
+            serve_stdin(service)
+    finally:
+        service.stop()
+        print("# Answered: {}, crashed workers: {}, recycled workers: {}".format(service.answered_count,
+            service.crashed_count, service.recycled_count), file = sys.stderr)
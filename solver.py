@@ -3,17 +3,40 @@ Author: Nitin Kedia, 160101048
 Description: A CDCL based SAT solver
 """
 
-import time, random, copy, enum
-from sortedcontainers import SortedSet
+import os, sys, time, random, enum, zlib
+from array import array
+import dimacs
+import clause_matrix
+from preprocess import Preprocessor
 
 class CONSTANTS:
     # These constant will be explained in context
     # used in MINISAT (decision heuristic)
     VAR_DECAY_RATE = 0.95
-    # used to decide when to restart
+    # activities are scaled down by ACTIVITY_RESCALE_FACTOR once one exceeds ACTIVITY_LIMIT
+    ACTIVITY_LIMIT = 1e100
+    ACTIVITY_RESCALE_FACTOR = 1e-100
+    # used in learned clause database reduction (see reduce_db())
+    CLAUSE_DECAY_RATE = 0.999
+    CLAUSE_ACTIVITY_LIMIT = 1e20
+    REDUCE_DB_FIRST = 2000
+    REDUCE_DB_INCREMENT = 300
+    GLUE_LBD = 2
+    # used to decide when to restart (see GeometricRestart)
     THRESHOLD_MULTIPLIER = 1.1
     RESTART_LOWER_BOUND = 100
     RESTART_UPPER_BOUND_BASE = 1000
+    # used in LubyRestart, restart intervals are LUBY_UNIT times the luby sequence 1, 1, 2, 1, 1, 2, 4, ...
+    LUBY_UNIT = 100
+    # used in GlucoseRestart, restart if recent LBDs are GLUCOSE_MARGIN times worse than the long term average
+    GLUCOSE_FAST_ALPHA = 1 / 32
+    GLUCOSE_SLOW_ALPHA = 1 / 4096
+    GLUCOSE_MARGIN = 1.25
+    GLUCOSE_MIN_CONFLICTS = 50
+    # used in chronological backtracking (see backtrack()), backjumps over more levels go back one level only
+    CHRONO_THRESHOLD = 100
+    # The memory budget of solve() is checked every MEMORY_CHECK_INTERVAL decisions, reading it is a system call
+    MEMORY_CHECK_INTERVAL = 256
 
 class ClauseState(enum.auto):
     C_UNRESOLVED = 0
@@ -36,73 +59,141 @@ class SolverState(enum.auto):
 
 """
 Variables are denoted by positive integers 1, 2, ..., VAR_COUNT
-The positive literal of a variable v is given by 2*v, while negation is 2*v - 1
-Following four are help functions based on this terminology
+The positive literal of a variable v is given by 2*v, while negation is 2*v + 1
+So the variable of a literal is l >> 1, its sign is l & 1 and its negation is l ^ 1, the value of a literal
+is the value of its variable XOR its sign. Literals 0 and 1 are unused.
+Following four are help functions based on this terminology, the hot loops inline them
 """
 def get_literal(v: int) -> int:
-    # if (v == 0):
-    #     raise Exception("Variable cannot be zero.")
-    return 2 * v if v > 0 else 2 * (abs(v)) - 1
+    return v << 1 if v > 0 else (-v << 1) | 1
 
 def get_variable(l : int) -> int:
-    # if (l <= 0):
-    #     raise Exception("Literal must be a positive integer, is {}".format(l))
-    return int((l + 1) / 2) if l % 2  else int(l / 2)
+    return l >> 1
 
 def get_opposite_literal(l : int) -> int:
-    # if (l <= 0):
-    #     raise Exception("Literal must be a positive integer, is {}".format(l))
-    return (l + 1) if l % 2 else (l - 1)
+    return l ^ 1
 
 def is_negative(l : int) -> bool:
-    # if (l <= 0):
-    #     raise Exception("Literal must be a positive integer, is {}".format(l))
-    return True if l % 2 else False
-
-class Clause:
-    def __init__(self, literals: list):
-        self.literals = literals
-        self.is_unary = (len(literals) == 1)
-        self.first_watcher = -1
-        self.second_watcher = -1
-
-    def insert_literal(self, lit):
-        if lit not in self.literals: # To ensure all literals are unique
-            self.literals.append(lit)
-            self.is_unary = (len(self.literals) == 1)
+    return l & 1 == 1
+
+# Inverse of get_literal()
+def get_dimacs_literal(l : int) -> int:
+    return -(l >> 1) if l & 1 else l >> 1
+
+"""
+antecedent[var] is the clause_id of the clause which implied var, -1 if var was not implied by a clause.
+Binary clauses are not stored in the ClauseArena, for them the other (FALSE) literal of the clause
+is stored instead as -(l + 1), which never collides with a clause_id or -1
+"""
+def get_binary_antecedent(l: int) -> int:
+    return -(l + 1)
+
+def is_binary_antecedent(antecedent: int) -> bool:
+    return antecedent < -1
+
+def get_binary_antecedent_literal(antecedent: int) -> int:
+    return -(antecedent + 1)
+
+class ClauseArena:
+    """
+    Compact clause store: the literals of every clause live in one contiguous array('i').
+    A clause is identified by its clause_id, which indexes the parallel arrays below:
+        offset[clause_id]: position of the first literal of the clause in literals
+        size[clause_id]: number of literals in the clause
+        first_watcher[clause_id], second_watcher[clause_id]: positions (in literals) of the two watchers
+        learnt[clause_id]: 1 if the clause was learned in analyze_conflict(), only those can be deleted
+        lbd[clause_id]: literal block distance of a learned clause when it was learned
+        activity[clause_id]: bumped whenever the clause takes part in a conflict
+    This avoids one Python object (plus its own literal list) per clause.
+    """
+    def __init__(self):
+        self.literals = array('i')
+        self.offset = array('i')
+        self.size = array('i')
+        self.first_watcher = array('i')
+        self.second_watcher = array('i')
+        self.learnt = array('b')
+        self.lbd = array('i')
+        self.activity = array('d')
+        self.learnt_count = 0
+
+    def __len__(self):
+        return len(self.offset)
+
+    # Append a clause, watchers are given as indices relative to the clause; returns the clause_id
+    def add(self, literals, first_watch: int, second_watch: int, learnt = False, lbd = 0) -> int:
+        clause_id = len(self.offset)
+        start = len(self.literals)
+        self.literals.extend(literals)
+        self.offset.append(start)
+        self.size.append(len(literals))
+        self.first_watcher.append(start + first_watch)
+        self.second_watcher.append(start + second_watch)
+        self.learnt.append(learnt)
+        self.lbd.append(lbd)
+        self.activity.append(0.0)
+        self.learnt_count += learnt
+        return clause_id
+
+    """
+    Garbage collection: copies the clauses with keep[clause_id] set to fresh arrays, so that the
+    memory of deleted clauses is actually released. Watchers keep their position relative to the clause.
+    Returns remap, where remap[old clause_id] is the new clause_id or -1 if the clause was deleted.
+    """
+    def compact(self, keep) -> array:
+        old = (self.literals, self.offset, self.size, self.first_watcher, self.second_watcher,
+            self.learnt, self.lbd, self.activity)
+        old_literals, old_offset, old_size, old_first, old_second, old_learnt, old_lbd, old_activity = old
+        self.__init__()
+        remap = array('i', [-1]) * len(old_offset)
+        for clause_id in range(len(old_offset)):
+            if not keep[clause_id]:
+                continue
+            start = old_offset[clause_id]
+            remap[clause_id] = self.add(old_literals[start:start + old_size[clause_id]],
+                old_first[clause_id] - start, old_second[clause_id] - start,
+                old_learnt[clause_id], old_lbd[clause_id])
+            self.activity[-1] = old_activity[clause_id]
+        return remap
+
+    def get_literals(self, clause_id: int):
+        start = self.offset[clause_id]
+        return self.literals[start:start + self.size[clause_id]]
+
+    def get_first_watcher(self, clause_id: int) -> int:
+        return self.literals[self.first_watcher[clause_id]]
+    def get_second_watcher(self, clause_id: int) -> int:
+        return self.literals[self.second_watcher[clause_id]]
 
     def print(self, clause_id: int):
         print("Clause {} with literals {}, watchers {} and {}".format(
-            clause_id, self.literals, self.first_watcher, self.second_watcher)
+            clause_id, list(self.get_literals(clause_id)),
+            self.first_watcher[clause_id] - self.offset[clause_id],
+            self.second_watcher[clause_id] - self.offset[clause_id])
         )
-    
-    def get_first_watcher(self):
-        return self.literals[self.first_watcher]
-    def get_second_watcher(self):
-        return self.literals[self.second_watcher]
 
     """
     Two watch optimisation used in BCP (unit propagation):
     Base case: Initially we keep two watchers pointing to two different (unassigned) literals in the clause.
     Invariant: If both the watchers are unassigned, the clause cannot be unit (which requires exactly one assigned)
     """
-    def change_watch_location(self, solver, is_first_watcher, other_watcher) -> (ClauseState, int):
+    def change_watch_location(self, clause_id: int, literal_assignment, is_first_watcher, other_watcher) -> (ClauseState, int):
         # This function is called in bcp(). One of the watchers depending on is_first_watcher is being assigned FALSE.
         # First, try to find another unassigned literal
-        for index, lit in enumerate(self.literals):
+        literals = self.literals
+        start = self.offset[clause_id]
+        for index in range(start, start + self.size[clause_id]):
+            lit = literals[index]
             if (lit == other_watcher):
                 continue
-            lit_state = solver.curr_literal_assignment[lit]
-            # lit_state = solver.get_literal_status(lit)
-            if (lit_state != LiteralState.L_FALSE):
+            if (literal_assignment[lit] != LiteralState.L_FALSE):
                 if is_first_watcher:
-                    self.first_watcher = index
+                    self.first_watcher[clause_id] = index
                 else:
-                    self.second_watcher = index
-                return ClauseState.C_UNRESOLVED, index
+                    self.second_watcher[clause_id] = index
+                return ClauseState.C_UNRESOLVED, lit
         # Could not find another unassigned, fate of the clause is in the hands of the other watcher
-        other_watch_status = solver.curr_literal_assignment[other_watcher]
-        # other_watch_status = solver.get_literal_status(other_watcher)
+        other_watch_status = literal_assignment[other_watcher]
         if (other_watch_status == LiteralState.L_FALSE):
             # All literals are false
             return ClauseState.C_CONFLICTING, None
@@ -113,131 +204,634 @@ class Clause:
             assert(other_watch_status == LiteralState.L_TRUE)
             return ClauseState.C_SATISFIED, None
 
+class VarOrderHeap:
+    """
+    Array backed binary max-heap of variables keyed by their activity (used in decide()).
+    heap[i] is a variable, position[var] is the index of var in heap or -1 if var is not in the heap.
+    The heap only reads activity, so the owner must call increase() after bumping a variable.
+    """
+    def __init__(self, activity: list):
+        self.activity = activity
+        self.heap = []
+        self.position = [-1] * len(activity)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, var: int) -> bool:
+        return self.position[var] >= 0
+
+    # Replace the heap contents with the given variables
+    def build(self, variables: list):
+        for var in self.heap:
+            self.position[var] = -1
+        self.heap = sorted(variables, key = lambda var: self.activity[var], reverse = True)
+        for index, var in enumerate(self.heap):
+            self.position[var] = index
+
+    def insert(self, var: int):
+        if self.position[var] >= 0:
+            return
+        self.position[var] = len(self.heap)
+        self.heap.append(var)
+        self.sift_up(len(self.heap) - 1)
+
+    # activity[var] has grown, restore the heap property
+    def increase(self, var: int):
+        index = self.position[var]
+        if index >= 0:
+            self.sift_up(index)
+
+    def pop_max(self) -> int:
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        self.position[top] = -1
+        if heap:
+            heap[0] = last
+            self.position[last] = 0
+            self.sift_down(0)
+        return top
+
+    def sift_up(self, index: int):
+        heap, position, activity = self.heap, self.position, self.activity
+        var = heap[index]
+        score = activity[var]
+        while index > 0:
+            parent = (index - 1) >> 1
+            parent_var = heap[parent]
+            if activity[parent_var] >= score:
+                break
+            heap[index] = parent_var
+            position[parent_var] = index
+            index = parent
+        heap[index] = var
+        position[var] = index
+
+    def sift_down(self, index: int):
+        heap, position, activity = self.heap, self.position, self.activity
+        size = len(heap)
+        var = heap[index]
+        score = activity[var]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and activity[heap[child + 1]] > activity[heap[child]]:
+                child += 1
+            child_var = heap[child]
+            if activity[child_var] <= score:
+                break
+            heap[index] = child_var
+            position[child_var] = index
+            index = child
+        heap[index] = var
+        position[var] = index
+
+"""
+Restart policies decide when reset_state() is called. run_cdcl() reports every conflict to the policy
+with on_conflict() and asks should_restart() before every decision, on_restart() is called by reset_state().
+"""
+class RestartPolicy:
+    name = None
+
+    def on_conflict(self, solver, backtrack_level: int, lbd: int):
+        pass
+
+    def should_restart(self, solver) -> bool:
+        return False
+
+    def on_restart(self, solver):
+        pass
+
+class NoRestart(RestartPolicy):
+    name = "none"
+
+class GeometricRestart(RestartPolicy):
+    """
+    Restart if too many clauses have been learnt after the level we are backtracking to.
+    The threshold system works as follows eg. (chainsaw graph)
+    1. We have a range [1, 10]. Threshold increases after every restart till it crosses the ub
+    2. At that point the threshold is rest and the range is also increased to let it go even higher
+    """
+    name = "geometric"
+
+    def __init__(self, lower_bound = CONSTANTS.RESTART_LOWER_BOUND, multiplier = CONSTANTS.THRESHOLD_MULTIPLIER):
+        self.lower_bound = lower_bound
+        self.multiplier = multiplier
+        self.restart_threshold = lower_bound
+        self.restart_upper_bound = CONSTANTS.RESTART_UPPER_BOUND_BASE
+        self.pending = False
+
+    def on_conflict(self, solver, backtrack_level: int, lbd: int):
+        if backtrack_level > 0 and (
+                solver.learnt_clauses_count - solver.conflicts_upto_level[backtrack_level] > self.restart_threshold):
+            self.pending = True
+
+    def should_restart(self, solver) -> bool:
+        return self.pending
+
+    def on_restart(self, solver):
+        self.pending = False
+        self.restart_threshold = int(self.restart_threshold * self.multiplier)
+        if (self.restart_threshold > self.restart_upper_bound):
+            self.restart_threshold = self.lower_bound
+            self.restart_upper_bound = int(self.restart_upper_bound * self.multiplier)
+
+class LubyRestart(RestartPolicy):
+    name = "luby"
+
+    def __init__(self, unit = CONSTANTS.LUBY_UNIT):
+        self.unit = unit
+        self.restart_index = 0
+        self.conflicts = 0
+
+    # i-th element (0-indexed) of the luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ...
+    @staticmethod
+    def luby(i: int) -> int:
+        size, power = 1, 0
+        while size < i + 1:
+            power += 1
+            size = 2 * size + 1
+        while size - 1 != i:
+            size = (size - 1) >> 1
+            power -= 1
+            i = i % size
+        return 1 << power
+
+    def on_conflict(self, solver, backtrack_level: int, lbd: int):
+        self.conflicts += 1
+
+    def should_restart(self, solver) -> bool:
+        return self.conflicts >= self.unit * self.luby(self.restart_index)
+
+    def on_restart(self, solver):
+        self.restart_index += 1
+        self.conflicts = 0
+
+class GlucoseRestart(RestartPolicy):
+    """
+    Restart when the learned clauses get worse: a fast moving average of the LBDs of the recent learned
+    clauses is compared against a slow moving average over the whole run.
+    """
+    name = "glucose"
+
+    def __init__(self, margin = CONSTANTS.GLUCOSE_MARGIN):
+        self.margin = margin
+        self.fast_lbd = 0.0
+        self.slow_lbd = 0.0
+        self.conflicts = 0
+
+    def on_conflict(self, solver, backtrack_level: int, lbd: int):
+        if not self.slow_lbd:
+            self.fast_lbd = self.slow_lbd = float(lbd)
+        self.fast_lbd += CONSTANTS.GLUCOSE_FAST_ALPHA * (lbd - self.fast_lbd)
+        self.slow_lbd += CONSTANTS.GLUCOSE_SLOW_ALPHA * (lbd - self.slow_lbd)
+        self.conflicts += 1
+
+    def should_restart(self, solver) -> bool:
+        return (self.conflicts >= CONSTANTS.GLUCOSE_MIN_CONFLICTS and
+            self.fast_lbd > self.margin * self.slow_lbd)
+
+    def on_restart(self, solver):
+        self.conflicts = 0
+
+RESTART_POLICIES = {policy.name: policy for policy in (NoRestart, GeometricRestart, LubyRestart, GlucoseRestart)}
+
+# parameters are passed on to the constructor of the policy, eg. make_restart_policy("luby", unit = 512)
+def make_restart_policy(name: str, **parameters) -> RestartPolicy:
+    if name not in RESTART_POLICIES:
+        raise ValueError("Unknown restart policy {}, expected one of {}".format(name, list(RESTART_POLICIES)))
+    return RESTART_POLICIES[name](**parameters)
+
+"""
+Result of Solver.solve(): status is S_SATISFIED, S_UNSATISFIED or S_UNRESOLVED (unknown, the search was
+interrupted, see Solver.interrupt(), or ran out of budget).
+model lists the value of every variable as a DIMACS literal (v or -v) when satisfiable.
+failed_assumptions is the subset of the assumptions responsible for unsatisfiability (see failed_assumptions()).
+reason tells why the answer is unknown: "interrupted", "conflicts", "propagations", "time" or "memory".
+statistics are the counters of the solver (see Solver.get_statistics()) when solve() returned.
+"""
+class SolveResult:
+    def __init__(self, status: SolverState, model: list = None, failed_assumptions: list = None,
+            reason: str = None, statistics: dict = None):
+        self.status = status
+        self.model = model
+        self.failed_assumptions = failed_assumptions if failed_assumptions is not None else []
+        self.reason = reason
+        self.statistics = statistics if statistics is not None else {}
+
+    @property
+    def satisfiable(self) -> bool:
+        return self.status == SolverState.S_SATISFIED
+
+    @property
+    def unknown(self) -> bool:
+        return self.status == SolverState.S_UNRESOLVED
+
+    def __repr__(self):
+        if self.unknown:
+            return "SolveResult(UNKNOWN, reason={})".format(self.reason)
+        return "SolveResult({}, failed_assumptions={})".format(self.status_name(), self.failed_assumptions)
+
+    def status_name(self) -> str:
+        if self.satisfiable:
+            return "SATISFIABLE"
+        return "UNKNOWN" if self.unknown else "UNSATISFIABLE"
+
+# Current resident memory of the process in bytes, None where /proc/self/statm does not exist (eg. macOS)
+def resident_memory():
+    try:
+        with open("/proc/self/statm") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+# Peak resident memory of the process in bytes, over its whole life
+def peak_memory() -> int:
+    import resource
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
 class Solver:
-    def __init__(self, var_count, clause_count):
+    def __init__(self, var_count = 0, clause_count = 0, restart_policy: RestartPolicy = None):
         self.var_count = var_count
         self.clause_count = clause_count
-        self.clauses = []
+        # clause_id -> clause, stored compactly (see ClauseArena)
+        self.clauses = ClauseArena()
+        # Literals of the unary clauses, these are never watched
         self.unary_clauses = []
+        # Set when the cnf is trivially unsatisfiable, eg. an empty clause or both (x) and (-x) were given
+        self.empty_clause_found = False
+        # Set if the clauses were preprocessed, used to extend the model to the eliminated variables
+        self.preprocessor = None
+        # Assumptions of the current solve() call (as literals), always decided first in decide()
+        self.assumptions = []
+        # Assumptions (as DIMACS literals) found responsible for the last UNSATISFIABLE result
+        self.conflict_assumptions = []
+        # Binary clauses are not put in the arena, binary_clauses stores them flat as [l1, l2, l1, l2, ...]
+        # binary_implications[lit]: literals which become TRUE when lit becomes FALSE
+        self.binary_clauses = array('i')
+        self.binary_implications = [[] for _ in range(2 * var_count + 2)]
         self.curr_level = 0 # Current depth of the decision tree
         self.max_level = 0
 
-        # Since variables are 1-indexed, size of these lists if (var_count + 1)
-        # curr_assignment gives the latest assignment of a variable
-        self.curr_assignment = [LiteralState.L_UNASSIGNED] * (var_count + 1)
-        self.curr_literal_assignment = [LiteralState.L_UNASSIGNED] * (2 * var_count + 1)
+        # Since variables are 1-indexed, size of these arrays if (var_count + 1)
+        # Typed arrays, one byte per value (LiteralState) and four per level or antecedent, instead of
+        # a pointer per entry in a list
+        # curr_assignment gives the latest assignment of a variable, curr_literal_assignment the value of
+        # every literal (both kept up to date by assign_variable(), bcp() reads the literal values directly)
+        self.curr_assignment = array('b', [LiteralState.L_UNASSIGNED]) * (var_count + 1)
+        self.curr_literal_assignment = array('b', [LiteralState.L_UNASSIGNED]) * (2 * var_count + 2)
         # prev_assignment is used in PHASE SAVING
-        self.prev_assignment = [-1] * (var_count + 1)
+        self.prev_assignment = array('b', [-1]) * (var_count + 1)
         # The level the variable was assigned at (if at all)
-        self.assignment_level = [-1] * (var_count + 1)
+        self.assignment_level = array('i', [-1]) * (var_count + 1)
         # A stack of all assigned variables in current path, most recently assigned variables are at top
         self.assigned_till_now = []
         self.assignments_upto_level = [0] # How many assignments had happened upto a level?
         self.conflicts_upto_level = [0] # How many conflicts hence clauses learned upto a level?
-        self.antecedent = [-1] * (var_count + 1)
-        self.score2var = SortedSet()
+        self.antecedent = array('i', [-1]) * (var_count + 1)
+        # Buffers reused by every analyze_conflict(), level_stamp is indexed by level
+        self.seen = bytearray(var_count + 1)
+        self.analyze_to_clear = []
+        self.level_stamp = [0] * (var_count + 2)
+        self.lbd_stamp = 0
 
         self.bcp_stack = []
-        # watch_map: literal -> list of clauses for which this literal is the watcher
-        self.watch_map = {} 
+        # watch_map[literal]: clauses for which this literal is a watcher
+        # Stored flat as [clause_id, blocker, clause_id, blocker, ...] where blocker is the other
+        # watcher at the time of insertion, if blocker is TRUE the clause is satisfied and skipped
+        self.watch_map = [[] for _ in range(2 * var_count + 2)]
 
         # Used in MINISAT decision heuristic explained in decider()    
         self.increment_value = 1.0
+        self.var_decay_rate = CONSTANTS.VAR_DECAY_RATE
         self.activity = [0.0] * (var_count + 1)
+        # Unassigned variables ordered by activity, assigned ones are removed lazily in decide()
+        self.var_order = VarOrderHeap(self.activity)
+
+        # Used in learned clause deletion explained in reduce_db()
+        self.clause_increment_value = 1.0
+        self.reduce_interval = CONSTANTS.REDUCE_DB_FIRST
+        self.next_reduce = CONSTANTS.REDUCE_DB_FIRST
 
         # Used in restart optimisation explained in reset_state()
-        self.restart_threshold = CONSTANTS.RESTART_LOWER_BOUND
-        self.restart_upper_bound = CONSTANTS.RESTART_UPPER_BOUND_BASE
+        self.restart_policy = restart_policy if restart_policy is not None else GeometricRestart()
+        # Chronological backtracking (see backtrack()) is off if None, else the longest backjump allowed
+        self.chrono_threshold = None
+        # Arena clause found conflicting by the last bcp(), -1 for a binary clause
+        self.conflicting_clause_id = -1
+        # Set by interrupt(), possibly from another thread, run_cdcl() gives up before its next decision
+        self.interrupted = False
+        # Limits of the current solve() call (see set_budget()), absolute values of the counters, None if unlimited
+        self.has_budget = False
+        self.conflict_limit = None
+        self.propagation_limit = None
+        self.deadline = None
+        self.memory_limit = None
+        self.memory_check_countdown = 0
+        # Peak resident memory when the budget was set, used where the current one can not be read
+        self.memory_start_peak = 0
+        # Why the last solve() gave up, see SolveResult.reason
+        self.unknown_reason = None
+        # A proof.ProofWriter if learned and deleted clauses are logged as a DRAT proof
+        self.proof = None
+        # A checkpoint.Checkpoint if learned clauses and heuristic state are saved periodically
+        self.checkpoint = None
+        # A localsearch.LocalSearch if the saved phases are picked by local search now and then (rephasing)
+        self.local_search = None
+        # CRC32 of the literals given to insert_input_clauses(), tells checkpoints of this formula apart
+        self.input_fingerprint = 0
         
         # Statistics
+        self.parse_time = 0.0
         self.restart_count = 0
+        self.reused_levels_count = 0
+        self.chrono_backtracks_count = 0
+        self.unassigned_count = 0
         self.learnt_clauses_count = 0
         self.decision_count = 0
         self.assignments_count = 0
+        self.binary_implications_count = 0
+        self.deleted_clauses_count = 0
+        self.minimized_literals_count = 0
+        self.reduce_count = 0
         self.global_max_score = 0.0
     
+    # The negative literal 2v + 1 takes the value of v XOR 1, L_UNASSIGNED (-1) is kept for both literals
     def assign_variable(self, var: int, assignment: LiteralState):
         self.curr_assignment[var] = assignment
-        if assignment != LiteralState.L_UNASSIGNED:
-            self.prev_assignment[var] = assignment
-        self.curr_literal_assignment[get_literal(var)] = assignment
-        neg_assignment = LiteralState.L_UNASSIGNED 
-        if assignment == LiteralState.L_TRUE:
-            neg_assignment = LiteralState.L_FALSE
-        elif assignment == LiteralState.L_FALSE:
-            neg_assignment = LiteralState.L_TRUE
-        self.curr_literal_assignment[get_literal(-1 * var)] = neg_assignment
+        lit = var << 1
+        if assignment == LiteralState.L_UNASSIGNED:
+            self.curr_literal_assignment[lit] = self.curr_literal_assignment[lit | 1] = assignment
+            return
+        self.prev_assignment[var] = assignment
+        self.curr_literal_assignment[lit] = assignment
+        self.curr_literal_assignment[lit | 1] = assignment ^ 1
     
     def bump_var_score(self, var: int, increment_value = 0.0):
         if increment_value > 0:
-            self.score2var.discard((self.activity[var], var))
             self.activity[var] += increment_value
-        self.score2var.add((self.activity[var], var))
+            if self.activity[var] > CONSTANTS.ACTIVITY_LIMIT:
+                self.rescale_activity()
+            self.var_order.increase(var)
+        self.var_order.insert(var)
+
+    # increment_value grows on every conflict, scale everything down before floats overflow
+    # Relative order of the variables is unchanged, so var_order remains a valid heap
+    def rescale_activity(self):
+        factor = CONSTANTS.ACTIVITY_RESCALE_FACTOR
+        activity = self.activity
+        for var in range(1, self.var_count + 1):
+            activity[var] *= factor
+        self.increment_value *= factor
+        self.global_max_score *= factor
 
     def print_clauses(self):
         print("{} variables, {} clauses".format(self.var_count, self.clause_count))
-        for clause_id, clause in enumerate(self.clauses):
-            clause.print(clause_id)
+        for clause_id in range(len(self.clauses)):
+            self.clauses.print(clause_id)
+        for index in range(0, len(self.binary_clauses), 2):
+            print("Binary clause with literals {}".format(list(self.binary_clauses[index:index + 2])))
     
     def print_curr_assignment(self):
         assignment = "State: "
         for var, state in enumerate(self.curr_assignment):
             if (var == 0):
                 continue
-            assignment += ", {}: {}".format(var, state.value)
+            assignment += ", {}: {}".format(var, state)
         print(assignment)
     
     # This fn is used to add the given clause to the watchlist of given literal
-    def watch_this_clause(self, lit, clause_id):
-        if lit in self.watch_map: 
-            self.watch_map[lit].add(clause_id)
-        else:
-            self.watch_map[lit] = set([clause_id])
+    def watch_this_clause(self, lit, clause_id, blocker):
+        watches = self.watch_map[lit]
+        watches.append(clause_id)
+        watches.append(blocker)
     
     # Insert a new (input / learned) clause to the cnf
-    def insert_clause(self, clause : Clause, first_watch, second_watch):
-        self.clauses.append(clause)
-        # Setup the two-watch mechanism, both these literals are guaranteed to be unassigned currently
-        clause.first_watcher = first_watch
-        clause.second_watcher = second_watch
-        clause_id = len(self.clauses) - 1
-        self.watch_this_clause(clause.get_first_watcher(), clause_id)
-        self.watch_this_clause(clause.get_second_watcher(), clause_id)
-        
+    # Returns the antecedent to be used for a literal implied by this clause
+    def insert_clause(self, literals: list, first_watch, second_watch, learnt = False, lbd = 0) -> int:
+        antecedent = self.attach_clause(literals, first_watch, second_watch, learnt, lbd)
         # In MINISAT decision heusristic:
         # Score of a varible is the number of clauses in it
         # Since we are inserting a clause, increase the scores of variables in this literal
-        for literal in clause.literals:
-            var = get_variable(literal)
+        for literal in literals:
+            var = literal >> 1
             self.bump_var_score(var, self.increment_value)
             # self.activity[var] += self.increment_value
+        return antecedent
+
+    # Store a clause and set up its watchers, without touching the variable scores
+    def attach_clause(self, literals: list, first_watch, second_watch, learnt = False, lbd = 0) -> int:
+        if len(literals) == 2:
+            # Binary clauses skip the two-watch mechanism, both literals are always watched
+            first_lit, second_lit = literals
+            self.binary_clauses.append(first_lit)
+            self.binary_clauses.append(second_lit)
+            self.binary_implications[first_lit].append(second_lit)
+            self.binary_implications[second_lit].append(first_lit)
+            antecedent = get_binary_antecedent(literals[first_watch])
+        else:
+            # Setup the two-watch mechanism, both these literals are guaranteed to be unassigned currently
+            antecedent = self.clauses.add(literals, first_watch, second_watch, learnt, lbd)
+            self.watch_this_clause(literals[first_watch], antecedent, literals[second_watch])
+            self.watch_this_clause(literals[second_watch], antecedent, literals[first_watch])
+        return antecedent
+
+    """
+    Bulk insertion of the input clauses, given as DIMACS literals with every clause terminated by 0
+    (see dimacs.read_dimacs()). Scores are counted in one pass and var_order is built once at the end,
+    instead of one heap update per literal as in insert_clause(). With numpy, large inputs are counted at once
+    by a ClauseMatrix (see clause_matrix.py).
+    Unary clauses are asserted at ground level, this also gives some false literals to process in the bcp_stack.
+    """
+    def insert_input_clauses(self, dimacs_literals):
+        if not isinstance(dimacs_literals, array):
+            dimacs_literals = array('i', dimacs_literals)
+        self.input_fingerprint = zlib.crc32(dimacs_literals, self.input_fingerprint)
+        activity = self.activity
+        occurrences = None
+        if clause_matrix.worth_vectorizing(len(dimacs_literals)):
+            matrix = clause_matrix.ClauseMatrix.from_dimacs_literals(self.var_count, dimacs_literals)
+            occurrences = matrix.occurrence_counts()
+        start = 0
+        end = len(dimacs_literals)
+        while start < end:
+            stop = dimacs_literals.index(0, start)
+            # set removes duplicate literals from the clause
+            clause = set(dimacs_literals[start:stop])
+            start = stop + 1
+            if occurrences is None:
+                for literal in clause:
+                    activity[abs(literal)] += 1.0
+            literals = [get_literal(literal) for literal in clause]
+            size = len(literals)
+            if size > 2:
+                # Two distinct random watchers
+                x = int(random.random() * size)
+                y = (x + 1 + int(random.random() * (size - 1))) % size
+                self.attach_clause(literals, x, y)
+            elif size == 2:
+                self.attach_clause(literals, 0, 1)
+            elif size == 1:
+                lit = literals[0]
+                self.unary_clauses.append(lit)
+                lit_state = self.curr_literal_assignment[lit]
+                if lit_state == LiteralState.L_FALSE:
+                    # Both (x) and (-x) are present
+                    self.empty_clause_found = True
+                elif lit_state == LiteralState.L_UNASSIGNED:
+                    self.assert_unary_literal(lit)
+                    self.bcp_stack.append(get_opposite_literal(lit))
+            else:
+                self.empty_clause_found = True
+        if occurrences is not None:
+            # In place, var_order shares the list
+            activity[:] = (occurrences + clause_matrix.numpy.asarray(activity)).tolist()
+        # A list sorted by decreasing activity is already a valid max heap
+        self.var_order.build([var for var in range(1, self.var_count + 1) if activity[var] > 0])
     
+    # Make room for variables up to var_count, used when clauses over new variables are added
+    def add_variables(self, var_count: int):
+        extra = var_count - self.var_count
+        if extra <= 0:
+            return
+        self.curr_assignment.extend(array('b', [LiteralState.L_UNASSIGNED]) * extra)
+        self.curr_literal_assignment.extend(array('b', [LiteralState.L_UNASSIGNED]) * (2 * extra))
+        self.prev_assignment.extend(array('b', [-1]) * extra)
+        self.assignment_level.extend(array('i', [-1]) * extra)
+        self.antecedent.extend(array('i', [-1]) * extra)
+        self.seen.extend(bytes(extra))
+        self.level_stamp.extend([0] * extra)
+        # activity is shared with var_order, so it is extended in place
+        self.activity.extend([0.0] * extra)
+        self.var_order.position.extend([-1] * extra)
+        self.watch_map.extend([] for _ in range(2 * extra))
+        self.binary_implications.extend([] for _ in range(2 * extra))
+        self.var_count = var_count
+
+    """
+    Incremental interface: add a clause (given as DIMACS literals) between two solve() calls.
+    The clause is simplified under the ground level assignment, so that its watchers are unassigned.
+    Not supported on preprocessed formulas, the clause could contain an eliminated variable.
+    """
+    def add_clause(self, dimacs_clause: list):
+        if self.preprocessor is not None:
+            raise ValueError("add_clause() is not supported after preprocessing")
+        self.unassign_till_level(0)
+        self.add_variables(max((abs(literal) for literal in dimacs_clause), default = 0))
+        self.clause_count += 1
+        self.input_fingerprint = zlib.crc32(array('i', list(dimacs_clause) + [0]), self.input_fingerprint)
+        literals = []
+        for literal in set(dimacs_clause):
+            lit = get_literal(literal)
+            lit_state = self.curr_literal_assignment[lit]
+            if lit_state == LiteralState.L_TRUE or get_opposite_literal(lit) in literals:
+                # Satisfied at ground level or a tautology
+                return
+            if lit_state == LiteralState.L_UNASSIGNED:
+                literals.append(lit)
+        if not literals:
+            self.empty_clause_found = True
+        elif len(literals) == 1:
+            self.unary_clauses.append(literals[0])
+            self.bump_var_score(get_variable(literals[0]), self.increment_value)
+            self.assert_unary_literal(literals[0])
+            self.bcp_stack.append(get_opposite_literal(literals[0]))
+        else:
+            self.insert_clause(literals, 0, 1)
+
+    """
+    Add a clause (DIMACS literals) known to be implied by the formula as a learned clause with the given LBD,
+    eg. one saved in a checkpoint (see checkpoint.py). Unlike add_clause() the variable scores are untouched
+    and the clause may be deleted by reduce_db(). Unary and binary clauses are stored as in add_clause().
+    """
+    def add_learned_clause(self, dimacs_clause: list, lbd: int):
+        self.unassign_till_level(0)
+        self.add_variables(max((abs(literal) for literal in dimacs_clause), default = 0))
+        literals = []
+        for literal in set(dimacs_clause):
+            lit = get_literal(literal)
+            lit_state = self.curr_literal_assignment[lit]
+            if lit_state == LiteralState.L_TRUE or get_opposite_literal(lit) in literals:
+                return
+            if lit_state == LiteralState.L_UNASSIGNED:
+                literals.append(lit)
+        if not literals:
+            self.empty_clause_found = True
+        elif len(literals) == 1:
+            self.unary_clauses.append(literals[0])
+            self.assert_unary_literal(literals[0])
+            self.bcp_stack.append(get_opposite_literal(literals[0]))
+        else:
+            self.attach_clause(literals, 0, 1, len(literals) > 2, min(lbd, len(literals)))
+
+    """
+    Model enumeration (see enumeration.py): add a clause (solver literals) which is FALSE under the current
+    assignment, to exclude the model just found. Instead of going back to ground level, only the levels above
+    the second highest one in the clause are undone, so that the clause implies its highest level literal
+    as a learned clause does after a conflict, and the next solve(resume = True) carries on from there.
+    Ground level literals are left out. Returns False if nothing is left of the clause (no other model).
+    """
+    def add_blocking_clause(self, literals: list):
+        self.clause_count += 1
+        self.input_fingerprint = zlib.crc32(array('i', [get_dimacs_literal(lit) for lit in literals] + [0]),
+            self.input_fingerprint)
+        assignment_level = self.assignment_level
+        literals = sorted((lit for lit in set(literals) if assignment_level[lit >> 1] > 0), reverse = True,
+            key = lambda lit: assignment_level[lit >> 1])
+        if not literals:
+            self.empty_clause_found = True
+            return False
+        # Undone here rather than by backtrack(), which may only undo the current level (chronological)
+        highest_level = assignment_level[literals[0] >> 1]
+        self.unassign_till_level(highest_level - 1)
+        if len(literals) == 1:
+            self.unary_clauses.append(literals[0])
+            self.backtrack(0, literals[0], -1)
+            return True
+        second_level = assignment_level[literals[1] >> 1]
+        if highest_level == second_level:
+            # Not asserting: both watchers are unassigned now
+            self.attach_clause(literals, 0, 1)
+            return True
+        # The antecedent of literals[0] is the clause (or literals[1] for a binary clause)
+        antecedent = self.attach_clause(literals, 1, 0)
+        self.backtrack(second_level, literals[0], antecedent)
+        return True
+
+    # Clause activity is used to select the learned clauses to be deleted in reduce_db()
+    def bump_clause_activity(self, clause_id: int):
+        activity = self.clauses.activity
+        activity[clause_id] += self.clause_increment_value
+        if activity[clause_id] > CONSTANTS.CLAUSE_ACTIVITY_LIMIT:
+            for index in range(len(activity)):
+                activity[index] *= 1 / CONSTANTS.CLAUSE_ACTIVITY_LIMIT
+            self.clause_increment_value *= 1 / CONSTANTS.CLAUSE_ACTIVITY_LIMIT
+
     # Function used to assign a literal TRUE in a unary clause
     # These assignments are never reset hence not put in assigned_till_now[]
     def assert_unary_literal(self, lit):
         self.assignments_count += 1
-        var = get_variable(lit)
-        # Set state of the underlying variable
-        if is_negative(lit):
-            self.assign_variable(var, LiteralState.L_FALSE)
-            # self.curr_assignment[var] = LiteralState.L_FALSE
-        else:
-            self.assign_variable(var, LiteralState.L_TRUE)
-            # self.curr_assignment[var] = LiteralState.L_TRUE
+        var = lit >> 1
+        # Set state of the underlying variable, TRUE (1) for a positive literal, FALSE (0) for a negative one
+        self.assign_variable(var, (lit & 1) ^ 1)
         self.assignment_level[var] = 0 # Always done at ground level
     
     # Function used to assign a literal TRUE in a non-unary clause
     # Note that current level is important here
+    # assign_variable() inlined: lit becomes TRUE and its negation lit ^ 1 FALSE
     def assert_nonunary_literal(self, lit):
         self.assignments_count += 1
         self.assigned_till_now.append(lit)
-        var = get_variable(lit)
-        if is_negative(lit):
-            self.assign_variable(var, LiteralState.L_FALSE)
-            # self.prev_assignment[var] = self.curr_assignment[var] = LiteralState.L_FALSE
-        else:
-            self.assign_variable(var, LiteralState.L_TRUE)
-            # self.prev_assignment[var] = self.curr_assignment[var] = LiteralState.L_TRUE
+        var = lit >> 1
+        value = (lit & 1) ^ 1
+        self.curr_assignment[var] = value
+        self.prev_assignment[var] = value
+        literal_assignment = self.curr_literal_assignment
+        literal_assignment[lit] = LiteralState.L_TRUE
+        literal_assignment[lit ^ 1] = LiteralState.L_FALSE
         self.assignment_level[var] = self.curr_level
 
     """
@@ -246,67 +840,134 @@ class Solver:
     Since we know these literals can now change the state of other clauses.
     A naive approach of bcp would be iterate every clause to find a unit/unsatisifed clause.
     If found, repreat the process again else, stop and start guessing some variables in decider()
+    Binary clauses are propagated first from binary_implications, they have no watchers to move.
+    On conflict, the literals of the conflicting clause are returned as well.
     """
-    def bcp(self) -> (SolverState, int):
+    def bcp(self) -> (SolverState, list):
         # print("Running BCP with stack", self.bcp_stack)
         conflicting_clause_id = -1
+        clauses = self.clauses
+        arena_literals = clauses.literals
+        first_watcher = clauses.first_watcher
+        second_watcher = clauses.second_watcher
+        literal_assignment = self.curr_literal_assignment
+        watch_map = self.watch_map
+        binary_implications = self.binary_implications
+        assignment_level = self.assignment_level
+        # Implied literals get the level of their antecedent, which may be below curr_level (see backtrack())
+        chronological = self.chrono_threshold is not None
+        L_TRUE = LiteralState.L_TRUE
+        L_FALSE = LiteralState.L_FALSE
         while (self.bcp_stack):
             # Got a literal with FALSE assignment
             lit = self.bcp_stack.pop()
             assert self.curr_literal_assignment[lit] == LiteralState.L_FALSE
             # assert self.get_literal_status(lit) == LiteralState.L_FALSE
-            
-            if lit not in self.watch_map:
-                self.watch_map[lit] = set()
-            new_watch_list = copy.copy(self.watch_map[lit]) # Backup watch list of lit
-            
+
+            # Binary clauses (lit, implied_lit): implied_lit must become TRUE
+            for implied_lit in binary_implications[lit]:
+                implied_state = literal_assignment[implied_lit]
+                if implied_state == L_TRUE:
+                    continue
+                if implied_state == L_FALSE:
+                    self.bcp_stack.clear()
+                    self.conflicting_clause_id = -1
+                    if self.curr_level == 0:
+                        return SolverState.S_UNSATISFIED, [implied_lit, lit]
+                    return SolverState.S_CONFLICT, [implied_lit, lit]
+                self.assert_nonunary_literal(implied_lit)
+                self.antecedent[implied_lit >> 1] = -(lit + 1) # get_binary_antecedent(lit)
+                if chronological:
+                    assignment_level[implied_lit >> 1] = assignment_level[lit >> 1]
+                self.binary_implications_count += 1
+                self.bcp_stack.append(implied_lit ^ 1)
 
             # Traverse only the watchlist of that clause to save computation
-            for clause_id in self.watch_map[lit]:
-                clause = self.clauses[clause_id]
-                
+            # The list is compacted in place: entries [0, j) are the ones for which lit is still the watcher
+            watches = watch_map[lit]
+            watch_count = len(watches)
+            i = j = 0
+            while i < watch_count:
+                clause_id = watches[i]
+                blocker = watches[i + 1]
+                i += 2
+                if literal_assignment[blocker] == L_TRUE:
+                    # Clause is already satisfied, no need to look into it
+                    watches[j] = clause_id
+                    watches[j + 1] = blocker
+                    j += 2
+                    continue
+
                 # This block determines which watcher (1st / 2nd) was lit
-                first_watch = clause.get_first_watcher()
-                second_watch = clause.get_second_watcher()
+                first_watch = arena_literals[first_watcher[clause_id]]
+                second_watch = arena_literals[second_watcher[clause_id]]
                 lit_is_first = (lit == first_watch)
                 other_watch = second_watch if lit_is_first else first_watch
+                if other_watch != blocker and literal_assignment[other_watch] == L_TRUE:
+                    # Satisfied by the other watcher, remember it as the blocker
+                    watches[j] = clause_id
+                    watches[j + 1] = other_watch
+                    j += 2
+                    continue
                 # Now that we know lit has been assigned FALSE, we need to find another watcher
-                new_clause_state, new_watch_loc = clause.change_watch_location(self, lit_is_first, other_watch)
-                
+                new_clause_state, new_watcher = clauses.change_watch_location(
+                    clause_id, literal_assignment, lit_is_first, other_watch)
+
                 # clause has one more literal FALSE, this might change a state
+                if (new_clause_state == ClauseState.C_UNRESOLVED):
+                    # The clause is still unresolved as we have found another watcher
+                    # Drop this clause from watch list of current lit (by not copying it down)
+                    self.watch_this_clause(new_watcher, clause_id, other_watch)
+                    continue
+                # lit remains a watcher of this clause
+                watches[j] = clause_id
+                watches[j + 1] = other_watch
+                j += 2
                 if (new_clause_state == ClauseState.C_SATISFIED):
                     pass
                 elif (new_clause_state == ClauseState.C_UNIT):
                     # If the clause had become unit, we have got another implication here
+                    level = self.implication_level(clause_id, other_watch) if chronological else 0
                     self.assert_nonunary_literal(other_watch)
-                    var = get_variable(other_watch)
+                    var = other_watch >> 1
                     self.antecedent[var] = clause_id
-                    self.bcp_stack.append(get_opposite_literal(other_watch))
+                    if chronological:
+                        assignment_level[var] = level
+                    self.bcp_stack.append(other_watch ^ 1)
                 elif (new_clause_state == ClauseState.C_CONFLICTING):
                     # All the literals of this clause became false, we have a conflict, need to backtrack
-                    # If the conflict occured at ground level, we have a unsatisfiable cnf like (x) ^ (-x)
-                    if self.curr_level == 0:
-                        return SolverState.S_UNSATISFIED, conflicting_clause_id
                     conflicting_clause_id = clause_id
                     # Clear bcp_stack as a backtrack is coming, which will unassign several variables
                     # As such some information in bcp_state is likely to become stale
                     self.bcp_stack.clear()
+                    # Keep the unvisited part of the watch list
+                    while i < watch_count:
+                        watches[j] = watches[i]
+                        i += 1
+                        j += 1
                     break
-                elif (new_clause_state == ClauseState.C_UNRESOLVED):
-                    # The clause is still unresolved as we have found another watcher
-                    # Remove this clause from watch list of current lit
-                    new_watch_list.remove(clause_id)
-                    new_watcher = clause.literals[new_watch_loc]
-                    self.watch_this_clause(new_watcher, clause_id)
-            
-            # new_watch_list contains the clauses for which lit is still the watcher
+
             # Note that in case of backtrack, we dot need to revert the watchers in two-watcher method
             # since in backtracking, some variables will be unassigned, enforcing the two-watch invariant
-            self.watch_map[lit].clear()
-            self.watch_map[lit] = new_watch_list
+            del watches[j:]
             if (conflicting_clause_id >= 0):
-                return SolverState.S_CONFLICT, conflicting_clause_id
-        return SolverState.S_UNRESOLVED, conflicting_clause_id
+                self.conflicting_clause_id = conflicting_clause_id
+                self.bump_clause_activity(conflicting_clause_id)
+                conflicting_clause = clauses.get_literals(conflicting_clause_id)
+                # If the conflict occured at ground level, we have a unsatisfiable cnf like (x) ^ (-x)
+                if self.curr_level == 0:
+                    return SolverState.S_UNSATISFIED, conflicting_clause
+                return SolverState.S_CONFLICT, conflicting_clause
+        return SolverState.S_UNRESOLVED, None
+
+    # Highest level among the (FALSE) literals of an arena clause other than implied_lit
+    def implication_level(self, clause_id: int, implied_lit) -> int:
+        assignment_level = self.assignment_level
+        level = 0
+        for lit in self.clauses.get_literals(clause_id):
+            if lit != implied_lit and assignment_level[lit >> 1] > level:
+                level = assignment_level[lit >> 1]
+        return level
 
     """
     This function is for the PHASE-SAVING heuristic
@@ -315,11 +976,8 @@ class Solver:
     previous assignment if any.  
     """
     def get_lit_memoised(self, var: int) -> int:
-        prev_state = self.prev_assignment[var]
-        if (prev_state == LiteralState.L_TRUE):
-            return get_literal(var)
-        else:
-            return get_literal(-1 * var)
+        # Positive literal if the saved phase is TRUE, negative if FALSE or never assigned
+        return (var << 1) | (self.prev_assignment[var] != LiteralState.L_TRUE)
 
     """
     decide() function selects the next variable to be guessed and the guessed value.
@@ -334,9 +992,20 @@ class Solver:
         # Some inputs have unused variables, so we select only those with positive score.
         selected_lit = 0
         unassigned_var_found = False
-        while self.score2var:
-            max_score, var = self.score2var.pop()
-            self.global_max_score = max(self.global_max_score, max_score)
+        # Assumptions are decided before anything else
+        for lit in self.assumptions:
+            lit_state = self.curr_literal_assignment[lit]
+            if lit_state == LiteralState.L_TRUE:
+                continue
+            if lit_state == LiteralState.L_FALSE:
+                self.analyze_final(lit)
+                return SolverState.S_UNSATISFIED
+            unassigned_var_found = True
+            selected_lit = lit
+            break
+        while not unassigned_var_found and self.var_order:
+            var = self.var_order.pop_max()
+            self.global_max_score = max(self.global_max_score, self.activity[var])
             if self.curr_assignment[var] == LiteralState.L_UNASSIGNED:
                 unassigned_var_found = True
                 selected_lit = self.get_lit_memoised(var)
@@ -346,6 +1015,11 @@ class Solver:
             return SolverState.S_SATISFIED
         # print(selected_lit, selected_var, max_activity_till_now)
         assert selected_lit != 0
+        self.push_decision(selected_lit)
+        return SolverState.S_UNRESOLVED
+
+    # Open a new decision level on which lit is assigned TRUE, bcp() is left to the caller
+    def push_decision(self, lit):
         self.decision_count += 1
         self.curr_level += 1
         # We need to track this new assignment
@@ -360,157 +1034,435 @@ class Solver:
             self.conflicts_upto_level[self.curr_level] = self.learnt_clauses_count       
         
         # Now we assign the literal as TRUE, and since put the (FALSE) opposite literal to bcp stack
-        self.assert_nonunary_literal(selected_lit)
-        self.bcp_stack.append(get_opposite_literal(selected_lit))
-        return SolverState.S_UNRESOLVED
+        self.assert_nonunary_literal(lit)
+        self.antecedent[lit >> 1] = -1
+        self.bcp_stack.append(lit ^ 1)
     
     """
-    analyse_conflict() takes a conflicting clause and returns the level to backtrack to, and a learned clause
+    analyse_conflict() takes the literals of a conflicting clause and returns the level to backtrack to,
+    the UIP literal to be asserted and its antecedent (the learned clause)
     We use the nearest UIP (Unique Implication Point) finding method as highlighted in Kroening's book.
+    The learned clause is then minimised (see literal_redundant()) before being inserted.
+    seen[] is kept across conflicts, only the variables in analyze_to_clear are reset at the end.
     """
-    def analyze_conflict(self, conflicting_clause: Clause) -> (int, int):
+    def analyze_conflict(self, conflicting_clause) -> (int, int, int):
         # print("Running analyse_conflict")
-        curr_literals = [lit for lit in conflicting_clause.literals]
-        learned_clause = Clause([])
-        backtrack_level = 0 # to be returned by this function
+        seen = self.seen
+        to_clear = self.analyze_to_clear
+        assignment_level = self.assignment_level
+        curr_level = self.curr_level
+        curr_literals = conflicting_clause
+        learned_clause = [0] # learned_clause[0] is reserved for the UIP
         to_resolve_count = 0
-        watch_lit = 0 # a watcher for the new learned literal
 
-        marked = [False] * (self.var_count + 1)
-        trail_index = len(self.assigned_till_now) - 1
+        trail = self.assigned_till_now
+        trail_index = len(trail) - 1
         resolve_lit = 0
         resolve_var = 0
-        iter = 0
         """
         This loop outputs the learned clause, it works as follows:
         Invariant 1: curr_literals is the clause to be fused into learned_clause
         Invariant 2: learned caluse contains exactly one variable assigned at current level (UIP)
         All other literals are assigned before.
+        Ground level literals are always FALSE, so they are left out of the learned clause.
+        The resolved variable stays seen, this also skips it in its own antecedent.
         """
-        while (iter == 0 or to_resolve_count > 0):
-            iter += 1
+        while (True):
             for lit in curr_literals:
-                var = get_variable(lit)
-                if marked[var]:
+                var = lit >> 1
+                if seen[var] or assignment_level[var] == 0:
                     continue
-                marked[var] = True
-                if (self.assignment_level[var] == self.curr_level):
+                seen[var] = 1
+                to_clear.append(var)
+                if (assignment_level[var] == curr_level):
                     to_resolve_count += 1
                 else:
-                    learned_clause.insert_literal(lit)
-                    if (self.assignment_level[var] > backtrack_level):
-                        # watch_lit: 2nd highest assigment level, first is UIP
-                        backtrack_level = self.assignment_level[var]
-                        watch_lit = len(learned_clause.literals) - 1
+                    learned_clause.append(lit)
             # Find a variable to be resolved by traversing the recently assigned literals first
-            while (trail_index >= 0):
-                resolve_lit = self.assigned_till_now[trail_index]
-                resolve_var = get_variable(resolve_lit)
+            # With chronological backtracking lower level literals may be above them on the trail
+            while (True):
+                resolve_lit = trail[trail_index]
+                resolve_var = resolve_lit >> 1
                 trail_index -= 1
-                if marked[resolve_var]:
+                if seen[resolve_var] and assignment_level[resolve_var] == curr_level:
                     break
-            marked[resolve_var] = False
             to_resolve_count -= 1
             if not to_resolve_count:
                 # Just one literal remaining with current level assignment, we are done
-                continue 
+                break
             antecedent_id = self.antecedent[resolve_var]
-            curr_literals = [lit for lit in self.clauses[antecedent_id].literals if lit != resolve_lit]
-        
+            if antecedent_id < -1: # is_binary_antecedent()
+                curr_literals = (-(antecedent_id + 1),)
+            else:
+                self.bump_clause_activity(antecedent_id)
+                curr_literals = self.clauses.get_literals(antecedent_id)
+
         # The learned clause becomes an unit clause after backtracking
         # This is because every other literal in the learned clause was assigned before
         # the backtrack level
         # resolve_lit is an UIP
+        opposite_resolv_lit = resolve_lit ^ 1
+        learned_clause[0] = opposite_resolv_lit
+
+        # Remove the literals implied by the rest of the learned clause
+        abstract_levels = 0
+        for index in range(1, len(learned_clause)):
+            abstract_levels |= 1 << (assignment_level[learned_clause[index] >> 1] & 31)
+        kept = 1
+        for index in range(1, len(learned_clause)):
+            lit = learned_clause[index]
+            if self.antecedent[lit >> 1] == -1 or not self.literal_redundant(lit, abstract_levels):
+                learned_clause[kept] = lit
+                kept += 1
+        self.minimized_literals_count += len(learned_clause) - kept
+        del learned_clause[kept:]
+        for var in to_clear:
+            seen[var] = 0
+        to_clear.clear()
+
+        # watch_lit: 2nd highest assigment level, first is UIP
+        backtrack_level = 0 # to be returned by this function
+        watch_lit = 0 # a watcher for the new learned literal
+        for index in range(1, len(learned_clause)):
+            level = assignment_level[learned_clause[index] >> 1]
+            if level > backtrack_level:
+                backtrack_level = level
+                watch_lit = index
+
         self.learnt_clauses_count += 1
-        opposite_resolv_lit = get_opposite_literal(resolve_lit)
-        learned_clause.insert_literal(opposite_resolv_lit)
-        self.increment_value /= CONSTANTS.VAR_DECAY_RATE
-        if learned_clause.is_unary:
-            # Not that we are inserting to bcp_stack without asserting UIP
-            # Asserting will be done immediately after backtrack (see backtrack())
-            self.bcp_stack.append(resolve_lit)
-            self.unary_clauses.append(learned_clause)
+        self.increment_value /= self.var_decay_rate
+        self.clause_increment_value /= CONSTANTS.CLAUSE_DECAY_RATE
+        antecedent = -1
+        if self.proof is not None:
+            self.proof.add(learned_clause)
+        # UIP is asserted and put to bcp_stack immediately after backtrack (see backtrack())
+        if len(learned_clause) == 1:
+            lbd = 1
+            self.unary_clauses.append(opposite_resolv_lit)
         else:
-            self.bcp_stack.append(resolve_lit)
-            self.insert_clause(learned_clause, watch_lit, len(learned_clause.literals) - 1)
-        # for lit in learned_clause.literals:
+            lbd = self.compute_lbd(learned_clause)
+            antecedent = self.insert_clause(learned_clause, watch_lit, 0, True, lbd)
+        if self.checkpoint is not None:
+            self.checkpoint.record(learned_clause, lbd)
+        self.restart_policy.on_conflict(self, backtrack_level, lbd)
+        # for lit in learned_clause:
         #     var = get_variable(lit)
         #     print("({}, {})".format(var, self.assignment_level[var]))
-        return backtrack_level, opposite_resolv_lit
+        return backtrack_level, opposite_resolv_lit, antecedent
 
-    # RESTART heuristic, reset all assignments except ground level and start afresh
-    # Note that learned claused are not deleted only we start assignments from the beginning 
+    """
+    analyze_final() is called when the assumption lit is found FALSE. Every decision on the trail is then an
+    assumption, the ones reached by walking back the antecedents of lit form the failed assumptions.
+    """
+    def analyze_final(self, lit):
+        self.conflict_assumptions = [get_dimacs_literal(lit)]
+        var = get_variable(lit)
+        if self.assignment_level[var] == 0:
+            return
+        seen = self.seen
+        seen[var] = 1
+        for index in range(len(self.assigned_till_now) - 1, -1, -1):
+            trail_lit = self.assigned_till_now[index]
+            trail_var = get_variable(trail_lit)
+            if not seen[trail_var]:
+                continue
+            seen[trail_var] = 0
+            antecedent_id = self.antecedent[trail_var]
+            if antecedent_id == -1:
+                # Also when trail_var is var: lit was falsified by the opposite assumption, both are in the core
+                self.conflict_assumptions.append(get_dimacs_literal(trail_lit))
+                continue
+            if is_binary_antecedent(antecedent_id):
+                reason_literals = (get_binary_antecedent_literal(antecedent_id),)
+            else:
+                reason_literals = self.clauses.get_literals(antecedent_id)
+            for reason_lit in reason_literals:
+                reason_var = get_variable(reason_lit)
+                if reason_var != trail_var and self.assignment_level[reason_var] > 0:
+                    seen[reason_var] = 1
+
+    """
+    Recursive conflict clause minimisation (as in MINISAT):
+    A literal of the learned clause is redundant if all the other literals of its antecedent are either
+    in the learned clause (seen) or are themselves redundant. The search gives up as soon as it reaches a
+    decision or a level not present in the learned clause (abstract_levels is a 32 bit signature of them).
+    Variables proven redundant stay seen so that they are not explored again in this conflict.
+    """
+    def literal_redundant(self, lit, abstract_levels: int) -> bool:
+        seen = self.seen
+        to_clear = self.analyze_to_clear
+        assignment_level = self.assignment_level
+        antecedent = self.antecedent
+        clauses = self.clauses
+        top = len(to_clear)
+        stack = [lit]
+        while stack:
+            var = stack.pop() >> 1
+            antecedent_id = antecedent[var]
+            if antecedent_id < -1: # is_binary_antecedent()
+                reason_literals = (-(antecedent_id + 1),)
+            else:
+                reason_literals = clauses.get_literals(antecedent_id)
+            for reason_lit in reason_literals:
+                reason_var = reason_lit >> 1
+                if reason_var == var or seen[reason_var] or assignment_level[reason_var] == 0:
+                    continue
+                if (antecedent[reason_var] != -1 and
+                        (1 << (assignment_level[reason_var] & 31)) & abstract_levels):
+                    seen[reason_var] = 1
+                    stack.append(reason_lit)
+                    to_clear.append(reason_var)
+                else:
+                    # Cannot be removed, undo the marks made in this call
+                    for index in range(top, len(to_clear)):
+                        seen[to_clear[index]] = 0
+                    del to_clear[top:]
+                    return False
+        return True
+
+    # LBD: number of distinct decision levels in the clause, lower is better
+    def compute_lbd(self, literals) -> int:
+        self.lbd_stamp += 1
+        stamp = self.lbd_stamp
+        level_stamp = self.level_stamp
+        lbd = 0
+        for lit in literals:
+            level = self.assignment_level[lit >> 1]
+            if level_stamp[level] != stamp:
+                level_stamp[level] = stamp
+                lbd += 1
+        return lbd
+
+    """
+    Learned clause database reduction: learned clauses are only useful while they keep taking part in
+    conflicts, otherwise they just make the watch lists longer. Every reduce_interval conflicts
+    (growing by REDUCE_DB_INCREMENT each time), half of the learned clauses are deleted, worst LBD first
+    and then least active. Glue clauses (LBD <= GLUE_LBD) and the antecedents of currently assigned
+    variables are never deleted. The arena is compacted and watch_map, antecedent are remapped.
+    """
+    def reduce_db(self):
+        clauses = self.clauses
+        keep = array('b', [1]) * len(clauses)
+        locked = set()
+        for var in range(1, self.var_count + 1):
+            if (self.assignment_level[var] > 0 and self.curr_assignment[var] != LiteralState.L_UNASSIGNED
+                    and self.antecedent[var] >= 0):
+                locked.add(self.antecedent[var])
+        candidates = [clause_id for clause_id in range(len(clauses)) if clauses.learnt[clause_id]
+            and clauses.lbd[clause_id] > CONSTANTS.GLUE_LBD and clause_id not in locked]
+        candidates.sort(key = lambda clause_id: (-clauses.lbd[clause_id], clauses.activity[clause_id]))
+        for clause_id in candidates[:clauses.learnt_count // 2]:
+            keep[clause_id] = 0
+            if self.proof is not None:
+                self.proof.delete(clauses.get_literals(clause_id))
+        deleted_count = len(clauses) - sum(keep)
+
+        remap = clauses.compact(keep)
+        # Watchers are unchanged, so the watch lists can simply be rebuilt from the compacted arena
+        for watches in self.watch_map:
+            watches.clear()
+        for clause_id in range(len(clauses)):
+            first_watch = clauses.get_first_watcher(clause_id)
+            second_watch = clauses.get_second_watcher(clause_id)
+            self.watch_this_clause(first_watch, clause_id, second_watch)
+            self.watch_this_clause(second_watch, clause_id, first_watch)
+        # Deleted antecedents can only belong to ground level assignments which are never resolved
+        for var in range(1, self.var_count + 1):
+            if self.antecedent[var] >= 0:
+                self.antecedent[var] = remap[self.antecedent[var]]
+
+        self.deleted_clauses_count += deleted_count
+        self.reduce_count += 1
+        self.reduce_interval += CONSTANTS.REDUCE_DB_INCREMENT
+        self.next_reduce = self.learnt_clauses_count + self.reduce_interval
+
+    """
+    RESTART heuristic, reset the assignments and start afresh, when to restart is left to restart_policy.
+    Note that learned claused are not deleted only we start assignments from the beginning.
+    Partial restart: the decisions up to the first one with activity lower than the variable that would be
+    decided next are kept, as the search would have reproduced them anyway right after a full restart.
+    """
     def reset_state(self):
         # print("Restart")
-        """
-        The threshold system works as follows eg. (chainsaw graph)
-        1. We have a range [1, 10]. Threshold increases after every restart till it crosses the ub
-        2. At that point the threshold is rest and the range is also increased to let it go even higher
-        """
         self.restart_count += 1
-        self.restart_threshold = int(self.restart_threshold * CONSTANTS.THRESHOLD_MULTIPLIER)
-        if (self.restart_threshold > self.restart_upper_bound):
-            self.restart_threshold = CONSTANTS.RESTART_LOWER_BOUND
-            self.restart_upper_bound = int(self.restart_upper_bound * CONSTANTS.THRESHOLD_MULTIPLIER)
+        self.restart_policy.on_restart(self)
+        if self.local_search is not None and self.learnt_clauses_count >= self.local_search.next_run:
+            if self.local_search.run(self):
+                # The saved phases are a model, the next descent from ground level goes straight to it
+                self.unassign_till_level(0)
+                return
 
-        # Resets are similar to backtrack() function below, except that it resets evrything to ground level  
-        for var in range(1, self.var_count + 1):
-            if (self.assignment_level[var] > 0):
-                self.assign_variable(var, LiteralState.L_UNASSIGNED)
-                # self.curr_assignment[var] = LiteralState.L_UNASSIGNED
-                self.bump_var_score(var)
-        
+        # Assigned variables at the top of var_order would be skipped by decide() anyway
+        var_order = self.var_order
+        while var_order and self.curr_assignment[var_order.heap[0]] != LiteralState.L_UNASSIGNED:
+            var_order.pop_max()
+        level = 0
+        if var_order:
+            next_activity = self.activity[var_order.heap[0]]
+            while level < self.curr_level:
+                decision_var = self.assigned_till_now[self.assignments_upto_level[level + 1]] >> 1
+                if self.activity[decision_var] < next_activity:
+                    break
+                level += 1
+        else:
+            # Everything is assigned, next decide() finds the cnf satisfied
+            level = self.curr_level
+        self.reused_levels_count += level
+        self.unassign_till_level(level)
+
+    """
+    Unassign the variables assigned at levels >= k + 1, costs O(size of trail above k)
+    Literals of levels <= k above them on the trail (implied out of order, see backtrack()) stay assigned and
+    keep their order, they are put on the bcp_stack again as their watchers may have moved meanwhile.
+    """
+    def unassign_till_level(self, k: int):
+        if k >= self.curr_level:
+            return
+        trail = self.assigned_till_now
+        start = self.assignments_upto_level[k + 1]
+        kept = start
+        assignment_level = self.assignment_level
+        curr_assignment = self.curr_assignment
+        literal_assignment = self.curr_literal_assignment
+        var_order = self.var_order
+        L_UNASSIGNED = LiteralState.L_UNASSIGNED
+        for index in range(start, len(trail)):
+            lit = trail[index]
+            var = lit >> 1
+            if (assignment_level[var] > k):
+                # assign_variable(var, L_UNASSIGNED) inlined
+                curr_assignment[var] = L_UNASSIGNED
+                literal_assignment[lit] = literal_assignment[lit ^ 1] = L_UNASSIGNED
+                var_order.insert(var)
+            else:
+                trail[kept] = lit
+                kept += 1
+        self.unassigned_count += len(trail) - kept
+        del trail[kept:]
         self.bcp_stack.clear()
-        self.assigned_till_now.clear()
-        self.assignments_upto_level = [0]
-        self.conflicts_upto_level = [0]
-        self.curr_level = 0
-        self.max_level = 0
-    
-    # Function to backtrack based on the output of analyse_conflict() 
-    def backtrack(self, k: int, uip_lit):
+        for index in range(start, kept):
+            self.bcp_stack.append(trail[index] ^ 1)
+        self.curr_level = k
+
+    """
+    Function to backtrack based on the output of analyse_conflict(): uip_lit is asserted at level k.
+    Chronological backtracking: when the backjump would cross more than chrono_threshold levels, only the
+    current level is undone and uip_lit is implied out of order, at level k on top of the trail. The
+    assignments of the levels in between are kept instead of being undone and derived again.
+    """
+    def backtrack(self, k: int, uip_lit, antecedent: int):
         # print("Running backtrack")
-        # Invoke restart heuristic if too many clauses have been learnt after backtrack target level
-        if k > 0 and (self.learnt_clauses_count - self.conflicts_upto_level[k] > self.restart_threshold):
-            self.reset_state()
-            return
-        # Iterate over the variables assigned at level >= k + 1 and unassign them
-        for index in range(self.assignments_upto_level[k+1], len(self.assigned_till_now)):
-            var = get_variable(self.assigned_till_now[index])
-            if (self.assignment_level[var] > k):
-                self.assign_variable(var, LiteralState.L_UNASSIGNED)
-                # self.curr_assignment[var] = LiteralState.L_UNASSIGNED
-                self.bump_var_score(var)
+        if self.chrono_threshold is not None and self.curr_level - k > self.chrono_threshold:
+            self.chrono_backtracks_count += 1
+            self.unassign_till_level(self.curr_level - 1)
+        else:
+            self.unassign_till_level(k)
 
         # analyse_function() returns an asserting clause with the UIP just ready for assignment
         # This helps to immediately put the learnt clause into practice
-        self.assigned_till_now = self.assigned_till_now[:self.assignments_upto_level[k+1]]
-        self.curr_level = k
+        # Note that bcp_stack has been cleared, the FALSE literal of UIP is pushed again
         if k == 0:
             # We had learnt a unary clause
             self.assert_unary_literal(uip_lit)
         else:
             self.assert_nonunary_literal(uip_lit)
-        self.antecedent[get_variable(uip_lit)] = len(self.clauses) - 1
+            self.assignment_level[uip_lit >> 1] = k
+        self.antecedent[uip_lit >> 1] = antecedent
+        self.bcp_stack.append(uip_lit ^ 1)
+
+    """
+    With chronological backtracking a conflicting clause may have no literal at the current level. The
+    conflict is then analysed at the highest level in the clause (conflict level) after undoing the levels
+    above it. The two highest level literals become the watchers so that backtracking never leaves a clause
+    with two FALSE watchers and unassigned literals. Returns
+        S_UNSATISFIED if the conflict level is 0 (every literal FALSE at ground level)
+        S_UNRESOLVED if only one literal is at the conflict level: the clause just implies it one level lower,
+            no clause is learned
+        S_CONFLICT if the conflict must be analysed by analyze_conflict()
+    """
+    def prepare_conflict(self, conflicting_clause) -> SolverState:
+        assignment_level = self.assignment_level
+        levels = [assignment_level[lit >> 1] for lit in conflicting_clause]
+        conflict_level = max(levels)
+        if conflict_level == 0:
+            return SolverState.S_UNSATISFIED
+        clause_id = self.conflicting_clause_id
+        if clause_id >= 0:
+            self.watch_highest_levels(clause_id)
+        self.unassign_till_level(conflict_level)
+        if levels.count(conflict_level) > 1:
+            return SolverState.S_CONFLICT
+        index = levels.index(conflict_level)
+        levels[index] = 0
+        if clause_id >= 0:
+            antecedent = clause_id
+        else:
+            antecedent = get_binary_antecedent(conflicting_clause[1 - index])
+        self.backtrack(max(levels), conflicting_clause[index], antecedent)
+        return SolverState.S_UNRESOLVED
+
+    # Move the watchers of an arena clause to its two highest level literals, updating the watch lists
+    def watch_highest_levels(self, clause_id: int):
+        clauses = self.clauses
+        arena_literals = clauses.literals
+        start = clauses.offset[clause_id]
+        positions = sorted(range(start, start + clauses.size[clause_id]), reverse = True,
+            key = lambda index: self.assignment_level[arena_literals[index] >> 1])
+        first, second = positions[0], positions[1]
+        old_first, old_second = clauses.first_watcher[clause_id], clauses.second_watcher[clause_id]
+        if {first, second} == {old_first, old_second}:
+            return
+        for position in (old_first, old_second):
+            watches = self.watch_map[arena_literals[position]]
+            for index in range(0, len(watches), 2):
+                if watches[index] == clause_id:
+                    del watches[index:index + 2]
+                    break
+        clauses.first_watcher[clause_id] = first
+        clauses.second_watcher[clause_id] = second
+        self.watch_this_clause(arena_literals[first], clause_id, arena_literals[second])
+        self.watch_this_clause(arena_literals[second], clause_id, arena_literals[first])
 
     # Function to verify output assignment if any
     def verify_assignment(self):
-        non_true_clauses = []
-        all_clauses = self.clauses + self.unary_clauses
+        non_true_count = self.count_unsatisfied()
+        if self.preprocessor is not None:
+            # The clauses above are the preprocessed ones, the input formula must hold as well
+            model = [state == LiteralState.L_TRUE for state in self.curr_assignment]
+            non_true_count += self.preprocessor.count_unsatisfied_original(model)
+        if not non_true_count:
+            print("AC, All clauses evaluate to true under given assignment")
+        else:
+            print("WA, {} unsatisfied clauses found".format(non_true_count))
+
+    # Number of clauses (learnt and unary included) without a TRUE literal in the current assignment
+    # With numpy, large formulas are checked at once by a ClauseMatrix (see clause_matrix.py)
+    def count_unsatisfied(self) -> int:
+        clauses = self.clauses
+        arena_literals = clauses.literals
+        if clause_matrix.worth_vectorizing(len(arena_literals)):
+            model = [state == LiteralState.L_TRUE for state in self.curr_assignment]
+            assigned = [state != LiteralState.L_UNASSIGNED for state in self.curr_assignment]
+            return clause_matrix.ClauseMatrix.from_solver(self).count_unsatisfied(model, assigned)
+        non_true_count = int(self.empty_clause_found)
         # Every clause including learnt and unary must have atleast one TRUE literal
-        for clause in all_clauses:
+        for clause_id in range(len(clauses)):
+            start = clauses.offset[clause_id]
             true_literal_found = False
-            for lit in clause.literals:
-                if self.curr_literal_assignment[lit] == LiteralState.L_TRUE:
-                # if (self.get_literal_status(lit) == LiteralState.L_TRUE):
+            for index in range(start, start + clauses.size[clause_id]):
+                if self.curr_literal_assignment[arena_literals[index]] == LiteralState.L_TRUE:
                     true_literal_found = True
                     break
             if not true_literal_found:
-                non_true_clauses.append(clause)
-        if not non_true_clauses:
-            print("AC, All clauses evaluate to true under given assignment")
-        else:
-            print("WA, {} unsatisfied clauses found".format(len(non_true_clauses)))
+                non_true_count += 1
+        for index in range(0, len(self.binary_clauses), 2):
+            if (self.curr_literal_assignment[self.binary_clauses[index]] != LiteralState.L_TRUE and
+                    self.curr_literal_assignment[self.binary_clauses[index + 1]] != LiteralState.L_TRUE):
+                non_true_count += 1
+        for lit in self.unary_clauses:
+            if self.curr_literal_assignment[lit] != LiteralState.L_TRUE:
+                non_true_count += 1
+        return non_true_count
 
     """
     Function implementing the standard CDCL framework:
@@ -520,92 +1472,397 @@ class Solver:
     """     
     def run_cdcl(self) -> SolverState:
         result: SolverState
+        if self.empty_clause_found:
+            return SolverState.S_UNSATISFIED
         while (True):
             while (True):
-                result, conflicting_clause_id = self.bcp()
+                result, conflicting_clause = self.bcp()
                 # print("BCP result was {}".format(result))
                 if (result == SolverState.S_UNSATISFIED):
+                    # Conflict at ground level, unsatisfiable whatever the assumptions
+                    self.empty_clause_found = True
                     return result
                 if (result == SolverState.S_CONFLICT):
-                    assert conflicting_clause_id != -1
-                    backtrack_level, uip_lit = self.analyze_conflict(self.clauses[conflicting_clause_id])
+                    assert conflicting_clause is not None
+                    if self.chrono_threshold is not None:
+                        result = self.prepare_conflict(conflicting_clause)
+                        if (result == SolverState.S_UNSATISFIED):
+                            self.empty_clause_found = True
+                            return result
+                        if (result == SolverState.S_UNRESOLVED):
+                            continue
+                    backtrack_level, uip_lit, antecedent = self.analyze_conflict(conflicting_clause)
                     # print("Analyze result was k = {}, uip = {}".format(backtrack_level, uip_lit))
-                    self.backtrack(backtrack_level, uip_lit)
+                    self.backtrack(backtrack_level, uip_lit, antecedent)
                 else:
                     break
+            if self.restart_policy.should_restart(self):
+                self.reset_state()
+            if self.learnt_clauses_count >= self.next_reduce:
+                self.reduce_db()
+            if self.checkpoint is not None and self.learnt_clauses_count >= self.checkpoint.next_save:
+                self.checkpoint.save(self)
+            if self.interrupted:
+                self.unknown_reason = "interrupted"
+                return SolverState.S_UNRESOLVED
+            if self.has_budget and self.budget_exceeded():
+                return SolverState.S_UNRESOLVED
             result = self.decide()
             # print("Decide result was {}".format(result))
             if (result == SolverState.S_UNSATISFIED or result == SolverState.S_SATISFIED):
                 return result
 
-    # Wrapper function to print the result of the CDCL framework
-    def solve(self):
+    # Give a value to the variables removed by preprocessing (unused variables are set FALSE)
+    def extend_model(self):
+        model = [state == LiteralState.L_TRUE for state in self.curr_assignment]
+        self.preprocessor.extend_model(model)
+        for var in range(1, self.var_count + 1):
+            self.assign_variable(var, LiteralState.L_TRUE if model[var] else LiteralState.L_FALSE)
+
+    """
+    Limits of the next run_cdcl(), relative to the current counters: conflicts (learned clauses), propagations
+    (implied assignments), time (seconds of wall clock) and memory (megabytes of resident memory of the process,
+    see resident_memory()). None means unlimited. Budgets are checked before every decision, so they may be overshot by the
+    conflicts and propagations of one decision.
+    """
+    def set_budget(self, conflict_budget = None, propagation_budget = None, time_budget = None, memory_budget = None):
+        self.conflict_limit = None if conflict_budget is None else self.learnt_clauses_count + conflict_budget
+        self.propagation_limit = None if propagation_budget is None else (
+            self.assignments_count - self.decision_count + propagation_budget)
+        self.deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.memory_limit = None if memory_budget is None else memory_budget * 1024 * 1024
+        self.memory_check_countdown = 0
+        self.memory_start_peak = peak_memory() if memory_budget is not None else 0
+        self.has_budget = (conflict_budget is not None or propagation_budget is not None or
+            time_budget is not None or memory_budget is not None)
+
+    # True (with unknown_reason set) if a limit of set_budget() is reached
+    def budget_exceeded(self) -> bool:
+        if self.conflict_limit is not None and self.learnt_clauses_count >= self.conflict_limit:
+            self.unknown_reason = "conflicts"
+        elif (self.propagation_limit is not None and
+                self.assignments_count - self.decision_count >= self.propagation_limit):
+            self.unknown_reason = "propagations"
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.unknown_reason = "time"
+        elif self.memory_limit is not None and self.memory_exceeded():
+            self.unknown_reason = "memory"
+        else:
+            return False
+        return True
+
+    def memory_exceeded(self) -> bool:
+        self.memory_check_countdown -= 1
+        if self.memory_check_countdown > 0:
+            return False
+        self.memory_check_countdown = CONSTANTS.MEMORY_CHECK_INTERVAL
+        memory = resident_memory()
+        if memory is None:
+            # Only the peak is known, which never goes down: it counts once it grew during this solve()
+            memory = peak_memory()
+            return memory > self.memory_start_peak and memory >= self.memory_limit
+        return memory >= self.memory_limit
+
+    """
+    Solve the cnf under the given assumptions (DIMACS literals which must hold in the model) and return a
+    SolveResult. The solver can be reused afterwards: add_clause() and solve() may be called again, learned
+    clauses, variable activities and saved phases are kept across calls.
+    The budgets (see set_budget()) apply to this call only, when one runs out the result is UNKNOWN with the
+    exhausted budget as reason.
+    With resume, the search carries on from the current trail instead of ground level, after
+    add_blocking_clause() with the same assumptions.
+    """
+    def solve(self, assumptions: list = (), conflict_budget = None, propagation_budget = None, time_budget = None,
+            memory_budget = None, resume = False) -> SolveResult:
         # print("Solving")
+        self.set_budget(conflict_budget, propagation_budget, time_budget, memory_budget)
+        self.unknown_reason = None
+        if not resume:
+            self.unassign_till_level(0)
+        self.add_variables(max((abs(literal) for literal in assumptions), default = 0))
+        self.assumptions = [get_literal(literal) for literal in assumptions]
+        self.conflict_assumptions = []
+        if self.local_search is not None and not resume:
+            self.local_search.run(self)
         result : SolverState = self.run_cdcl()
+        self.has_budget = False
+        if self.checkpoint is not None:
+            self.checkpoint.save(self)
         if (result == SolverState.S_SATISFIED):
-            print("SATISFIABLE")
-            self.verify_assignment()
-            with open("assignment.txt", 'w') as assignment_file:
-                for var, state in enumerate(self.curr_assignment):
-                    if (var == 0):
-                        assignment_file.write("State: ")
-                        continue
-                    assignment_file.write("{} ".format(-1 * var if state == LiteralState.L_FALSE else var))
-        else:
-            print("UNSATISFIABLE")
+            if self.preprocessor is not None:
+                self.extend_model()
+            model = [var if self.curr_assignment[var] == LiteralState.L_TRUE else -var
+                for var in range(1, self.var_count + 1)]
+            return SolveResult(result, model = model, statistics = self.get_statistics())
+        if (result == SolverState.S_UNRESOLVED):
+            return SolveResult(result, reason = self.unknown_reason, statistics = self.get_statistics())
+        if self.proof is not None and self.empty_clause_found:
+            self.proof.add([])
+        return SolveResult(SolverState.S_UNSATISFIED, failed_assumptions = self.conflict_assumptions,
+            statistics = self.get_statistics())
+
+    """
+    Ask a running solve() to stop, it returns an UNKNOWN SolveResult soon after. Only sets a flag, so it is
+    safe to call from another thread. The flag stays set (later solve() calls return UNKNOWN at once) until
+    clear_interrupt() is called.
+    """
+    def interrupt(self):
+        self.interrupted = True
+
+    def clear_interrupt(self):
+        self.interrupted = False
+
+    # Assumptions (DIMACS literals) responsible for the last UNSATISFIABLE result, empty if unsatisfiable without them
+    def failed_assumptions(self) -> list:
+        return list(self.conflict_assumptions)
+
+    # Write the model found by the last solve() to file_name
+    def write_assignment(self, file_name = "assignment.txt"):
+        with open(file_name, 'w') as assignment_file:
+            for var, state in enumerate(self.curr_assignment):
+                if (var == 0):
+                    assignment_file.write("State: ")
+                    continue
+                assignment_file.write("{} ".format(-1 * var if state == LiteralState.L_FALSE else var))
+
+    """
+    The clauses as DIMACS literals, every clause terminated by 0, in the format of dimacs.read_dimacs().
+    Learned clauses in the arena are left out. Learned unary and binary clauses are stored along with the
+    input ones and are included, they are implied by the input so the formula stays equivalent.
+    """
+    def get_dimacs_literals(self) -> array:
+        dimacs_literals = array('i')
+        if self.empty_clause_found:
+            dimacs_literals.append(0)
+        clauses = self.clauses
+        for clause_id in range(len(clauses)):
+            if not clauses.learnt[clause_id]:
+                dimacs_literals.extend(get_dimacs_literal(lit) for lit in clauses.get_literals(clause_id))
+                dimacs_literals.append(0)
+        binary_clauses = self.binary_clauses
+        for index in range(0, len(binary_clauses), 2):
+            dimacs_literals.append(get_dimacs_literal(binary_clauses[index]))
+            dimacs_literals.append(get_dimacs_literal(binary_clauses[index + 1]))
+            dimacs_literals.append(0)
+        for lit in self.unary_clauses:
+            dimacs_literals.append(get_dimacs_literal(lit))
+            dimacs_literals.append(0)
+        return dimacs_literals
+
+    # Counters printed by print_statistics(), by name
+    def get_statistics(self) -> dict:
+        return {
+            "Restarts": self.restart_count,
+            "Reused trail levels": self.reused_levels_count,
+            "Chronological backtracks": self.chrono_backtracks_count,
+            "Unassigned literals": self.unassigned_count,
+            "Learned clauses": self.learnt_clauses_count,
+            "Decisions": self.decision_count,
+            "Implications": self.assignments_count - self.decision_count,
+            "Binary implications": self.binary_implications_count,
+            "Deleted clauses": self.deleted_clauses_count,
+            "Minimized literals": self.minimized_literals_count,
+            "Max score": self.global_max_score,
+            "Parse time (s)": self.parse_time,
+        }
 
     def print_statistics(self, solve_time):
-        print("## Statistics: ")
-        print("# Restarts: ", self.restart_count)
-        print("# Learned clauses: ", self.learnt_clauses_count)
-        print("# Decisions: ", self.decision_count)
-        print("# Implications: ", self.assignments_count - self.decision_count)
-        print("# Max score: ", self.global_max_score)
-        print("# Time (s): ", solve_time)
-
-# IO function
-def read_and_solve_cnf(input_file):
-    # Read the specified input cnf file
-    input_file = open(input_file, 'r')
-    current_line = input_file.readline()
-    tokens = current_line.split()
-    while (tokens[0] != "p"):
-        # Some inputs have redundant starting lines like "c 1 = P9_0[0]"
-        current_line = input_file.readline()
-        tokens = current_line.split()
-    var_count = int(tokens[-2])
-    clause_count = int(tokens[-1])
-    solver = Solver(var_count, clause_count)
-    # Read each clause of the CNF
-    for _ in range(clause_count):
-        current_line = input_file.readline()
-        tokens = current_line.split()
-        assert(tokens.pop() == "0")
-        
-        # set removes duplicate literals from the clause
-        literals = set([get_literal(int(literal)) for literal in tokens])
-        curr_clause = Clause(list(literals))
-        # unary clauses are processed at ground level
-        # this also gives some false literals to process in the bcp_stack
-        if (curr_clause.is_unary):
-            lit = curr_clause.literals[0]
-            solver.assert_unary_literal(lit)
-            solver.bcp_stack.append(get_opposite_literal(lit))
-            solver.unary_clauses.append(curr_clause)
-        else:
-            x = random.randrange(len(literals))
-            y = random.randrange(len(literals))
-            while x == y:
-                y = random.randrange(len(literals))
-            solver.insert_clause(curr_clause, x, y)
+        print_statistics(self.get_statistics(), solve_time)
+
+def print_statistics(statistics: dict, solve_time):
+    print("## Statistics: ")
+    for name, value in statistics.items():
+        print("# {}: ".format(name), value)
+    print("# Time (s): ", solve_time)
+
+# Statistics (see Solver.get_statistics()) of several solvers in one
+# Counters are added up, except the max score which is the max over the solvers
+def merge_statistics(statistics_list: list) -> dict:
+    merged = {}
+    for statistics in statistics_list:
+        for name, value in statistics.items():
+            if name not in merged:
+                merged[name] = value
+            elif name == "Max score":
+                merged[name] = max(merged[name], value)
+            else:
+                merged[name] += value
+    return merged
+
+# Write a model (DIMACS literals, as in SolveResult) to file_name
+def write_model(model: list, file_name = "assignment.txt"):
+    with open(file_name, 'w') as assignment_file:
+        assignment_file.write("State: ")
+        for literal in model:
+            assignment_file.write("{} ".format(literal))
+
+# IO functions
+# Read the specified input cnf file (may be .gz / .bz2 / .xz compressed) into a Solver ready to solve()
+# With preprocess, the clauses go through a Preprocessor first (see preprocess.py)
+def load_cnf(input_file, restart_policy = "geometric", preprocess = False) -> Solver:
+    start_time = time.process_time()
+    var_count, clause_count, dimacs_literals = dimacs.read_dimacs(input_file)
+    parse_time = time.process_time() - start_time
+    solver = build_solver(var_count, clause_count, dimacs_literals, restart_policy, preprocess)
+    solver.parse_time += parse_time
+    return solver
+
+# load_cnf() of clauses already read (DIMACS literals, see dimacs.read_dimacs() and dimacs.parse_dimacs())
+def build_solver(var_count: int, clause_count: int, dimacs_literals, restart_policy = "geometric",
+        preprocess = False) -> Solver:
+    preprocessor = None
+    if preprocess:
+        preprocessor = Preprocessor(var_count, dimacs_literals)
+        preprocessor.run()
+        dimacs_literals = preprocessor.get_dimacs_literals()
+    start_time = time.process_time()
+    solver = Solver(var_count, clause_count, make_restart_policy(restart_policy))
+    solver.preprocessor = preprocessor
+    solver.insert_input_clauses(dimacs_literals)
+    solver.parse_time = time.process_time() - start_time
+    return solver
 
+# With decompose, the connected components of the cnf are solved separately by worker_count processes
+# (see components.py). profile is None, "timing" or "sampling", progress_interval > 0 writes a JSON line
+# of live statistics to stderr every progress_interval conflicts (see profiler.py)
+# With proof_file, a DRAT proof (binary or textual) of an UNSATISFIABLE answer is written (see proof.py)
+# budgets are keyword arguments of Solver.solve() (conflict_budget, time_budget, ...), the answer is UNKNOWN
+# when one runs out. chrono_threshold enables chronological backtracking (see Solver.backtrack())
+# With checkpoint_file, the search is saved every checkpoint_interval conflicts and resumed from the file if it
+# holds a checkpoint of the same cnf. warm_start_file is a checkpoint of a related cnf to start from
+# (see checkpoint.py). A model is written to assignment_file
+# local_search ("probsat" or "walksat") picks the saved phases by local search before and during the search
+# (see localsearch.py)
+def read_and_solve_cnf(input_file, restart_policy = "geometric", preprocess = False, decompose = False,
+        worker_count = None, profile = None, progress_interval = 0, proof_file = None, binary_proof = True,
+        budgets = None, chrono_threshold = None, checkpoint_file = None, checkpoint_interval = None,
+        warm_start_file = None, assignment_file = "assignment.txt", local_search = None):
+    if proof_file is not None and (preprocess or decompose):
+        raise ValueError("DRAT proofs are only written for the plain search, without preprocessing or components")
+    if budgets and decompose:
+        raise ValueError("Budgets only apply to the plain search, not to components")
+    if (checkpoint_file is not None or warm_start_file is not None) and (decompose or proof_file is not None):
+        raise ValueError("Checkpoints only apply to the plain search, without components or DRAT proofs")
+    if local_search is not None and decompose:
+        raise ValueError("Local search only applies to the plain search, not to components")
+    solver = load_cnf(input_file, restart_policy, preprocess)
+    solver.chrono_threshold = chrono_threshold
+    if checkpoint_file is not None or warm_start_file is not None:
+        import checkpoint
+        resumed = False
+        if checkpoint_file is not None:
+            solver_checkpoint = checkpoint.Checkpoint(checkpoint_file, checkpoint_interval or
+                checkpoint.CONSTANTS.INTERVAL)
+            resumed = solver_checkpoint.attach(solver)
+            if resumed:
+                print("# Resumed from: ", checkpoint_file)
+        if warm_start_file is not None and not resumed:
+            imported, rejected = checkpoint.warm_start(solver, warm_start_file)
+            print("# Warm start: {} clauses imported, {} rejected".format(imported, rejected))
+    if local_search is not None:
+        import localsearch
+        localsearch.LocalSearch(local_search).attach(solver)
+    if proof_file is not None:
+        import proof
+        solver.proof = proof.ProofWriter(proof_file, binary_proof)
+    if solver.preprocessor is not None:
+        solver.preprocessor.print_statistics()
     # solver.print_clauses()
+    profiler = None
+    if profile is not None or progress_interval:
+        import profiler as profiler_module
+        profiler = profiler_module.Profiler(solver, profile or "sampling", progress_interval,
+            profiler_module.json_lines())
+        profiler.attach()
     start_time = time.process_time()
-    solver.solve()
+    if decompose:
+        import components
+        result, report = components.solve_components(solver, worker_count, restart_policy)
+        components.print_report(report)
+    else:
+        result = solver.solve(**(budgets or {}))
     finish_time = time.process_time()
-    solver.print_statistics(finish_time - start_time)
+    if profiler is not None:
+        profiler.detach()
+    if solver.proof is not None:
+        solver.proof.close()
+    if solver.checkpoint is not None:
+        solver.checkpoint.close()
+    if result.satisfiable:
+        print("SATISFIABLE")
+        solver.verify_assignment()
+        solver.write_assignment(assignment_file)
+    elif result.unknown:
+        print("UNKNOWN")
+        print("# Out of budget: ", result.reason)
+    else:
+        print("UNSATISFIABLE")
+    if decompose:
+        print_statistics(report["statistics"], report["solve_time"])
+    else:
+        solver.print_statistics(finish_time - start_time)
+    if profile is not None:
+        profiler.print_report()
+    if solver.checkpoint is not None:
+        solver.checkpoint.print_statistics()
+    if solver.local_search is not None:
+        solver.local_search.print_statistics()
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "CDCL based SAT solver")
+    parser.add_argument("input_file", nargs = "?", default = "input/sat/bmc-1.cnf")
+    parser.add_argument("--restart", choices = sorted(RESTART_POLICIES), default = "geometric",
+        help = "restart policy (default: geometric)")
+    parser.add_argument("--preprocess", action = "store_true",
+        help = "run unit propagation, subsumption and variable elimination before solving")
+    parser.add_argument("--components", action = "store_true",
+        help = "solve the connected components of the cnf separately, in parallel")
+    parser.add_argument("--workers", type = int, default = None,
+        help = "number of processes used with --components (default: cpu count)")
+    parser.add_argument("--profile", choices = ["timing", "sampling"], default = None,
+        help = "report the time spent per phase, sampling is cheaper but approximate")
+    parser.add_argument("--progress", type = int, default = 0, metavar = "N",
+        help = "write live statistics as JSON lines to stderr every N conflicts")
+    parser.add_argument("--proof", default = None, metavar = "FILE",
+        help = "write a DRAT proof of unsatisfiability to FILE (check it with proof.py)")
+    parser.add_argument("--proof-format", choices = ["binary", "text"], default = "binary",
+        help = "DRAT proof encoding (default: binary)")
+    parser.add_argument("--conflicts", type = int, default = None, metavar = "N",
+        help = "give up (answer UNKNOWN) after N conflicts")
+    parser.add_argument("--propagations", type = int, default = None, metavar = "N",
+        help = "give up (answer UNKNOWN) after N propagations")
+    parser.add_argument("--time-limit", type = float, default = None, metavar = "SECONDS",
+        help = "give up (answer UNKNOWN) after SECONDS of wall clock time")
+    parser.add_argument("--memory-limit", type = float, default = None, metavar = "MB",
+        help = "give up (answer UNKNOWN) once the process uses MB megabytes of resident memory")
+    parser.add_argument("--chrono", type = int, nargs = "?", const = CONSTANTS.CHRONO_THRESHOLD, default = None,
+        metavar = "LEVELS", help = "chronological backtracking for backjumps over more than LEVELS levels "
+        "(default: {})".format(CONSTANTS.CHRONO_THRESHOLD))
+    parser.add_argument("--checkpoint", default = None, metavar = "FILE",
+        help = "save the search to FILE periodically, resume from it if it holds a checkpoint of this cnf")
+    parser.add_argument("--checkpoint-interval", type = int, default = None, metavar = "N",
+        help = "conflicts between two checkpoints (default: 2000)")
+    parser.add_argument("--warm-start", default = None, metavar = "FILE",
+        help = "start from the clauses and activities of a checkpoint of a related cnf (same variables)")
+    parser.add_argument("--assignment", default = "assignment.txt", metavar = "FILE",
+        help = "file the model is written to (default: assignment.txt)")
+    parser.add_argument("--local-search", choices = ["probsat", "walksat"], nargs = "?", const = "probsat",
+        default = None, metavar = "METHOD", help = "pick the saved phases by local search before the search and "
+        "now and then on restarts, probsat or walksat (default: probsat)")
+    args = parser.parse_args()
+    if args.proof is not None and (args.preprocess or args.components):
+        parser.error("--proof cannot be combined with --preprocess or --components")
+    if (args.checkpoint is not None or args.warm_start is not None) and (args.components or args.proof is not None):
+        parser.error("--checkpoint and --warm-start cannot be combined with --components or --proof")
+    budgets = {name: value for name, value in (("conflict_budget", args.conflicts),
+        ("propagation_budget", args.propagations), ("time_budget", args.time_limit),
+        ("memory_budget", args.memory_limit)) if value is not None}
+    if budgets and args.components:
+        parser.error("budgets cannot be combined with --components")
+    if args.local_search is not None and args.components:
+        parser.error("--local-search cannot be combined with --components")
     random.seed(0)
-    input_file = "input/sat/bmc-1.cnf"
-    read_and_solve_cnf(input_file)
\ No newline at end of file
+    read_and_solve_cnf(args.input_file, args.restart, args.preprocess, args.components, args.workers,
+        args.profile, args.progress, args.proof, args.proof_format == "binary", budgets, args.chrono,
+        args.checkpoint, args.checkpoint_interval, args.warm_start, args.assignment, args.local_search)
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Description: Regression tests of the NumPy clause matrix (run with python3 -m pytest, skipped without numpy)
+Vectorized results are compared with the plain Python loops.
+"""
+
+import random
+import pytest
+import dimacs
+from test_solver import random_cnf, make_solver
+
+numpy = pytest.importorskip("numpy")
+import clause_matrix
+
+def random_literals(rng: random.Random, var_count: int) -> list:
+    cnf = random_cnf(rng, var_count, rng.randint(1, 4 * var_count), rng.randint(1, 4))
+    # Empty clauses and repeated literals too
+    if rng.random() < 0.2:
+        cnf.append([])
+    if rng.random() < 0.3:
+        cnf[0] = cnf[0] + cnf[0][:1]
+    return [literal for clause in cnf for literal in clause + [0]]
+
+def test_count_unsatisfied_matches_python():
+    rng = random.Random(5)
+    for _ in range(200):
+        var_count = rng.randint(1, 12)
+        dimacs_literals = random_literals(rng, var_count)
+        model = [False] + [rng.random() < 0.5 for _ in range(var_count)]
+        matrix = clause_matrix.ClauseMatrix.from_dimacs_literals(var_count, dimacs_literals)
+        assert matrix.count_unsatisfied(model) == dimacs.count_unsatisfied(dimacs_literals, model)
+
+def test_occurrence_counts_match_python():
+    rng = random.Random(6)
+    for _ in range(200):
+        var_count = rng.randint(1, 12)
+        dimacs_literals = random_literals(rng, var_count)
+        expected = [0] * (var_count + 1)
+        clause = set()
+        for literal in dimacs_literals:
+            if literal:
+                clause.add(literal)
+                continue
+            for var in set(abs(literal) for literal in clause):
+                expected[var] += 1
+            clause = set()
+        matrix = clause_matrix.ClauseMatrix.from_dimacs_literals(var_count, dimacs_literals)
+        assert matrix.occurrence_counts().tolist() == expected
+
+# from_solver() converts the Solver literals back to DIMACS ones
+def test_from_solver_matches_clauses():
+    rng = random.Random(7)
+    for _ in range(100):
+        var_count = rng.randint(3, 12)
+        cnf_solver = make_solver(var_count, random_cnf(rng, var_count, rng.randint(1, 4 * var_count)))
+        model = [False] + [rng.random() < 0.5 for _ in range(var_count)]
+        dimacs_literals = cnf_solver.get_dimacs_literals()
+        assert (clause_matrix.ClauseMatrix.from_solver(cnf_solver).count_unsatisfied(model) ==
+            dimacs.count_unsatisfied(dimacs_literals, model))
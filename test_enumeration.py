@@ -0,0 +1,48 @@
+"""
+Description: Regression tests of model enumeration (run with python3 -m pytest)
+Models found must be distinct and be exactly the (projected) models counted by brute force.
+"""
+
+import random, itertools
+import enumeration
+from test_solver import random_cnf, make_solver
+
+# Every (projected) model, as tuples of DIMACS literals of the variables in projection
+def brute_force_models(var_count: int, cnf: list, projection: list) -> set:
+    models = set()
+    for values in itertools.product((False, True), repeat = var_count):
+        if all(any(values[abs(literal) - 1] == (literal > 0) for literal in clause) for clause in cnf):
+            models.add(tuple(var if values[var - 1] else -var for var in projection))
+    return models
+
+def test_enumeration_matches_brute_force():
+    rng = random.Random(9)
+    for iteration in range(150):
+        # Some variables are in no clause, each of their values is another model
+        var_count = rng.randint(3, 10)
+        cnf = random_cnf(rng, var_count - rng.randint(0, 2), rng.randint(1, 3 * var_count))
+        cnf_solver = make_solver(var_count, cnf)
+        if iteration % 3 == 0:
+            cnf_solver.chrono_threshold = 0
+        projection = None
+        if rng.random() < 0.5:
+            projection = rng.sample(range(1, var_count + 1), rng.randint(1, var_count))
+        assumptions = []
+        if rng.random() < 0.3:
+            assumptions = [var if rng.random() < 0.5 else -var for var in rng.sample(range(1, var_count + 1), 2)]
+        models_enumeration = enumeration.ModelEnumeration(cnf_solver, projection, None, assumptions,
+            decision_blocking = rng.random() < 0.8)
+        models = [tuple(model) for model in models_enumeration]
+        expected = brute_force_models(var_count, cnf + [[literal] for literal in assumptions],
+            sorted(set(projection)) if projection is not None else range(1, var_count + 1))
+        assert len(models) == len(set(models))
+        assert set(models) == expected
+        assert models_enumeration.exhausted
+        # Then the final UNSATISFIABLE answer, unless the last blocking clause was empty
+        assert len(models) <= len(models_enumeration.times) <= len(models) + 1
+
+def test_enumeration_limit():
+    cnf_solver = make_solver(4, [[1, 2]])
+    models_enumeration = enumeration.ModelEnumeration(cnf_solver, limit = 5)
+    assert len(list(models_enumeration)) == 5
+    assert not models_enumeration.exhausted
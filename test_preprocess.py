@@ -0,0 +1,23 @@
+"""
+Description: Regression tests of the preprocessor (run with python3 -m pytest)
+Preprocessing must keep the answer, and the extended model must satisfy the input formula.
+"""
+
+import random
+import solver
+from test_solver import random_cnf, is_satisfiable
+
+def test_preprocessing_keeps_answer_and_models():
+    rng = random.Random(3)
+    eliminated_count = 0
+    for _ in range(200):
+        var_count = rng.randint(3, 10)
+        cnf = random_cnf(rng, var_count, rng.randint(1, 4 * var_count), rng.choice((2, 3, 3, 4)))
+        dimacs_literals = [literal for clause in cnf for literal in clause + [0]]
+        cnf_solver = solver.build_solver(var_count, len(cnf), dimacs_literals, preprocess = True)
+        eliminated_count += cnf_solver.preprocessor.eliminated_count
+        result = cnf_solver.solve()
+        assert result.satisfiable == is_satisfiable(var_count, cnf)
+        if result.satisfiable:
+            assert all(any(literal in result.model for literal in clause) for clause in cnf)
+    assert eliminated_count > 0
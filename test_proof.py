@@ -0,0 +1,53 @@
+"""
+Description: Regression tests of the literal encoding and of the DRAT proofs (run with python3 -m pytest)
+Proofs of random unsatisfiable cnfs, with learned clause deletions, must pass check_proof().
+"""
+
+import random
+import solver
+import proof
+from test_solver import random_cnf
+
+def test_literal_encoding():
+    for literal in list(range(-50, 0)) + list(range(1, 51)):
+        lit = solver.get_literal(literal)
+        assert lit == (2 * abs(literal) if literal > 0 else 2 * abs(literal) + 1)
+        assert solver.get_variable(lit) == abs(literal)
+        assert solver.is_negative(lit) == (literal < 0)
+        assert solver.get_dimacs_literal(lit) == literal
+        assert solver.get_opposite_literal(lit) == solver.get_literal(-literal)
+        antecedent = solver.get_binary_antecedent(lit)
+        assert solver.is_binary_antecedent(antecedent)
+        assert solver.get_binary_antecedent_literal(antecedent) == lit
+    assert not solver.is_binary_antecedent(-1)
+
+def test_proofs_are_checked(tmp_path, monkeypatch):
+    # Early and frequent reduce_db() so that the proofs have deletions
+    monkeypatch.setattr(solver.CONSTANTS, "REDUCE_DB_FIRST", 20)
+    monkeypatch.setattr(solver.CONSTANTS, "REDUCE_DB_INCREMENT", 5)
+    rng = random.Random(8)
+    cnf_file = str(tmp_path / "proof.cnf")
+    proof_file = str(tmp_path / "proof.drat")
+    unsatisfiable_count = 0
+    deleted_count = 0
+    for iteration in range(12):
+        var_count = 30 + iteration
+        cnf = random_cnf(rng, var_count, int(6 * var_count))
+        with open(cnf_file, "w") as output:
+            output.write("p cnf {} {}\n".format(var_count, len(cnf)))
+            for clause in cnf:
+                output.write(" ".join(str(literal) for literal in clause) + " 0\n")
+        for binary in (True, False):
+            random.seed(iteration)
+            cnf_solver = solver.load_cnf(cnf_file)
+            cnf_solver.proof = proof.ProofWriter(proof_file, binary, buffer_size = 64, background = binary)
+            result = cnf_solver.solve()
+            cnf_solver.proof.close()
+            if result.satisfiable:
+                continue
+            unsatisfiable_count += 1
+            deleted_count += cnf_solver.deleted_clauses_count
+            for backward in (True, False):
+                valid, message = proof.check_proof(cnf_file, proof_file, backward)
+                assert valid, message
+    assert unsatisfiable_count > 0 and deleted_count > 0
@@ -0,0 +1,30 @@
+"""
+Description: Regression tests of the batch solving service (run with python3 -m pytest)
+"""
+
+import json
+import service
+
+# Answers of jobs submitted one at a time, so that each waits for the previous one
+def solve_in_turn(batch_service: service.Service, jobs: list) -> list:
+    answers = []
+    client = service.Client(lambda line: answers.append(json.loads(line)))
+    for job in jobs:
+        batch_service.submit(job, client)
+        client.wait()
+    return answers
+
+# A worker out of its memory budget is replaced, the next job on it gets a fresh process
+def test_worker_recycled_after_memory_budget():
+    batch_service = service.Service(1)
+    batch_service.start()
+    try:
+        answers = solve_in_turn(batch_service, [
+            {"id": 1, "dimacs": "p cnf 2 1\n1 2 0\n", "budgets": {"memory_budget": 1}},
+            {"id": 2, "dimacs": "p cnf 2 1\n1 2 0\n", "budgets": {"memory_budget": 4096}},
+        ])
+    finally:
+        batch_service.stop()
+    assert answers[0]["status"] == "UNKNOWN" and answers[0]["reason"] == "memory"
+    assert answers[1]["status"] == "SATISFIABLE" and answers[1]["verified"]
+    assert batch_service.recycled_count == 1 and batch_service.crashed_count == 0
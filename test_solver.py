@@ -0,0 +1,92 @@
+"""
+Description: Regression tests of Solver (run with python3 -m pytest)
+Small random formulas are checked against brute force over every assignment.
+"""
+
+import random, itertools
+import solver
+
+# A random cnf over var_count variables, as a list of DIMACS clauses
+def random_cnf(rng: random.Random, var_count: int, clause_count: int, clause_size = 3) -> list:
+    cnf = []
+    for _ in range(clause_count):
+        variables = rng.sample(range(1, var_count + 1), min(clause_size, var_count))
+        cnf.append([var if rng.random() < 0.5 else -var for var in variables])
+    return cnf
+
+def is_satisfiable(var_count: int, cnf: list) -> bool:
+    for values in itertools.product((False, True), repeat = var_count):
+        if all(any(values[abs(literal) - 1] == (literal > 0) for literal in clause) for clause in cnf):
+            return True
+    return False
+
+def make_solver(var_count: int, cnf: list) -> solver.Solver:
+    cnf_solver = solver.Solver(var_count)
+    cnf_solver.insert_input_clauses([literal for clause in cnf for literal in clause + [0]])
+    return cnf_solver
+
+def test_solve_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(200):
+        var_count = rng.randint(3, 9)
+        cnf = random_cnf(rng, var_count, rng.randint(1, 5 * var_count))
+        result = make_solver(var_count, cnf).solve()
+        assert result.satisfiable == is_satisfiable(var_count, cnf)
+        if result.satisfiable:
+            assert all(any(literal in result.model for literal in clause) for clause in cnf)
+
+def test_contradicting_assumptions_are_both_failed():
+    cnf_solver = make_solver(2, [[1, 2]])
+    result = cnf_solver.solve([1, -1])
+    assert not result.satisfiable and not result.unknown
+    assert sorted(result.failed_assumptions) == [-1, 1]
+
+# Clauses added between solve() calls, with learned clauses kept, give the answer of the whole cnf
+def test_incremental_add_clause():
+    rng = random.Random(4)
+    for _ in range(100):
+        var_count = rng.randint(3, 9)
+        cnf_solver = make_solver(var_count, [])
+        cnf = []
+        for _ in range(rng.randint(1, 5)):
+            for clause in random_cnf(rng, var_count, rng.randint(1, 2 * var_count)):
+                cnf_solver.add_clause(clause)
+                cnf.append(clause)
+            result = cnf_solver.solve()
+            assert result.satisfiable == is_satisfiable(var_count, cnf)
+
+# Solving again under the failed assumptions alone must still be UNSATISFIABLE
+def test_failed_assumptions_are_unsatisfiable():
+    rng = random.Random(2)
+    unsatisfiable_count = 0
+    for iteration in range(300):
+        var_count = rng.randint(3, 9)
+        cnf = random_cnf(rng, var_count, rng.randint(1, 3 * var_count))
+        cnf_solver = make_solver(var_count, cnf)
+        if iteration % 3 == 0:
+            cnf_solver.chrono_threshold = 0
+        for _ in range(4):
+            assumptions = [var if rng.random() < 0.5 else -var
+                for var in (rng.randint(1, var_count) for _ in range(rng.randint(1, 6)))]
+            result = cnf_solver.solve(assumptions)
+            if result.satisfiable:
+                continue
+            unsatisfiable_count += 1
+            core = result.failed_assumptions
+            assert set(core) <= set(assumptions)
+            assert not make_solver(var_count, cnf).solve(core).satisfiable
+            assert not is_satisfiable(var_count, cnf + [[literal] for literal in core])
+    assert unsatisfiable_count > 0
+
+# The memory budget is on the current resident memory, an earlier peak must not count
+def test_memory_budget_ignores_earlier_peak():
+    if solver.resident_memory() is None:
+        return
+    large = bytearray(300 * 1024 * 1024)
+    large[::4096] = b"\1" * len(large[::4096])
+    del large
+    budget = solver.resident_memory() / (1024 * 1024) + 100
+    assert solver.peak_memory() / (1024 * 1024) > budget
+    assert make_solver(2, [[1, 2]]).solve(memory_budget = budget).satisfiable
+    result = make_solver(2, [[1, 2]]).solve(memory_budget = 1)
+    assert result.unknown and result.reason == "memory"